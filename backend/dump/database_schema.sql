@@ -7,8 +7,11 @@ USE solar_site_analyzer;
 
 -- Drop tables if they exist (for clean setup)
 DROP TABLE IF EXISTS analysis_results;
+DROP TABLE IF EXISTS analysis_run_pointer;
+DROP TABLE IF EXISTS analysis_runs;
 DROP TABLE IF EXISTS sites;
 DROP TABLE IF EXISTS analysis_parameters;
+DROP TABLE IF EXISTS scoring_curves;
 
 -- Sites table: Stores spatial data for potential solar panel installation sites
 CREATE TABLE sites (
@@ -44,10 +47,43 @@ CREATE TABLE analysis_parameters (
     CHECK (weight_value >= 0 AND weight_value <= 1)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Scoring Curves table: Piecewise-linear curves turning a site attribute into
+-- a 0-100 factor score. Factors without a row use the defaults in sites/scoring.py
+CREATE TABLE scoring_curves (
+    curve_id INT PRIMARY KEY AUTO_INCREMENT,
+    factor VARCHAR(20) NOT NULL UNIQUE COMMENT 'solar, area, grid, slope or infra',
+    points JSON NOT NULL COMMENT '[[input, score], ...] breakpoints with increasing inputs',
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Analysis Runs table: One row per recalculation of all scores
+CREATE TABLE analysis_runs (
+    run_id INT PRIMARY KEY AUTO_INCREMENT,
+    status VARCHAR(20) NOT NULL DEFAULT 'building',
+    parameters_snapshot JSON COMMENT 'JSON snapshot of weights used for this run',
+    sites_scored INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Single-row pointer to the run the site listings show
+CREATE TABLE analysis_run_pointer (
+    pointer_id SMALLINT UNSIGNED PRIMARY KEY,
+    run_id INT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    generation BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'Response cache key, incremented after every data change',
+    FOREIGN KEY (run_id) REFERENCES analysis_runs(run_id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO analysis_run_pointer (pointer_id, run_id) VALUES (1, NULL);
+
 -- Analysis Results table: Stores calculated suitability scores
 CREATE TABLE analysis_results (
     result_id INT PRIMARY KEY AUTO_INCREMENT,
     site_id INT NOT NULL,
+    run_id INT NULL COMMENT 'Analysis run; NULL for results written on upload',
     solar_irradiance_score DECIMAL(5, 2) NOT NULL,
     area_score DECIMAL(5, 2) NOT NULL,
     grid_distance_score DECIMAL(5, 2) NOT NULL,
@@ -57,6 +93,7 @@ CREATE TABLE analysis_results (
     analysis_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     parameters_snapshot JSON COMMENT 'JSON snapshot of weights used for this analysis',
     FOREIGN KEY (site_id) REFERENCES sites(site_id) ON DELETE CASCADE,
+    FOREIGN KEY (run_id) REFERENCES analysis_runs(run_id) ON DELETE CASCADE,
     INDEX idx_total_score (total_suitability_score),
     INDEX idx_site_id (site_id),
     INDEX idx_analysis_timestamp (analysis_timestamp)
@@ -102,11 +139,63 @@ LEFT JOIN (
            infrastructure_score,
            total_suitability_score,
            analysis_timestamp,
-           ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY analysis_timestamp DESC) as rn
+           ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY analysis_timestamp DESC, result_id DESC) as rn
     FROM analysis_results
+    -- Results of the current analysis run, plus newer ones written on upload
+    WHERE COALESCE(run_id, 0) IN (
+        0, (SELECT COALESCE(run_id, 0) FROM analysis_run_pointer WHERE pointer_id = 1)
+    )
 ) ar ON s.site_id = ar.site_id AND ar.rn = 1;
 
+-- The view materialized per analysis run: what the API lists and filters,
+-- reading only the rows of the run in analysis_run_pointer (run 0 before
+-- any run was published). Each run writes its rows while it is scored and
+-- uploads refresh the rows of the sites they change
+-- (sites/services.py refresh_site_scores)
+CREATE TABLE sites_with_scores_materialized (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    run INT NOT NULL DEFAULT 0,
+    site_id INT NOT NULL,
+    site_name VARCHAR(255) NOT NULL,
+    latitude DECIMAL(10, 7) NOT NULL,
+    longitude DECIMAL(10, 7) NOT NULL,
+    area_sqm INT NOT NULL,
+    solar_irradiance_kwh DECIMAL(4, 2) NOT NULL,
+    grid_distance_km DECIMAL(5, 2) NOT NULL,
+    slope_degrees DECIMAL(4, 2) NOT NULL,
+    road_distance_km DECIMAL(5, 2) NOT NULL,
+    elevation_m INT NOT NULL,
+    land_type VARCHAR(50) NOT NULL,
+    region VARCHAR(100) NOT NULL,
+    solar_irradiance_score DECIMAL(5, 2) NULL,
+    area_score DECIMAL(5, 2) NULL,
+    grid_distance_score DECIMAL(5, 2) NULL,
+    slope_score DECIMAL(5, 2) NULL,
+    infrastructure_score DECIMAL(5, 2) NULL,
+    total_suitability_score DECIMAL(5, 2) NULL,
+    analysis_timestamp TIMESTAMP NULL,
+    grid_cell INT NULL COMMENT '0.1 degree lat/lon grid cell, row by row from (-90, -180)',
+    UNIQUE KEY uniq_mat_run_site (run, site_id),
+    INDEX idx_mat_score_site (run, total_suitability_score DESC, site_id),
+    INDEX idx_mat_region (run, region),
+    INDEX idx_mat_land_type (run, land_type),
+    INDEX idx_mat_site_name (run, site_name),
+    INDEX idx_mat_grid_cell (run, grid_cell, latitude, longitude)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO sites_with_scores_materialized (
+    run, site_id, site_name, latitude, longitude, area_sqm,
+    solar_irradiance_kwh, grid_distance_km, slope_degrees, road_distance_km,
+    elevation_m, land_type, region, solar_irradiance_score, area_score,
+    grid_distance_score, slope_score, infrastructure_score,
+    total_suitability_score, analysis_timestamp, grid_cell
+)
+SELECT COALESCE((SELECT run_id FROM analysis_run_pointer WHERE pointer_id = 1), 0),
+       v.*, FLOOR((v.latitude + 90) * 10) * 3600 + FLOOR((v.longitude + 180) * 10)
+FROM sites_with_scores v;
+
 -- Create stored procedure for calculating individual scores
+-- (uses the default curves of sites/scoring.py, not saved scoring_curves rows)
 DELIMITER //
 
 CREATE PROCEDURE calculate_suitability_scores()
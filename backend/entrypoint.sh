@@ -10,6 +10,13 @@ done
 
 echo "Database is UP!"
 
+# Other services (e.g. the import worker) pass their own command and leave
+# migrations to the backend service
+if [ "$#" -gt 0 ]; then
+  echo "Starting: $*"
+  exec "$@"
+fi
+
 echo "Creating migration files..."
 python manage.py makemigrations --noinput
 
@@ -0,0 +1,147 @@
+import threading
+import time
+from bisect import bisect_left
+import numpy as np
+from django.conf import settings
+from sites.models import SitesWithScores
+from sites.response_cache import data_generation
+
+# Sorts after every character a case-folded prefix can be followed by
+PREFIX_END = "\U0010ffff"
+
+
+class PrefixIndex:
+    """
+    Case-folded values in sorted order, so the values starting with a
+    prefix are one range found with two binary searches. Each value has a
+    score (NaN for none) that orders the matches, best first, and a payload
+    returned with it.
+    """
+
+    def __init__(self, values, scores, payloads):
+        keys = [value.casefold() for value in values]
+        scores = np.asarray(scores, dtype=float)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[index] for index in order]
+        self.scores = np.nan_to_num(scores[order], nan=-np.inf)
+        self.payloads = [payloads[index] for index in order]
+
+    def search(self, prefix, limit):
+        """
+        Payloads of the 'limit' best-scored values starting with 'prefix'
+        (case-insensitive); ties keep the alphabetical order.
+        """
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + PREFIX_END, lo=start)
+        scores = self.scores[start:stop]
+        if len(scores) > limit:
+            # Every match tied with the limit-th best, so ties stay alphabetical
+            cutoff = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            matches = np.flatnonzero(scores >= cutoff)
+        else:
+            matches = np.arange(len(scores))
+        # A stable sort on the score keeps the alphabetical order of ties
+        matches = matches[np.argsort(-scores[matches], kind="stable")][:limit]
+        return [self.payloads[start + index] for index in matches.tolist()]
+
+
+def scores_of(totals):
+    return [np.nan if total is None else float(total) for total in totals]
+
+
+def grouped_index(values, totals):
+    """
+    PrefixIndex with one entry per distinct value, scored by its best site.
+    """
+    groups = {}
+    for value, total in zip(values, totals):
+        count, best = groups.get(value, (0, None))
+        if total is not None and (best is None or total > best):
+            best = total
+        groups[value] = (count + 1, best)
+    return PrefixIndex(
+        list(groups),
+        scores_of(best for _, best in groups.values()),
+        [
+            {"value": value, "count": count, "max_suitability_score": best}
+            for value, (count, best) in groups.items()
+        ],
+    )
+
+
+class SiteAutocomplete:
+    """
+    Prefix indexes over site_name (one entry per site), region and
+    land_type (one entry per distinct value).
+    """
+
+    def __init__(self, rows, generation):
+        self.generation = generation
+        site_ids, names, regions, land_types, totals = zip(*rows) if rows else ((),) * 5
+        self.indexes = {
+            "site_name": PrefixIndex(
+                names,
+                scores_of(totals),
+                [
+                    {
+                        "value": name,
+                        "site_id": site_id,
+                        "total_suitability_score": total,
+                    }
+                    for site_id, name, total in zip(site_ids, names, totals)
+                ],
+            ),
+            "region": grouped_index(regions, totals),
+            "land_type": grouped_index(land_types, totals),
+        }
+
+    def search(self, field, prefix, limit):
+        return self.indexes[field].search(prefix, limit)
+
+
+_cache = {"autocomplete": None, "checked_at": None}
+_cache_lock = threading.Lock()
+
+
+def get_site_autocomplete():
+    """
+    The SiteAutocomplete of this process, shared by its threads. It is
+    rebuilt once the data generation changed (every committed upload batch
+    and analysis run). The generation is read at most once every
+    SITE_AUTOCOMPLETE_CHECK_INTERVAL seconds, so the searches in between
+    run no query at all; a change shows up that much later at worst.
+    """
+    now = time.monotonic()
+    autocomplete = _cache["autocomplete"]
+    checked_at = _cache["checked_at"]
+    if (
+        autocomplete is not None
+        and checked_at is not None
+        and now - checked_at < settings.SITE_AUTOCOMPLETE_CHECK_INTERVAL
+    ):
+        return autocomplete
+
+    generation = data_generation()
+    with _cache_lock:
+        autocomplete = _cache["autocomplete"]
+        if autocomplete is None or autocomplete.generation != generation:
+            rows = list(
+                SitesWithScores.objects.order_by().values_list(
+                    "site_id",
+                    "site_name",
+                    "region",
+                    "land_type",
+                    "total_suitability_score",
+                )
+            )
+            # Built against the generation read before the rows, so data
+            # changed meanwhile triggers another rebuild
+            autocomplete = SiteAutocomplete(rows, generation)
+            _cache["autocomplete"] = autocomplete
+        _cache["checked_at"] = now
+    return autocomplete
+
+
+def autocomplete(field, prefix, limit):
+    return get_site_autocomplete().search(field, prefix, limit)
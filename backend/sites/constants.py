@@ -8,3 +8,33 @@ ALLOWED_QUERY_PARAMS_FOR_SITE = {
     "limit",
     "offset",
 }
+
+# Range rules applied to uploaded site values, shared by SiteSerializer's
+# validate_* methods and the column-wise validator.
+# { field: [(min, max, message), ...] }; None means unbounded, rules run in order.
+SITE_VALUE_RULES = {
+    "latitude": [(-90, 90, "Latitude must be between -90 and 90.")],
+    "longitude": [(-180, 180, "Longitude must be between -180 and 180.")],
+    # Minimum logic: anything smaller isn't a "site"
+    "area_sqm": [(500, None, "Area is too small for solar development (min 500 sqm).")],
+    # Physical limit: even the Sahara doesn't exceed 8-9
+    "solar_irradiance_kwh": [
+        (0, 10, "Solar irradiance must be between 0 and 10 kWh/m²/day.")
+    ],
+    "grid_distance_km": [
+        (0, None, "Grid distance cannot be negative."),
+        (None, 500, "Distance exceeds 500km; site is likely too remote."),
+    ],
+    "slope_degrees": [
+        (0, 90, "Slope degrees must be between 0 (flat) and 90 (vertical).")
+    ],
+    "road_distance_km": [(0, None, "Road distance cannot be negative.")],
+    # Validation for altitude (Earth's surface range)
+    "elevation_m": [
+        (
+            -413,
+            8848,
+            "Elevation must be between -413m (Dead Sea) and 8848m (Everest).",
+        )
+    ],
+}
@@ -0,0 +1,345 @@
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    InterfaceError,
+    OperationalError,
+    close_old_connections,
+    transaction,
+)
+from django.db.models import F, Q
+from django.utils import timezone
+from sites.models import ImportJob, UploadSession
+from sites.readers import STREAMING_FORMATS, format_extension
+from sites.services import SiteUploadError, ingest_upload
+
+
+def save_import_file(uploaded_file, file_format="csv"):
+    """
+    Copies an uploaded file to SITE_IMPORT_DIR chunk by chunk and returns
+    the path. The job only needs this path, never the request.
+    """
+    import_dir = Path(settings.SITE_IMPORT_DIR)
+    import_dir.mkdir(parents=True, exist_ok=True)
+
+    path = import_dir / f"{uuid.uuid4().hex}{format_extension(file_format)}"
+    with open(path, "wb") as destination:
+        for chunk in uploaded_file.chunks(settings.SITE_UPLOAD_CHUNK_SIZE):
+            destination.write(chunk)
+    return path
+
+
+def enqueue_import(uploaded_file, file_format="csv"):
+    """
+    Stores the upload on disk and queues an ImportJob for it.
+    """
+    path = save_import_file(uploaded_file, file_format)
+    return ImportJob.objects.create(
+        filename=uploaded_file.name, file_path=str(path), file_format=file_format
+    )
+
+
+def iter_file_chunks(path, chunk_size):
+    with open(path, "rb") as source:
+        while chunk := source.read(chunk_size):
+            yield chunk
+
+
+class ChunkNotReady(Exception):
+    """
+    The next chunk of a resumable upload did not arrive in time.
+    """
+
+
+class ClaimLost(Exception):
+    """
+    Another worker reclaimed the job after this worker's heartbeat went
+    stale, so this worker must stop writing to it.
+    """
+
+
+def create_upload_session(filename, file_format="csv"):
+    """
+    Starts a resumable upload and queues its ImportJob right away; the job
+    reads the chunks from disk in order while the client is still sending.
+    """
+    session = UploadSession(filename=filename)
+    directory = session.directory
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Both rows commit together so a worker never sees the job without its session
+    with transaction.atomic():
+        session.job = ImportJob.objects.create(
+            filename=filename, file_path=str(directory), file_format=file_format
+        )
+        session.save()
+    return session
+
+
+def save_upload_chunk(session, number, stream):
+    """
+    Writes one chunk to disk. The data goes to a temporary file that is
+    renamed into place once complete, so readers never see a partial chunk
+    and re-sending the same chunk number is safe.
+    """
+    path = session.chunk_path(number)
+    partial = path.with_suffix(f".{uuid.uuid4().hex}.part")
+
+    size = 0
+    with open(partial, "wb") as destination:
+        while stream is not None and (
+            chunk := stream.read(settings.SITE_UPLOAD_CHUNK_SIZE)
+        ):
+            destination.write(chunk)
+            size += len(chunk)
+
+    os.replace(partial, path)
+    return size
+
+
+def complete_upload_session(session, total_chunks):
+    """
+    Marks the upload as complete once chunks 0 .. total_chunks - 1 are all
+    on disk. Returns the list of missing chunk numbers (empty on success).
+    """
+    missing = sorted(set(range(total_chunks)) - set(session.received_chunks()))
+    if missing:
+        return missing
+
+    session.total_chunks = total_chunks
+    session.completed_at = timezone.now()
+    session.save(update_fields=["total_chunks", "completed_at", "updated_at"])
+    return []
+
+
+def iter_session_chunks(session, heartbeat):
+    """
+    Yields the bytes of a resumable upload in chunk order, waiting for chunks
+    that have not arrived yet. Ends after the last chunk of a completed
+    session; raises ChunkNotReady if the client goes quiet for too long.
+    """
+    number = 0
+    waited = 0
+    while True:
+        path = session.chunk_path(number)
+        if path.exists():
+            yield from iter_file_chunks(path, settings.SITE_UPLOAD_CHUNK_SIZE)
+            number += 1
+            waited = 0
+            continue
+
+        session.refresh_from_db(fields=["total_chunks"])
+        if session.total_chunks is not None and number >= session.total_chunks:
+            return
+
+        if waited >= settings.SITE_UPLOAD_CHUNK_WAIT:
+            raise ChunkNotReady(f"Chunk {number} has not been received yet")
+
+        # Keep the job's heartbeat fresh so it is not treated as abandoned
+        heartbeat()
+        time.sleep(settings.SITE_IMPORT_POLL_INTERVAL)
+        waited += settings.SITE_IMPORT_POLL_INTERVAL
+
+
+def iter_job_chunks(job, heartbeat):
+    """
+    Byte chunks of a job's source: a resumable upload or a single saved file.
+    """
+    try:
+        session = job.upload_session
+    except UploadSession.DoesNotExist:
+        return iter_file_chunks(job.file_path, settings.SITE_UPLOAD_CHUNK_SIZE)
+    return iter_session_chunks(session, heartbeat)
+
+
+def open_job_source(job, heartbeat):
+    """
+    Context manager giving ingest_upload() its source: byte chunks for
+    streaming formats, the saved file itself for Parquet and Arrow.
+    """
+    if job.file_format in STREAMING_FORMATS:
+        return nullcontext(iter_job_chunks(job, heartbeat))
+    return open(job.file_path, "rb")
+
+
+def discard_job_source(job):
+    # The source is only kept around for resuming or inspecting failures
+    path = Path(job.file_path)
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def claim_next_job(worker_id):
+    """
+    Claims the oldest queued job, or a running job whose worker stopped
+    sending heartbeats. The claim is a conditional UPDATE, so two workers
+    can never pick up the same job, and it bumps the job's attempts, which
+    fences off the worker that held the job before.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.SITE_IMPORT_STALE_AFTER)
+    candidates = ImportJob.objects.filter(
+        Q(status=ImportJob.STATUS_QUEUED)
+        | Q(status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+        # Requeued jobs (e.g. waiting for chunks) go to the back of the queue
+    ).order_by("updated_at")
+
+    for job in candidates[:10]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(
+            pk=job.pk,
+            status=job.status,
+            heartbeat_at=job.heartbeat_at,
+            attempts=job.attempts,
+        ).update(
+            status=ImportJob.STATUS_RUNNING,
+            worker=worker_id,
+            attempts=F("attempts") + 1,
+            heartbeat_at=now,
+            started_at=job.started_at or now,
+            updated_at=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+    return None
+
+
+def claimed_job(job):
+    """
+    The job's row while it still carries the claim 'job' was read with;
+    empty once another worker reclaimed it.
+    """
+    return ImportJob.objects.filter(pk=job.pk, attempts=job.attempts)
+
+
+def run_import_job(job):
+    """
+    Processes a claimed job. Progress is committed with every batch, so if
+    the worker dies the next claim resumes after the last committed batch.
+    A worker whose claim was taken over stops at its next heartbeat, and
+    the batch it was writing rolls back with the progress update.
+    """
+
+    def heartbeat():
+        now = timezone.now()
+        if not claimed_job(job).update(heartbeat_at=now, updated_at=now):
+            raise ClaimLost(f"Import {job.job_id} was claimed by another worker")
+
+    def save_progress(progress):
+        now = timezone.now()
+        saved = claimed_job(job).update(
+            rows_processed=progress["processed"],
+            rows_inserted=progress["inserted"],
+            rows_updated=progress["updated"],
+            rows_unchanged=progress["unchanged"],
+            heartbeat_at=now,
+            updated_at=now,
+        )
+        if not saved:
+            raise ClaimLost(f"Import {job.job_id} was claimed by another worker")
+
+    try:
+        with open_job_source(job, heartbeat) as source:
+            ingest_upload(
+                job.file_format,
+                source,
+                atomic=False,
+                summary={
+                    "processed": job.rows_processed,
+                    "inserted": job.rows_inserted,
+                    "updated": job.rows_updated,
+                    "unchanged": job.rows_unchanged,
+                },
+                on_batch=save_progress,
+            )
+    except ClaimLost:
+        # The job belongs to the worker that reclaimed it now
+        pass
+    except SiteUploadError as e:
+        finish_job(job, ImportJob.STATUS_FAILED, e.as_response_data())
+    except (OperationalError, InterfaceError):
+        # Lost the database connection: put the job back in the queue and let
+        # the next claim resume it from the last committed batch
+        close_old_connections()
+        requeue_job(job)
+    except ChunkNotReady:
+        # The client stopped sending; resume once more chunks are in
+        requeue_job(job)
+    except Exception as e:
+        finish_job(job, ImportJob.STATUS_FAILED, {"error": f"Import failed: {e}"})
+    else:
+        if finish_job(job, ImportJob.STATUS_COMPLETED):
+            discard_job_source(job)
+
+
+def requeue_job(job):
+    """
+    Puts the job back in the queue, unless another worker claimed it.
+    """
+    return bool(
+        claimed_job(job).update(
+            status=ImportJob.STATUS_QUEUED, worker=None, updated_at=timezone.now()
+        )
+    )
+
+
+def finish_job(job, status, errors=None):
+    """
+    Records the final status, unless another worker claimed the job.
+    """
+    now = timezone.now()
+    return bool(
+        claimed_job(job).update(
+            status=status, errors=errors, finished_at=now, updated_at=now
+        )
+    )
+
+
+def run_import_worker(worker_id, stop_event, poll_interval):
+    """
+    Worker loop: claim a job, run it, repeat; sleep while the queue is empty.
+    """
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            job = claim_next_job(worker_id)
+        except DatabaseError:
+            # Database not reachable (or not migrated) yet; try again later
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_import_job(job)
+    close_old_connections()
+
+
+def start_import_workers(count, poll_interval):
+    """
+    Starts 'count' worker threads sharing the ImportJob queue.
+    Returns (threads, stop_event); set the event to stop them.
+    """
+    stop_event = threading.Event()
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    threads = [
+        threading.Thread(
+            target=run_import_worker,
+            args=(f"{prefix}-{index}", stop_event, poll_interval),
+            name=f"import-worker-{index}",
+            daemon=True,
+        )
+        for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, stop_event
@@ -0,0 +1,38 @@
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sites.jobs import start_import_workers
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of workers that process queued background CSV imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SITE_IMPORT_WORKERS,
+            help="Number of worker threads",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.SITE_IMPORT_POLL_INTERVAL,
+            help="Seconds to wait before checking an empty queue again",
+        )
+
+    def handle(self, *args, **options):
+        threads, stop_event = start_import_workers(
+            options["workers"], options["poll_interval"]
+        )
+
+        # Let the current batches finish on Ctrl+C / docker stop
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop_event.set())
+
+        self.stdout.write(f"Started {len(threads)} import workers.")
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+        self.stdout.write("Import workers stopped.")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sites.scoring import load_weights
+from sites.services import recalculate_all_sites
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-scores every site from its raw data with the saved weights and "
+        "publishes the result as a new analysis run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SITE_RECALC_WORKERS,
+            help="Number of worker processes",
+        )
+
+    def handle(self, *args, **options):
+        run = recalculate_all_sites(load_weights(), workers=options["workers"])
+        run.refresh_from_db()
+        self.stdout.write(f"Analysis run {run.run_id} scored {run.sites_scored} sites.")
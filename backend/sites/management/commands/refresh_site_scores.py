@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from sites.models import SitesWithScores
+from sites.response_cache import bump_data_generation
+from sites.services import build_run_site_scores, listed_run_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the listed run's rows of the materialized "
+        "sites_with_scores_materialized table, one chunk of sites at a time, "
+        "e.g. after sites or results were changed with plain SQL."
+    )
+
+    def handle(self, *args, **options):
+        build_run_site_scores(listed_run_id())
+        bump_data_generation()
+        self.stdout.write(f"Refreshed {SitesWithScores.objects.count()} sites.")
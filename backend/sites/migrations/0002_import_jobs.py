@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                ("job_id", models.AutoField(primary_key=True, serialize=False)),
+                ("filename", models.CharField(max_length=255)),
+                (
+                    "file_path",
+                    models.CharField(
+                        help_text="Where the uploaded file is kept until processed",
+                        max_length=500,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("rows_processed", models.IntegerField(default=0)),
+                ("rows_inserted", models.IntegerField(default=0)),
+                ("rows_updated", models.IntegerField(default=0)),
+                ("errors", models.JSONField(blank=True, null=True)),
+                ("worker", models.CharField(blank=True, max_length=100, null=True)),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "import_jobs",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="import_jobs_status_aedc42_idx",
+                    )
+                ],
+            },
+        ),
+    ]
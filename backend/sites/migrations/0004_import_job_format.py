@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0003_upload_sessions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="file_format",
+            field=models.CharField(
+                default="csv", help_text="csv, ndjson, parquet or arrow", max_length=20
+            ),
+        ),
+    ]
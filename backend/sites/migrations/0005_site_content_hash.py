@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0004_import_job_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_unchanged",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="sites",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0005_site_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisresults",
+            name="area_factor",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analysisresults",
+            name="grid_distance_factor",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analysisresults",
+            name="infrastructure_factor",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analysisresults",
+            name="slope_factor",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="analysisresults",
+            name="solar_irradiance_factor",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_pointer(apps, schema_editor):
+    # The sites_with_scores view reads the current run from this single row
+    CurrentAnalysisRun = apps.get_model("sites", "CurrentAnalysisRun")
+    CurrentAnalysisRun.objects.get_or_create(pointer_id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0006_analysis_factors"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisRun",
+            fields=[
+                ("run_id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("building", "Building"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="building",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "parameters_snapshot",
+                    models.JSONField(
+                        blank=True,
+                        help_text="JSON snapshot of weights used for this run",
+                        null=True,
+                    ),
+                ),
+                ("sites_scored", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "analysis_runs",
+            },
+        ),
+        migrations.AddField(
+            model_name="analysisresults",
+            name="run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="results",
+                to="sites.analysisrun",
+            ),
+        ),
+        migrations.CreateModel(
+            name="CurrentAnalysisRun",
+            fields=[
+                (
+                    "pointer_id",
+                    models.PositiveSmallIntegerField(
+                        default=1, primary_key=True, serialize=False
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="sites.analysisrun",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "analysis_run_pointer",
+            },
+        ),
+        migrations.RunPython(create_pointer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+def clear_stored_factors(apps, schema_editor):
+    # The stored factors came from the old recalculation curves; without
+    # them the next weight change re-scores every site from the site data
+    AnalysisResults = apps.get_model("sites", "AnalysisResults")
+    AnalysisResults.objects.update(
+        solar_irradiance_factor=None,
+        area_factor=None,
+        grid_distance_factor=None,
+        slope_factor=None,
+        infrastructure_factor=None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0007_analysis_runs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoringCurve",
+            fields=[
+                ("curve_id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "factor",
+                    models.CharField(
+                        help_text="solar, area, grid, slope or infra",
+                        max_length=20,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "points",
+                    models.JSONField(
+                        help_text="[[input, score], ...] breakpoints with increasing inputs"
+                    ),
+                ),
+                ("description", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "scoring_curves",
+            },
+        ),
+        migrations.RunPython(clear_stored_factors, migrations.RunPython.noop),
+    ]
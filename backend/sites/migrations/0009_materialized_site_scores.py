@@ -0,0 +1,109 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+# Same rule as the sites_with_scores view
+FILL_SQL = """
+INSERT INTO sites_with_scores_materialized
+SELECT s.site_id, s.site_name, s.latitude, s.longitude, s.area_sqm,
+       s.solar_irradiance_kwh, s.grid_distance_km, s.slope_degrees,
+       s.road_distance_km, s.elevation_m, s.land_type, s.region,
+       ar.solar_irradiance_score, ar.area_score, ar.grid_distance_score,
+       ar.slope_score, ar.infrastructure_score, ar.total_suitability_score,
+       ar.analysis_timestamp
+FROM sites s
+LEFT JOIN (
+    SELECT site_id, solar_irradiance_score, area_score, grid_distance_score,
+           slope_score, infrastructure_score, total_suitability_score,
+           analysis_timestamp,
+           ROW_NUMBER() OVER (
+               PARTITION BY site_id
+               ORDER BY analysis_timestamp DESC, result_id DESC
+           ) AS rn
+    FROM analysis_results
+    WHERE COALESCE(run_id, 0) IN (
+        0, (SELECT COALESCE(run_id, 0) FROM analysis_run_pointer WHERE pointer_id = 1)
+    )
+) ar ON s.site_id = ar.site_id AND ar.rn = 1
+"""
+
+
+def fill_site_scores(apps, schema_editor):
+    schema_editor.execute(FILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0008_scoring_curves"),
+    ]
+
+    operations = [
+        # Was an unmanaged model over the view, so nothing is dropped
+        migrations.DeleteModel(name="SitesWithScores"),
+        migrations.CreateModel(
+            name="SitesWithScores",
+            fields=[
+                ("site_id", models.IntegerField(primary_key=True, serialize=False)),
+                ("site_name", models.CharField(max_length=255)),
+                ("latitude", models.DecimalField(decimal_places=7, max_digits=10)),
+                ("longitude", models.DecimalField(decimal_places=7, max_digits=10)),
+                ("area_sqm", models.IntegerField()),
+                (
+                    "solar_irradiance_kwh",
+                    models.DecimalField(decimal_places=2, max_digits=4),
+                ),
+                (
+                    "grid_distance_km",
+                    models.DecimalField(decimal_places=2, max_digits=5),
+                ),
+                ("slope_degrees", models.DecimalField(decimal_places=2, max_digits=4)),
+                (
+                    "road_distance_km",
+                    models.DecimalField(decimal_places=2, max_digits=5),
+                ),
+                ("elevation_m", models.IntegerField()),
+                ("land_type", models.CharField(max_length=50)),
+                ("region", models.CharField(max_length=100)),
+                (
+                    "solar_irradiance_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                (
+                    "area_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                (
+                    "grid_distance_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                (
+                    "slope_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                (
+                    "infrastructure_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                (
+                    "total_suitability_score",
+                    models.DecimalField(decimal_places=2, max_digits=5, null=True),
+                ),
+                ("analysis_timestamp", models.DateTimeField(null=True)),
+            ],
+            options={
+                "db_table": "sites_with_scores_materialized",
+                "ordering": ["-total_suitability_score"],
+                "indexes": [
+                    models.Index(
+                        fields=["-total_suitability_score", "site_id"],
+                        name="idx_mat_score_site",
+                    ),
+                    models.Index(fields=["region"], name="idx_mat_region"),
+                    models.Index(fields=["land_type"], name="idx_mat_land_type"),
+                    models.Index(fields=["site_name"], name="idx_mat_site_name"),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_site_scores, migrations.RunPython.noop),
+    ]
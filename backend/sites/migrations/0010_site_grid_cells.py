@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:05
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Floor
+
+
+def fill_grid_cells(apps, schema_editor):
+    # 0.1 degree cells, 3600 per row (sites.spatial.GRID_CELLS_PER_DEGREE)
+    SitesWithScores = apps.get_model("sites", "SitesWithScores")
+    SitesWithScores.objects.update(
+        grid_cell=Floor((F("latitude") + 90) * 10) * 3600
+        + Floor((F("longitude") + 180) * 10)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0009_materialized_site_scores"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="siteswithscores",
+            name="grid_cell",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name="siteswithscores",
+            index=models.Index(
+                fields=["grid_cell", "latitude", "longitude"], name="idx_mat_grid_cell"
+            ),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
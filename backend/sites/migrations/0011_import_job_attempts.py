@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0010_site_grid_cells"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="attempts",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0012_site_scores_per_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="currentanalysisrun",
+            name="generation",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
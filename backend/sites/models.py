@@ -1,4 +1,9 @@
+import hashlib
+import uuid
+from pathlib import Path
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 
 
 class Sites(models.Model):
@@ -36,9 +41,17 @@ class Sites(models.Model):
     land_type = models.CharField(max_length=50)
     region = models.CharField(max_length=100)
 
+    # Fingerprint of the uploaded attributes, see get_content_hash()
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Bookkeeping columns that are not part of the uploaded content
+    CONTENT_HASH_EXCLUDED = {"site_id", "content_hash", "created_at", "updated_at"}
+
     class Meta:
         db_table = "sites"
         indexes = [
@@ -51,6 +64,23 @@ class Sites(models.Model):
     def __str__(self):
         return self.site_name
 
+    def get_content_hash(self):
+        """
+        SHA-256 of every uploaded attribute (the scoring inputs included).
+        Decimals are formatted to the column's decimal places, so the same
+        value hashes the same whether it arrives as a Decimal or a float.
+        """
+        parts = []
+        for field in self._meta.concrete_fields:
+            if field.name in self.CONTENT_HASH_EXCLUDED:
+                continue
+            value = getattr(self, field.attname)
+            if isinstance(field, models.DecimalField):
+                # "+ 0" turns -0 into 0
+                value = format(value + 0, f".{field.decimal_places}f")
+            parts.append(str(value))
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
 
 class AnalysisParameters(models.Model):
     param_id = models.AutoField(primary_key=True)
@@ -73,6 +103,96 @@ class AnalysisParameters(models.Model):
         return self.parameter_name
 
 
+class ScoringCurve(models.Model):
+    """
+    Piecewise-linear curve turning one raw site attribute into a 0-100
+    factor score. Factors without a saved curve use
+    scoring.DEFAULT_SCORING_CURVES.
+    """
+
+    curve_id = models.AutoField(primary_key=True)
+    factor = models.CharField(
+        max_length=20, unique=True, help_text="solar, area, grid, slope or infra"
+    )
+    points = models.JSONField(
+        help_text="[[input, score], ...] breakpoints with increasing inputs"
+    )
+
+    description = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "scoring_curves"
+
+    def __str__(self):
+        return f"{self.factor} curve"
+
+
+class AnalysisRun(models.Model):
+    """
+    One recalculation of every site's scores. Its results are written while
+    the run is "building" and only become visible once CurrentAnalysisRun
+    points at it, so readers never see a half-written set.
+    """
+
+    STATUS_BUILDING = "building"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_BUILDING, "Building"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    run_id = models.AutoField(primary_key=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_BUILDING
+    )
+    parameters_snapshot = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="JSON snapshot of weights used for this run",
+    )
+    sites_scored = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "analysis_runs"
+
+    def __str__(self):
+        return f"Run {self.run_id} ({self.status})"
+
+
+class CurrentAnalysisRun(models.Model):
+    """
+    Single-row pointer to the run the site listings show.
+    Switching to a new run is one UPDATE of this row.
+    """
+
+    POINTER_ID = 1
+
+    pointer_id = models.PositiveSmallIntegerField(primary_key=True, default=POINTER_ID)
+    run = models.ForeignKey(
+        AnalysisRun, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Incremented after every committed change to the site data; keys the
+    # cached responses of every process (see sites.response_cache)
+    generation = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = "analysis_run_pointer"
+
+    def __str__(self):
+        return f"Current run: {self.run_id}"
+
+
 class AnalysisResults(models.Model):
     result_id = models.AutoField(primary_key=True)
 
@@ -80,6 +200,16 @@ class AnalysisResults(models.Model):
         Sites, on_delete=models.CASCADE, related_name="analysis_results"
     )
 
+    # Set for results of a recalculation; null for results written on upload,
+    # which are shown (when newer) on top of the current run
+    run = models.ForeignKey(
+        AnalysisRun,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="results",
+    )
+
     solar_irradiance_score = models.DecimalField(max_digits=5, decimal_places=2)
     area_score = models.DecimalField(max_digits=5, decimal_places=2)
     grid_distance_score = models.DecimalField(max_digits=5, decimal_places=2)
@@ -90,6 +220,16 @@ class AnalysisResults(models.Model):
         max_digits=5, decimal_places=2, help_text="Final weighted score out of 100"
     )
 
+    # Unrounded, weight-independent 0-100 factors (scoring.normalized_factors);
+    # the *_score columns above hold them rounded.
+    # A weight change re-scores from these in SQL (services.apply_weights).
+    # Null on rows written before they were stored.
+    solar_irradiance_factor = models.FloatField(null=True, blank=True)
+    area_factor = models.FloatField(null=True, blank=True)
+    grid_distance_factor = models.FloatField(null=True, blank=True)
+    slope_factor = models.FloatField(null=True, blank=True)
+    infrastructure_factor = models.FloatField(null=True, blank=True)
+
     analysis_timestamp = models.DateTimeField(auto_now_add=True)
 
     parameters_snapshot = models.JSONField(
@@ -110,13 +250,34 @@ class AnalysisResults(models.Model):
         return f"Result {self.result_id} for Site {self.site_id}"
 
 
+class ListedSiteScoresManager(models.Manager):
+    """
+    Only the rows of the run the listings show: the CurrentAnalysisRun
+    pointer is read inside every query, so moving it switches all listings.
+    """
+
+    def get_queryset(self):
+        listed_run = CurrentAnalysisRun.objects.filter(
+            pk=CurrentAnalysisRun.POINTER_ID
+        ).values("run_id")
+        return (
+            super().get_queryset().filter(run=Coalesce(models.Subquery(listed_run), 0))
+        )
+
+
 class SitesWithScores(models.Model):
     """
-    This model maps to the SQL view 'sites_with_scores'.
-    The view should already exist in your database.
+    Every site with the scores it shows in one analysis run, materialized
+    from the same rule as the SQL view 'sites_with_scores' (see
+    services.visible_results_sql). Each run gets its own rows, built while
+    the run is scored; uploads refresh the rows of the sites they change in
+    the listed run and in the runs still building. Publishing a run is then
+    only the pointer UPDATE, and listings read a single indexed table.
     """
 
-    site_id = models.IntegerField(primary_key=True)
+    # AnalysisRun.run_id the row belongs to; 0 before any run was published
+    run = models.IntegerField(default=0)
+    site_id = models.IntegerField()
     site_name = models.CharField(max_length=255)
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
@@ -129,19 +290,148 @@ class SitesWithScores(models.Model):
     land_type = models.CharField(max_length=50)
     region = models.CharField(max_length=100)
 
-    # Scores from latest analysis
-    solar_irradiance_score = models.DecimalField(max_digits=5, decimal_places=2)
-    area_score = models.DecimalField(max_digits=5, decimal_places=2)
-    grid_distance_score = models.DecimalField(max_digits=5, decimal_places=2)
-    slope_score = models.DecimalField(max_digits=5, decimal_places=2)
-    infrastructure_score = models.DecimalField(max_digits=5, decimal_places=2)
-    total_suitability_score = models.DecimalField(max_digits=5, decimal_places=2)
-    analysis_timestamp = models.DateTimeField(auto_now=True)
+    # Scores from latest analysis (null for a site without any result)
+    solar_irradiance_score = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True
+    )
+    area_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    grid_distance_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    slope_score = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    infrastructure_score = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True
+    )
+    total_suitability_score = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True
+    )
+    analysis_timestamp = models.DateTimeField(null=True)
+
+    # Cell of the fixed lat/lon grid in sites.spatial, for bbox/radius queries
+    grid_cell = models.IntegerField(null=True)
+
+    # The listed run's rows only; all_runs sees every run's
+    objects = ListedSiteScoresManager()
+    all_runs = models.Manager()
 
     class Meta:
-        managed = False
-        db_table = "sites_with_scores"
+        db_table = "sites_with_scores_materialized"
         ordering = ["-total_suitability_score"]
+        base_manager_name = "all_runs"
+        constraints = [
+            models.UniqueConstraint(fields=["run", "site_id"], name="uniq_mat_run_site")
+        ]
+        # Every index leads with the run, which every listing query filters on
+        indexes = [
+            # Matches the listing order, so cursor pages are index range scans
+            models.Index(
+                fields=["run", "-total_suitability_score", "site_id"],
+                name="idx_mat_score_site",
+            ),
+            models.Index(fields=["run", "region"], name="idx_mat_region"),
+            models.Index(fields=["run", "land_type"], name="idx_mat_land_type"),
+            models.Index(fields=["run", "site_name"], name="idx_mat_site_name"),
+            # Covers the exact coordinate check of a grid cell range scan
+            models.Index(
+                fields=["run", "grid_cell", "latitude", "longitude"],
+                name="idx_mat_grid_cell",
+            ),
+        ]
 
     def __str__(self):
         return self.site_name
+
+
+class ImportJob(models.Model):
+    """
+    An upload queued for background processing. The table doubles as the
+    work queue: workers claim queued jobs and record their progress here.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    job_id = models.AutoField(primary_key=True)
+    filename = models.CharField(max_length=255)
+    file_path = models.CharField(
+        max_length=500, help_text="Where the uploaded file is kept until processed"
+    )
+    file_format = models.CharField(
+        max_length=20, default="csv", help_text="csv, ndjson, parquet or arrow"
+    )
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+
+    # Committed together with each batch, so a restarted job resumes from here
+    rows_processed = models.IntegerField(default=0)
+    rows_inserted = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_unchanged = models.IntegerField(default=0)
+
+    errors = models.JSONField(blank=True, null=True)
+
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    # Bumped by every claim; a worker's updates only apply while the job
+    # still carries the attempt it claimed (see jobs.claimed_job)
+    attempts = models.IntegerField(default=0)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "import_jobs"
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Import {self.job_id} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload sent as numbered chunks. Its ImportJob is queued as
+    soon as the session starts, so workers ingest chunks as they arrive.
+    """
+
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+
+    job = models.OneToOneField(
+        ImportJob, on_delete=models.CASCADE, related_name="upload_session"
+    )
+
+    # Unknown until the client finalizes the upload
+    total_chunks = models.IntegerField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "upload_sessions"
+
+    def __str__(self):
+        return f"Upload {self.upload_id} ({self.filename})"
+
+    @property
+    def directory(self):
+        return Path(settings.SITE_IMPORT_DIR) / "uploads" / str(self.upload_id)
+
+    def chunk_path(self, number):
+        return self.directory / f"{number:08d}.chunk"
+
+    def received_chunks(self):
+        return sorted(int(path.stem) for path in self.directory.glob("*.chunk"))
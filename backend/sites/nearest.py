@@ -0,0 +1,178 @@
+import heapq
+import threading
+import numpy as np
+from sites.models import SitesWithScores
+from sites.spatial import EARTH_RADIUS_KM
+from sites.whatif import factor_matrix_version
+
+# Sites per leaf of the KD-tree, compared with the query point in one go
+NEAREST_LEAF_SIZE = 32
+
+
+def unit_vectors(latitudes, longitudes):
+    """
+    Points on the unit sphere, (sites x 3). The straight-line (chord)
+    distance between them grows with the great-circle distance, so a
+    Euclidean KD-tree finds the nearest sites with no special case at the
+    antimeridian or the poles.
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack(
+        [
+            np.cos(latitudes) * np.cos(longitudes),
+            np.cos(latitudes) * np.sin(longitudes),
+            np.sin(latitudes),
+        ]
+    )
+
+
+def chord_to_km(squared_chords):
+    chords = np.sqrt(squared_chords)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords / 2, 1))
+
+
+class SiteTree:
+    """
+    KD-tree over the coordinates of every site. Sites are reordered so
+    that every node covers a contiguous range of them; nodes keep that
+    range, their children and the bounding box of their sites.
+    """
+
+    def __init__(self, site_ids, latitudes, longitudes, version):
+        self.version = version
+        points = unit_vectors(latitudes, longitudes).reshape(len(site_ids), 3)
+        self.order = np.arange(len(site_ids))
+        self.ranges = []
+        self.children = []
+        self.boxes = []
+        if len(site_ids):
+            self.build(points, 0, len(site_ids))
+        self.site_ids = np.asarray(site_ids, dtype=np.int64)[self.order]
+        self.points = points[self.order]
+        self.boxes = np.array(self.boxes).reshape(len(self.ranges), 2, 3)
+
+    def __len__(self):
+        return len(self.site_ids)
+
+    def build(self, points, start, stop):
+        node = len(self.ranges)
+        cell = points[self.order[start:stop]]
+        self.ranges.append((start, stop))
+        self.children.append(None)
+        self.boxes.append((cell.min(axis=0), cell.max(axis=0)))
+        if stop - start <= NEAREST_LEAF_SIZE:
+            return node
+
+        # Split the widest side at the median
+        axis = int(np.argmax(self.boxes[node][1] - self.boxes[node][0]))
+        middle = (start + stop) // 2
+        split = np.argpartition(cell[:, axis], middle - start)
+        self.order[start:stop] = self.order[start:stop][split]
+        self.children[node] = (
+            self.build(points, start, middle),
+            self.build(points, middle, stop),
+        )
+        return node
+
+    def box_distance(self, node, point):
+        """
+        Squared distance from 'point' to the bounding box of 'node'.
+        """
+        low, high = self.boxes[node]
+        gap = np.maximum(low - point, 0) + np.maximum(point - high, 0)
+        return float(gap @ gap)
+
+    def nearest(self, latitude, longitude, k, allowed=None):
+        """
+        (site_ids, distances in km) of the k sites closest to the point,
+        nearest first and the lowest site_id first on ties. 'allowed' is
+        an optional mask over self.site_ids; other sites are skipped, and
+        so is every node without an allowed site.
+
+        Best-first search: nodes are visited by distance to their bounding
+        box, and the search stops once the next node is farther than the
+        k-th site found.
+        """
+        if not len(self) or k <= 0:
+            return [], []
+        point = unit_vectors([latitude], [longitude])[0]
+        if allowed is not None:
+            counts = np.concatenate([[0], np.cumsum(allowed)])
+
+        found = np.empty(0, dtype=np.int64)
+        distances = np.empty(0)
+        heap = [(self.box_distance(0, point), 0)]
+        while heap:
+            box_distance, node = heapq.heappop(heap)
+            if len(found) == k and box_distance > distances[-1]:
+                break
+
+            start, stop = self.ranges[node]
+            children = self.children[node]
+            if children is not None:
+                for child in children:
+                    child_start, child_stop = self.ranges[child]
+                    if allowed is None or counts[child_stop] > counts[child_start]:
+                        heapq.heappush(heap, (self.box_distance(child, point), child))
+                continue
+
+            indexes = np.arange(start, stop)
+            if allowed is not None:
+                indexes = indexes[allowed[start:stop]]
+            gaps = self.points[indexes] - point
+            found = np.concatenate([found, indexes])
+            distances = np.concatenate([distances, np.einsum("ij,ij->i", gaps, gaps)])
+            order = np.lexsort((self.site_ids[found], distances))[:k]
+            found, distances = found[order], distances[order]
+
+        return self.site_ids[found].tolist(), chord_to_km(distances).tolist()
+
+
+_cache = {"tree": None}
+_cache_lock = threading.Lock()
+
+
+def get_site_tree():
+    """
+    The SiteTree of this process, shared by its threads and rebuilt on the
+    first query after an upload or analyze changed the data.
+    """
+    version = factor_matrix_version()
+    tree = _cache["tree"]
+    if tree is not None and tree.version == version:
+        return tree
+
+    with _cache_lock:
+        tree = _cache["tree"]
+        if tree is None or tree.version != version:
+            rows = list(
+                SitesWithScores.objects.order_by("site_id").values_list(
+                    "site_id", "latitude", "longitude"
+                )
+            )
+            tree = SiteTree(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+                version,
+            )
+            _cache["tree"] = tree
+    return tree
+
+
+def nearest_sites(latitude, longitude, k, queryset=None):
+    """
+    (site_id, distance_km) of the k sites nearest to the point, nearest
+    first. With a (filtered) SitesWithScores 'queryset' only its sites
+    are candidates.
+    """
+    tree = get_site_tree()
+    allowed = None
+    if queryset is not None:
+        site_ids = np.fromiter(
+            queryset.order_by().values_list("site_id", flat=True), dtype=np.int64
+        )
+        allowed = np.isin(tree.site_ids, site_ids)
+    site_ids, distances = tree.nearest(latitude, longitude, k, allowed)
+    return list(zip(site_ids, distances))
@@ -0,0 +1,17 @@
+"""
+Set-up of the spawned processes that score sites in parallel
+(services.score_sites_in_pool). A spawned process imports this module
+before Django is set up, so it must not import models.
+"""
+
+import django
+from django.db import connections
+
+
+def init_scoring_worker(database_name):
+    """
+    Sets Django up in a freshly spawned pool process, on the database the
+    parent uses (under the test runner that is not the one in settings).
+    """
+    django.setup()
+    connections["default"].settings_dict["NAME"] = database_name
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db.models import F
+from sites.models import CurrentAnalysisRun
+
+# Alias in settings.CACHES
+RESPONSE_CACHE = "site_responses"
+
+# The query params a site listing depends on; any other param is ignored
+CACHED_QUERY_PARAMS = (
+    "q",
+    "site_name",
+    "region",
+    "land_type",
+    "bbox",
+    "lat",
+    "lon",
+    "radius_km",
+    "limit",
+    "offset",
+    "cursor",
+    "fields",
+)
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that evicts the least recently used entries instead of
+    random ones: reads touch the file and culling removes the oldest files.
+    Lets processes on one host share cached responses.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        if value is not default:
+            try:
+                os.utime(self._key_to_file(key, version))
+            except OSError:
+                pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def last_used(fname):
+            try:
+                return os.path.getmtime(fname)
+            except OSError:
+                return 0
+
+        filelist.sort(key=last_used)
+        for fname in filelist[: max(len(filelist) // self._cull_frequency, 1)]:
+            self._delete(fname)
+
+
+def data_generation():
+    """
+    Number naming the current version of the site data, read from the
+    database (a primary key lookup), so every process sees a change made by
+    any other one whatever the cache backend.
+    """
+    generation = (
+        CurrentAnalysisRun.objects.filter(pk=CurrentAnalysisRun.POINTER_ID)
+        .values_list("generation", flat=True)
+        .first()
+    )
+    return generation or 0
+
+
+def bump_data_generation():
+    """
+    Invalidates every cached response. Called once site data or scores
+    changed and were committed (uploads, analysis runs). The increment is
+    done by the database, so concurrent bumps never end on the same value.
+    """
+    CurrentAnalysisRun.objects.get_or_create(pk=CurrentAnalysisRun.POINTER_ID)
+    CurrentAnalysisRun.objects.filter(pk=CurrentAnalysisRun.POINTER_ID).update(
+        generation=F("generation") + 1
+    )
+
+
+def response_cache_key(view_name, request, generation):
+    """
+    The cache key of a listing: the view, the data generation and the
+    CACHED_QUERY_PARAMS, normalized so param order does not matter.
+    """
+    params = {
+        name: sorted(value.strip() for value in request.query_params.getlist(name))
+        for name in CACHED_QUERY_PARAMS
+        if request.query_params.get(name, "").strip()
+    }
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"sites:{view_name}:{generation}:{digest}"
+
+
+def cached_listing(view_name, request, build):
+    """
+    build() for this request, served from the response cache while the
+    data generation is unchanged. The generation is read before building,
+    so a result computed while the data changed is stored under the old
+    generation and never served.
+    """
+    cache = caches[RESPONSE_CACHE]
+    key = response_cache_key(view_name, request, data_generation())
+    result = cache.get(key)
+    if result is None:
+        result = build()
+        cache.set(key, result, timeout=None)
+    return result
@@ -0,0 +1,159 @@
+from functools import lru_cache
+import numpy as np
+from sites.models import AnalysisParameters, ScoringCurve
+
+# { JSON_KEY: (DB_PARAMETER_NAME, DEFAULT_WEIGHT) }
+WEIGHT_PARAMETERS = {
+    "solar": ("solar_irradiance_weight", 0.35),
+    "area": ("area_weight", 0.25),
+    "grid": ("grid_distance_weight", 0.20),
+    "slope": ("slope_weight", 0.15),
+    "infra": ("infrastructure_weight", 0.05),
+}
+
+# Raw Sites columns the scores are derived from
+SCORING_INPUT_FIELDS = [
+    "solar_irradiance_kwh",
+    "area_sqm",
+    "grid_distance_km",
+    "slope_degrees",
+    "road_distance_km",
+]
+
+# { JSON_KEY: (INPUT_FIELD, FACTOR_FIELD, SCORE_FIELD) }, in the order the
+# weighted factors are summed into the total
+FACTOR_FIELDS = {
+    "solar": (
+        "solar_irradiance_kwh",
+        "solar_irradiance_factor",
+        "solar_irradiance_score",
+    ),
+    "area": ("area_sqm", "area_factor", "area_score"),
+    "grid": ("grid_distance_km", "grid_distance_factor", "grid_distance_score"),
+    "slope": ("slope_degrees", "slope_factor", "slope_score"),
+    "infra": ("road_distance_km", "infrastructure_factor", "infrastructure_score"),
+}
+
+# { JSON_KEY: ((input, score), ...) } breakpoints used until a ScoringCurve
+# is saved. Scores are interpolated linearly between breakpoints and held
+# at the first/last score outside them (see dump/database_schema.sql).
+DEFAULT_SCORING_CURVES = {
+    "solar": ((3.0, 0.0), (5.5, 100.0)),
+    "area": ((5000.0, 0.0), (50000.0, 100.0)),
+    "grid": ((1.0, 100.0), (20.0, 0.0)),
+    "slope": ((5.0, 100.0), (15.0, 50.0), (20.0, 0.0)),
+    "infra": ((0.5, 100.0), (5.0, 0.0)),
+}
+
+
+def load_weights():
+    """
+    Reads the current weights with a single query, falling back to the
+    defaults for any parameter that has not been saved yet.
+    """
+    weights_dict = dict(
+        AnalysisParameters.objects.values_list("parameter_name", "weight_value")
+    )
+    return {
+        json_key: float(weights_dict.get(db_name, default))
+        for json_key, (db_name, default) in WEIGHT_PARAMETERS.items()
+    }
+
+
+def load_curves():
+    """
+    Reads the scoring curves with a single query, falling back to
+    DEFAULT_SCORING_CURVES for any factor without a saved curve.
+    Returns { JSON_KEY: ((input, score), ...) }, hashable for compile_curve.
+    """
+    saved = dict(ScoringCurve.objects.values_list("factor", "points"))
+    return {
+        json_key: tuple((float(x), float(y)) for x, y in saved.get(json_key, default))
+        for json_key, default in DEFAULT_SCORING_CURVES.items()
+    }
+
+
+@lru_cache(maxsize=64)
+def compile_curve(points):
+    """
+    Compiles a piecewise-linear curve ((input, score), ...) with increasing
+    inputs into a function scoring a whole float array at once.
+
+    Each segment is evaluated as y0 + (x - x0) / (x1 - x0) * (y1 - y0),
+    the same operations as the original hard-coded formulas, so the default
+    curves reproduce them bit for bit.
+    """
+    xs = np.array([x for x, _ in points], dtype=float)
+    ys = np.array([y for _, y in points], dtype=float)
+    x0, y0 = xs[:-1], ys[:-1]
+    dx, dy = np.diff(xs), np.diff(ys)
+
+    def evaluate(values):
+        segment = np.clip(np.searchsorted(xs, values, side="right") - 1, 0, len(dx) - 1)
+        scores = y0[segment] + (values - x0[segment]) / dx[segment] * dy[segment]
+        scores = np.where(values <= xs[0], ys[0], scores)
+        return np.where(values >= xs[-1], ys[-1], scores)
+
+    return evaluate
+
+
+def round_scores(values):
+    """
+    Vectorized equivalent of Python's round(value, 2) for every element.
+
+    np.round() scales by 100 before rounding, which can land on the wrong
+    side of a .5 tie that round() resolves on the exact binary value. Those
+    few near-tie elements are re-rounded with round() so the results match
+    bit for bit; everything else stays vectorized.
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for index in np.flatnonzero(near_tie):
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def normalized_factors(columns, curves=None):
+    """
+    Scores every input column with its compiled curve (load_curves() when
+    'curves' is not given). Returns the unrounded 0-100 factor of every
+    site keyed by the AnalysisResults factor fields. The factors do not
+    depend on the weights, so they are stored and a weight change only has
+    to re-weight them.
+    """
+    if curves is None:
+        curves = load_curves()
+    return {
+        factor_field: compile_curve(curves[key])(columns[input_field])
+        for key, (input_field, factor_field, _) in FACTOR_FIELDS.items()
+    }
+
+
+def weighted_scores(factors, weights):
+    """
+    Turns normalized_factors() output into AnalysisResults scores: each
+    factor rounded, plus the weighted total. Returns float arrays.
+    """
+    scores = {}
+    total = 0
+    for key, (_, factor_field, score_field) in FACTOR_FIELDS.items():
+        scores[score_field] = round_scores(factors[factor_field])
+        total = total + factors[factor_field] * float(weights.get(key, 0))
+    scores["total_suitability_score"] = round_scores(total)
+    return scores
+
+
+def score_batch(columns, weights, curves=None):
+    """
+    Scores a whole batch of sites at once. This is the one scoring engine:
+    uploads, the recalculation and the what-if rankings all go through
+    normalized_factors() and the same compiled curves.
+
+    'columns' maps each SCORING_INPUT_FIELDS name to a float array and
+    'weights' is the { "solar", "area", "grid", "slope", "infra" } dict.
+    Returns AnalysisResults field names (scores and factors) mapped to lists.
+    """
+    factors = normalized_factors(columns, curves)
+    scores = {**weighted_scores(factors, weights), **factors}
+    return {field: values.tolist() for field, values in scores.items()}
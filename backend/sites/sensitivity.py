@@ -0,0 +1,156 @@
+import math
+import numpy as np
+from django.conf import settings
+from sites.models import Sites
+from sites.scoring import FACTOR_FIELDS
+from sites.whatif import get_factor_matrix
+
+# Rank percentiles reported for every site
+RANK_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def sample_weights(center, samples, concentration, seed=None):
+    """
+    Draws (samples x factors) weight vectors from a Dirichlet distribution
+    whose mean is the 'center' weights. A higher concentration keeps the
+    samples closer to the center. Factors weighted 0 get a tiny share so
+    the distribution stays defined.
+    """
+    center = np.array([float(center.get(key, 0)) for key in FACTOR_FIELDS])
+    alpha = np.maximum(center / center.sum() * concentration, 1e-3)
+    return np.random.default_rng(seed).dirichlet(alpha, size=samples)
+
+
+def top_ranks(factors, site_ids, weights, depth, seeds):
+    """
+    The 'depth' best sites of every weight vector in 'weights', as a
+    (samples x depth) array of site indexes in rank order (ties go to the
+    lowest site_id, like the what-if rankings).
+
+    Only sites that can reach the top 'depth' of some sample are scored
+    exactly: the depth-th best total among the 'seeds' sites is a lower
+    bound of the real cutoff, so a site below it in every sample is dropped
+    after one comparison.
+    """
+    if len(seeds) >= depth:
+        seed_totals = weights @ factors[seeds].T
+        cutoffs = np.partition(seed_totals, len(seeds) - depth, axis=1)[
+            :, len(seeds) - depth
+        ]
+    else:
+        cutoffs = np.full(len(weights), -np.inf)
+
+    totals = weights @ factors.T
+    reached = totals >= cutoffs[:, None]
+    candidates = np.flatnonzero(reached.any(axis=0))
+    totals = totals[:, candidates]
+
+    count = len(candidates)
+    if count > depth:
+        cutoffs = np.partition(totals, count - depth, axis=1)[:, count - depth]
+    else:
+        cutoffs = np.full(len(weights), -np.inf)
+
+    indexes = np.full((len(weights), depth), -1, dtype=np.int64)
+    for sample, (sample_totals, cutoff) in enumerate(zip(totals, cutoffs)):
+        # Every site tied with the cutoff, so ties can be ordered by site_id
+        kept = np.flatnonzero(sample_totals >= cutoff)
+        order = np.lexsort((site_ids[candidates[kept]], -sample_totals[kept]))[:depth]
+        indexes[sample, : len(order)] = candidates[kept[order]]
+    return indexes
+
+
+def rank_percentiles(counts, samples):
+    """
+    Nearest-rank percentiles from a histogram of ranks 1..depth; a
+    percentile that falls beyond the tracked depth is None.
+    """
+    cumulative = np.cumsum(counts)
+    percentiles = {}
+    for percentile in RANK_PERCENTILES:
+        needed = max(math.ceil(percentile / 100 * samples), 1)
+        rank = int(np.searchsorted(cumulative, needed)) + 1
+        percentiles[str(percentile)] = rank if rank <= len(counts) else None
+    return percentiles
+
+
+def weight_sensitivity(
+    center, samples, concentration, top_k, limit, site_ids=None, seed=None
+):
+    """
+    Scores every site under 'samples' weight vectors drawn around 'center'
+    and summarizes how each site's rank moves: its probability of being in
+    the top_k, its best rank and rank percentiles (exact down to
+    SITE_SENSITIVITY_RANK_DEPTH). Reports the 'limit' sites most often in
+    the top_k, or the given site_ids.
+
+    Samples are scored in blocks of SITE_SENSITIVITY_BLOCK_CELLS
+    (samples x sites) with one matrix multiply each, so memory stays flat
+    whatever the number of samples.
+    """
+    matrix = get_factor_matrix()
+    depth = max(top_k, settings.SITE_SENSITIVITY_RANK_DEPTH)
+    depth = min(depth, len(matrix))
+    weights = sample_weights(center, samples, concentration, seed)
+
+    ranked_sites = [np.empty(0, dtype=np.int64)]
+    ranks = [np.empty(0, dtype=np.int64)]
+    if depth:
+        seeds = np.empty(0, dtype=np.int64)
+        block = max(settings.SITE_SENSITIVITY_BLOCK_CELLS // len(matrix), 1)
+        for start in range(0, samples, block):
+            indexes = top_ranks(
+                matrix.factors,
+                matrix.site_ids,
+                weights[start : start + block],
+                depth,
+                seeds,
+            )
+            found = indexes >= 0
+            ranked_sites.append(indexes[found])
+            ranks.append(np.nonzero(found)[1])
+            # The sites ranked so far make the cutoffs of the next block tight
+            seeds = np.union1d(seeds, indexes[found])
+
+    # One rank histogram per site that reached the tracked depth at least once
+    ranked, positions = np.unique(np.concatenate(ranked_sites), return_inverse=True)
+    counts = np.zeros((len(ranked), depth), dtype=np.int64)
+    np.add.at(counts, (positions, np.concatenate(ranks)), 1)
+    top_k_share = counts[:, :top_k].sum(axis=1) / samples
+
+    if site_ids is not None:
+        all_ids = matrix.site_ids.tolist()
+        indexes = {site_id: index for index, site_id in enumerate(all_ids)}
+        reported = [indexes[site_id] for site_id in site_ids if site_id in indexes]
+    else:
+        # Samples beyond the tracked depth count as rank depth + 1
+        untracked = samples - counts.sum(axis=1)
+        mean_rank = counts @ np.arange(1, depth + 1) + untracked * (depth + 1)
+        # Most often in the top_k first, then lowest mean rank, then site_id
+        order = np.lexsort((matrix.site_ids[ranked], mean_rank, -top_k_share))
+        reported = ranked[order[:limit]].tolist()
+
+    histograms = dict(zip(ranked.tolist(), counts))
+    shares = dict(zip(ranked.tolist(), top_k_share.tolist()))
+    names = dict(
+        Sites.objects.filter(
+            site_id__in=matrix.site_ids[reported].tolist()
+        ).values_list("site_id", "site_name")
+    )
+    sites = []
+    for index in reported:
+        site_counts = histograms.get(index, np.zeros(depth, dtype=np.int64))
+        ranked_samples = np.flatnonzero(site_counts)
+        site_id = int(matrix.site_ids[index])
+        sites.append(
+            {
+                "site_id": site_id,
+                "site_name": names.get(site_id),
+                "probability_top_k": shares.get(index, 0.0),
+                "best_rank": (
+                    int(ranked_samples[0]) + 1 if len(ranked_samples) else None
+                ),
+                "rank_percentiles": rank_percentiles(site_counts, samples),
+            }
+        )
+    return {"samples": samples, "top_k": top_k, "rank_depth": depth, "sites": sites}
@@ -1,6 +1,28 @@
 from decimal import Decimal
+from django.conf import settings
 from rest_framework import serializers
-from .models import Sites, AnalysisResults, AnalysisParameters, SitesWithScores
+from django.utils import timezone
+from .models import (
+    Sites,
+    AnalysisResults,
+    AnalysisParameters,
+    ImportJob,
+    ScoringCurve,
+    SitesWithScores,
+    UploadSession,
+)
+from .constants import SITE_VALUE_RULES
+from .scoring import DEFAULT_SCORING_CURVES
+
+
+def check_value_rules(field, value):
+    """
+    Raises the message of the first SITE_VALUE_RULES range 'value' falls outside.
+    """
+    for low, high, message in SITE_VALUE_RULES[field]:
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise serializers.ValidationError(message)
+    return value
 
 
 class SiteSerializer(serializers.ModelSerializer):
@@ -8,7 +30,8 @@ class SiteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Sites
-        fields = "__all__"
+        # content_hash is internal bookkeeping of the upload path
+        exclude = ["content_hash"]
 
     # --- TEXT & CATEGORICAL VALIDATION ---
 
@@ -35,16 +58,14 @@ class SiteSerializer(serializers.ModelSerializer):
         return value
 
     # --- GEOGRAPHIC VALIDATION ---
+    # Ranges and messages live in SITE_VALUE_RULES so the column-wise
+    # validator applies exactly the same rules
 
     def validate_latitude(self, value):
-        if not (-90 <= value <= 90):
-            raise serializers.ValidationError("Latitude must be between -90 and 90.")
-        return value
+        return check_value_rules("latitude", value)
 
     def validate_longitude(self, value):
-        if not (-180 <= value <= 180):
-            raise serializers.ValidationError("Longitude must be between -180 and 180.")
-        return value
+        return check_value_rules("longitude", value)
 
     def validate_region(self, value):
         if not value:
@@ -54,173 +75,34 @@ class SiteSerializer(serializers.ModelSerializer):
     # --- PHYSICAL & NUMERIC VALIDATION ---
 
     def validate_area_sqm(self, value):
-        if value < 500:  # Minimum logic: anything smaller isn't a "site"
-            raise serializers.ValidationError(
-                "Area is too small for solar development (min 500 sqm)."
-            )
-        return value
+        return check_value_rules("area_sqm", value)
 
     def validate_solar_irradiance_kwh(self, value):
-        if not (0 <= value <= 10):  # Physical limit: even the Sahara doesn't exceed 8-9
-            raise serializers.ValidationError(
-                "Solar irradiance must be between 0 and 10 kWh/m²/day."
-            )
-        return value
+        return check_value_rules("solar_irradiance_kwh", value)
 
     def validate_grid_distance_km(self, value):
-        if value < 0:
-            raise serializers.ValidationError("Grid distance cannot be negative.")
-        if value > 500:
-            raise serializers.ValidationError(
-                "Distance exceeds 500km; site is likely too remote."
-            )
-        return value
+        return check_value_rules("grid_distance_km", value)
 
     def validate_slope_degrees(self, value):
-        if not (0 <= value <= 90):
-            raise serializers.ValidationError(
-                "Slope degrees must be between 0 (flat) and 90 (vertical)."
-            )
-        return value
+        return check_value_rules("slope_degrees", value)
 
     def validate_road_distance_km(self, value):
-        if value < 0:
-            raise serializers.ValidationError("Road distance cannot be negative.")
-        return value
+        return check_value_rules("road_distance_km", value)
 
     def validate_elevation_m(self, value):
-        # Validation for altitude (Earth's surface range)
-        if not (-413 <= value <= 8848):
-            raise serializers.ValidationError(
-                "Elevation must be between -413m (Dead Sea) and 8848m (Everest)."
-            )
-        return value
-
-
-class CalculatedAnalysisSerializer(serializers.ModelSerializer):
-    site_id = serializers.PrimaryKeyRelatedField(
-        queryset=Sites.objects.all(), source="site"
-    )
-
-    class Meta:
-        model = AnalysisResults
-        fields = [
-            "result_id",
-            "site_id",
-            "solar_irradiance_score",
-            "area_score",
-            "grid_distance_score",
-            "slope_score",
-            "infrastructure_score",
-            "total_suitability_score",
-            "parameters_snapshot",
-        ]
-        read_only_fields = [
-            "result_id",
-            "solar_irradiance_score",
-            "area_score",
-            "grid_distance_score",
-            "slope_score",
-            "infrastructure_score",
-            "total_suitability_score",
-            "parameters_snapshot",
-        ]
-
-    def validate(self, attrs):
-        """
-        'attrs' is a dictionary for a SINGLE item.
-        'attrs['site']' is now a full Sites model instance.
-        """
-        site = attrs.get("site")
-        weights_dict = dict(
-            AnalysisParameters.objects.values_list("parameter_name", "weight_value")
-        )
-
-        # 1. Weights logic (Pull from initial_data which is the raw dict)
-        weights = (
-            self.initial_data[0].get("parameters_snapshot")
-            if isinstance(self.initial_data, list) and self.initial_data
-            else None
-        ) or {
-            # Cast everything to float to match your site data types
-            "solar": float(weights_dict.get("solar_irradiance_weight", 0.35)),
-            "area": float(weights_dict.get("area_weight", 0.25)),
-            "grid": float(weights_dict.get("grid_distance_weight", 0.20)),
-            "slope": float(weights_dict.get("slope_weight", 0.15)),
-            "infra": float(weights_dict.get("infrastructure_weight", 0.05)),
-        }
-
-        # 2. Calculation logic (Using the site object attributes)
-        # No more data.get() needed for these!
-        irr = float(site.solar_irradiance_kwh)
-        area = float(site.area_sqm)
-        dist = float(site.grid_distance_km)
-        slope = float(site.slope_degrees)
-        road = float(site.road_distance_km)
-
-        # Apply Formulas
-        s_score = (
-            100.0 if irr >= 5.5 else (0.0 if irr < 3.0 else ((irr - 3.0) / 2.5) * 100)
-        )
-        a_score = (
-            100.0
-            if area >= 50000
-            else (0.0 if area < 5000 else ((area - 5000) / 45000) * 100)
-        )
-        g_score = (
-            100.0
-            if dist <= 1
-            else (0.0 if dist >= 20 else 100 - ((dist - 1) / 19) * 100)
-        )
-        i_score = (
-            100.0
-            if road <= 0.5
-            else (0.0 if road >= 5 else 100 - ((road - 0.5) / 4.5) * 100)
-        )
-
-        if slope <= 5:
-            sl_score = 100.0
-        elif slope > 20:
-            sl_score = 0.0
-        elif slope <= 15:
-            sl_score = 100 - ((slope - 5) / 10) * 50
-        else:
-            sl_score = 50 - ((slope - 15) / 5) * 50
-
-        total = (
-            (s_score * weights["solar"])
-            + (a_score * weights["area"])
-            + (g_score * weights["grid"])
-            + (sl_score * weights["slope"])
-            + (i_score * weights["infra"])
-        )
-
-        # 3. Update attrs with the calculated results
-        attrs.update(
-            {
-                "solar_irradiance_score": round(s_score, 2),
-                "area_score": round(a_score, 2),
-                "grid_distance_score": round(g_score, 2),
-                "slope_score": round(sl_score, 2),
-                "infrastructure_score": round(i_score, 2),
-                "total_suitability_score": round(total, 2),
-                "parameters_snapshot": weights,
-            }
-        )
-
-        return attrs
+        return check_value_rules("elevation_m", value)
 
 
 class SiteListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sites
-        fields = "__all__"
+        exclude = ["content_hash"]
 
 
 class SiteWithScoreSerializer(serializers.ModelSerializer):
     class Meta:
         model = SitesWithScores
-        fields = "__all__"
+        exclude = ["id", "run", "grid_cell"]
 
 
 class AnalysisResultSerializer(serializers.ModelSerializer):
@@ -246,7 +128,7 @@ class SiteDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Sites
-        fields = "__all__"
+        exclude = ["content_hash"]
 
 
 class NewWeightSerializer(serializers.Serializer):
@@ -288,3 +170,189 @@ class NewWeightSerializer(serializers.Serializer):
             )
             results.append(obj)
         return results
+
+
+class WhatIfSerializer(serializers.Serializer):
+    """
+    { "weights": [{ "solar", "area", "grid", "slope", "infra" }, ...],
+      "limit": N }. A single weight object is accepted without the list.
+    """
+
+    weights = serializers.ListField(
+        child=NewWeightSerializer(),
+        min_length=1,
+        max_length=settings.SITE_WHATIF_MAX_VECTORS,
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_WHATIF_MAX_LIMIT, default=10
+    )
+
+    def to_internal_value(self, data):
+        if isinstance(data.get("weights"), dict):
+            data = {**data, "weights": [data["weights"]]}
+        return super().to_internal_value(data)
+
+
+class SensitivitySerializer(serializers.Serializer):
+    """
+    { "samples": N, "concentration": C, "top_k": K, "limit": L,
+      "weights": {...}, "site_ids": [...], "seed": S }. Everything is
+    optional; the weights default to the stored AnalysisParameters.
+    """
+
+    samples = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_SENSITIVITY_MAX_SAMPLES, default=1000
+    )
+    concentration = serializers.FloatField(min_value=0.01, default=100.0)
+    top_k = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_SENSITIVITY_RANK_DEPTH, default=10
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_WHATIF_MAX_LIMIT, default=10
+    )
+    weights = NewWeightSerializer(required=False)
+    site_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=settings.SITE_WHATIF_MAX_LIMIT,
+    )
+    seed = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_site_ids(self, value):
+        known = set(
+            Sites.objects.filter(site_id__in=value).values_list("site_id", flat=True)
+        )
+        unknown = [site_id for site_id in dict.fromkeys(value) if site_id not in known]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown site_ids: {', '.join(map(str, unknown))}"
+            )
+        return value
+
+
+class NearestSerializer(serializers.Serializer):
+    """
+    ?lat=..&lon=..&k=..: the point to search around and how many sites.
+    """
+
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_NEAREST_MAX_K, default=10
+    )
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    """
+    ?field=site_name|region|land_type&prefix=..&limit=..
+    """
+
+    field = serializers.ChoiceField(
+        choices=["site_name", "region", "land_type"], default="site_name"
+    )
+    prefix = serializers.CharField(allow_blank=True, default="")
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.SITE_AUTOCOMPLETE_MAX_LIMIT, default=10
+    )
+
+
+class CurvePointsField(serializers.ListField):
+    """
+    [[input, score], ...]: at least two breakpoints, strictly increasing
+    inputs and scores between 0 and 100.
+    """
+
+    def __init__(self, **kwargs):
+        child = serializers.ListField(
+            child=serializers.FloatField(), min_length=2, max_length=2
+        )
+        super().__init__(child=child, min_length=2, **kwargs)
+
+    def to_internal_value(self, data):
+        points = super().to_internal_value(data)
+        inputs = [x for x, _ in points]
+        if any(low >= high for low, high in zip(inputs, inputs[1:])):
+            raise serializers.ValidationError(
+                "Curve inputs must be strictly increasing"
+            )
+        if any(not 0 <= y <= 100 for _, y in points):
+            raise serializers.ValidationError("Curve scores must be between 0 and 100")
+        return points
+
+
+class ScoringCurvesSerializer(serializers.Serializer):
+    """
+    { "solar": [[input, score], ...], ... }; factors left out keep their
+    current curve.
+    """
+
+    solar = CurvePointsField(required=False)
+    area = CurvePointsField(required=False)
+    grid = CurvePointsField(required=False)
+    slope = CurvePointsField(required=False)
+    infra = CurvePointsField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError(
+                f"Provide at least one of: {', '.join(DEFAULT_SCORING_CURVES)}"
+            )
+        return attrs
+
+    def save_curves(self):
+        return [
+            ScoringCurve.objects.update_or_create(
+                factor=factor, defaults={"points": points}
+            )[0]
+            for factor, points in self.validated_data.items()
+        ]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "job_id",
+            "filename",
+            "file_format",
+            "status",
+            "rows_processed",
+            "rows_inserted",
+            "rows_updated",
+            "rows_unchanged",
+            "rows_per_second",
+            "errors",
+            "attempts",
+            "started_at",
+            "finished_at",
+            "created_at",
+        ]
+
+    def get_rows_per_second(self, job):
+        if not job.started_at:
+            return 0
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        return round(job.rows_processed / elapsed, 2) if elapsed > 0 else 0
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    received_chunks = serializers.SerializerMethodField()
+    job = ImportJobSerializer(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            "upload_id",
+            "filename",
+            "total_chunks",
+            "received_chunks",
+            "completed_at",
+            "created_at",
+            "job",
+        ]
+
+    def get_received_chunks(self, session):
+        # Lets a client work out which chunks it still has to (re)send
+        return session.received_chunks()
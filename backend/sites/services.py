@@ -0,0 +1,782 @@
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import repeat
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from sites.models import (
+    AnalysisResults,
+    AnalysisRun,
+    CurrentAnalysisRun,
+    Sites,
+    SitesWithScores,
+)
+from sites.pool import init_scoring_worker
+from sites.readers import UploadFormatError, iter_column_batches, skip_rows
+from sites.response_cache import bump_data_generation
+from sites.scoring import (
+    FACTOR_FIELDS,
+    SCORING_INPUT_FIELDS,
+    load_curves,
+    load_weights,
+    normalized_factors,
+    score_batch,
+    weighted_scores,
+)
+from sites.spatial import grid_cell_sql
+from sites.validation import SiteColumnValidator
+
+
+class SiteUploadError(Exception):
+    """
+    Raised while ingesting an upload. Raising (instead of returning) from
+    inside transaction.atomic() is what rolls the upload back.
+    """
+
+    def __init__(self, error, details=None, processed=0):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+        self.processed = processed
+
+    def as_response_data(self):
+        return {
+            "error": self.error,
+            "details": self.details,
+            "processed": self.processed,
+        }
+
+
+# Columns rewritten when an uploaded site_id already exists (created_at is kept)
+SITE_UPSERT_FIELDS = [
+    field.name
+    for field in Sites._meta.concrete_fields
+    if not field.primary_key and field.name != "created_at"
+]
+
+
+def upsert_sites(sites):
+    """
+    Writes a batch of (unsaved) Sites with one INSERT ... ON DUPLICATE KEY
+    UPDATE (ON CONFLICT on SQLite/PostgreSQL) instead of one update_or_create
+    per row. Sites whose content hash matches the stored one are left alone.
+    Returns (written sites, { "inserted", "updated", "unchanged" } counts).
+    """
+    # Later rows win, exactly like the old sequential update_or_create loop
+    sites_by_id = {site.site_id: site for site in sites}
+    stored_hashes = dict(
+        Sites.objects.filter(site_id__in=sites_by_id).values_list(
+            "site_id", "content_hash"
+        )
+    )
+
+    changed = []
+    for site in sites_by_id.values():
+        site.content_hash = site.get_content_hash()
+        if stored_hashes.get(site.site_id) != site.content_hash:
+            changed.append(site)
+
+    if changed:
+        Sites.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            update_fields=SITE_UPSERT_FIELDS,
+            # MySQL always upserts on the primary key and rejects explicit targets
+            unique_fields=(
+                ["site_id"]
+                if connection.features.supports_update_conflicts_with_target
+                else None
+            ),
+        )
+
+    inserted = len(sites_by_id) - len(stored_hashes)
+    counts = {
+        "inserted": inserted,
+        "updated": len(changed) - inserted,
+        "unchanged": len(sites_by_id) - len(changed),
+    }
+    return changed, counts
+
+
+def persist_site_columns(validated):
+    """
+    Persists a batch validated by SiteColumnValidator: the sites are
+    upserted, and the new and changed ones are scored straight from the
+    typed columns and their AnalysisResults bulk-created without a
+    serializer. Returns the { "inserted", "updated", "unchanged" } counts
+    of the batch.
+    """
+    site_ids = validated["site_id"]
+
+    # Keep the last row of each site_id (later rows win, as with CSV), in
+    # site_id order: every writer locks sites in that order (see lock_sites)
+    _, last_from_end = np.unique(site_ids[::-1], return_index=True)
+    keep = len(site_ids) - 1 - last_from_end
+    columns = {name: values[keep] for name, values in validated.items()}
+
+    names = list(columns)
+    sites = [
+        Sites(**dict(zip(names, values)))
+        for values in zip(*(columns[name].tolist() for name in names))
+    ]
+    upserted_sites, counts = upsert_sites(sites)
+    if not upserted_sites:
+        return counts
+
+    # Only the new and changed sites are scored again
+    written = np.isin(columns["site_id"], [site.site_id for site in upserted_sites])
+    written_columns = {name: values[written] for name, values in columns.items()}
+    weights = load_weights()
+    # The factors are stored too, so a weight change can re-score in SQL
+    scores = score_batch(written_columns, weights)
+    AnalysisResults.objects.bulk_create(
+        [
+            AnalysisResults(
+                site=site,
+                parameters_snapshot=weights,
+                **{field: values[index] for field, values in scores.items()},
+            )
+            for index, site in enumerate(upserted_sites)
+        ]
+    )
+    written_ids = [site.site_id for site in upserted_sites]
+    for run_id in materialized_run_ids():
+        refresh_site_scores(run_id, written_ids)
+    # Cached listings are dropped once the batch is committed
+    transaction.on_commit(bump_data_generation)
+
+    return counts
+
+
+EMPTY_SUMMARY = {"processed": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+
+
+def iter_validated_batches(batches, error, first_row=1):
+    """
+    Validates each ColumnBatch column-wise with SiteColumnValidator and
+    yields (row count, validated columns). The first invalid batch raises
+    SiteUploadError(error) with the failing rows and fields.
+    """
+    validator = SiteColumnValidator()
+    for batch in batches:
+        validated, errors = validator.validate(batch.columns, len(batch), first_row)
+        if errors:
+            raise SiteUploadError(error, details=errors)
+        first_row += len(batch)
+        yield len(batch), validated
+
+
+def ingest_site_columns(batches, error, atomic=True, summary=None, on_batch=None):
+    """
+    Validates and persists a stream of ColumnBatches one batch at a time,
+    so memory stays flat whatever the size of the upload.
+
+    atomic=True keeps the all-or-nothing behaviour: every batch shares one
+    transaction and any failure rolls the whole upload back.
+    atomic=False commits batch by batch; on failure the batches already
+    written are kept and the error reports how many rows were processed.
+
+    'summary' resumes a previous run: its "processed" rows are skipped and
+    the counts keep accumulating. 'on_batch(summary)' is called inside each
+    batch transaction, so progress saved there commits with the batch.
+
+    Returns { "processed", "inserted", "updated", "unchanged" } counts;
+    "unchanged" rows matched the stored content hash and were skipped.
+    """
+    summary = {**EMPTY_SUMMARY, **(summary or {})}
+    batches = iter_validated_batches(
+        skip_rows(batches, summary["processed"]), error, summary["processed"] + 1
+    )
+
+    try:
+        with transaction.atomic() if atomic else nullcontext():
+            for length, validated in batches:
+                with transaction.atomic():
+                    counts = persist_site_columns(validated)
+                    progress = {
+                        "processed": summary["processed"] + length,
+                        **{key: summary[key] + counts[key] for key in counts},
+                    }
+                    if on_batch is not None:
+                        on_batch(progress)
+                summary = progress
+    except UploadFormatError as e:
+        raise SiteUploadError(
+            str(e), processed=0 if atomic else summary["processed"]
+        ) from e
+    except SiteUploadError as e:
+        e.processed = 0 if atomic else summary["processed"]
+        raise
+
+    return summary
+
+
+def upload_error(file_format):
+    # Kept as "CSV data invalid" for CSV, which API clients already match on
+    return "CSV data invalid" if file_format == "csv" else "Site data invalid"
+
+
+def ingest_upload(file_format, source, atomic=True, summary=None, on_batch=None):
+    """
+    Ingests an upload in any supported format (see readers.UPLOAD_FORMATS).
+    'source' is an iterable of byte chunks for streaming formats (CSV,
+    NDJSON) and a seekable binary file object for Parquet and Arrow.
+    """
+    batches = iter_column_batches(file_format, source, settings.SITE_UPLOAD_BATCH_SIZE)
+    return ingest_site_columns(
+        batches,
+        upload_error(file_format),
+        atomic=atomic,
+        summary=summary,
+        on_batch=on_batch,
+    )
+
+
+def validate_upload(file_format, source):
+    """
+    Dry run of ingest_upload(): the same column-wise validation, without
+    touching the database. Returns { "processed" }.
+    """
+    batches = iter_column_batches(file_format, source, settings.SITE_UPLOAD_BATCH_SIZE)
+    processed = 0
+    try:
+        for length, _ in iter_validated_batches(batches, upload_error(file_format)):
+            processed += length
+    except UploadFormatError as e:
+        raise SiteUploadError(str(e)) from e
+    return {"processed": processed}
+
+
+def scoring_columns(rows):
+    """
+    Turns (site_id, *SCORING_INPUT_FIELDS) tuples into
+    (site_ids, { field: float array }).
+    """
+    # float(Decimal) per value, exactly like the per-site conversions before
+    matrix = np.array(rows, dtype=float).reshape(
+        len(rows), 1 + len(SCORING_INPUT_FIELDS)
+    )
+    columns = {
+        field: matrix[:, index + 1] for index, field in enumerate(SCORING_INPUT_FIELDS)
+    }
+    return matrix[:, 0].astype(np.int64), columns
+
+
+def iter_scoring_chunks(chunk_size, start=None, stop=None):
+    """
+    Yields (site_ids, columns) for all sites (or those with start <= site_id
+    < stop), chunk_size sites at a time, with keyset pagination on the
+    primary key: each chunk is one "site_id > last ORDER BY site_id LIMIT n"
+    query, so only one chunk is ever held in memory. (Django cannot stream a
+    result set from MySQL; QuerySet.iterator() would still fetch it whole.)
+    """
+    queryset = Sites.objects.order_by("site_id").values_list(
+        "site_id", *SCORING_INPUT_FIELDS
+    )
+    if start is not None:
+        queryset = queryset.filter(site_id__gte=start)
+    if stop is not None:
+        queryset = queryset.filter(site_id__lt=stop)
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(site_id__gt=last_id)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield scoring_columns(rows)
+        last_id = rows[-1][0]
+
+
+def site_id_ranges(count):
+    """
+    Splits the site_id range into at most 'count' contiguous
+    [start, stop) slices of equal width.
+    """
+    bounds = Sites.objects.aggregate(low=Min("site_id"), high=Max("site_id"))
+    if bounds["low"] is None:
+        return []
+    low, high = bounds["low"], bounds["high"] + 1
+    width = max(-(-(high - low) // count), 1)
+    return [(start, min(start + width, high)) for start in range(low, high, width)]
+
+
+def quoted_column(field):
+    return connection.ops.quote_name(AnalysisResults._meta.get_field(field).column)
+
+
+def results_table():
+    return connection.ops.quote_name(AnalysisResults._meta.db_table)
+
+
+def write_analysis_results(site_ids, scores, run, analysis_timestamp):
+    """
+    Inserts one AnalysisResults row per site of 'run' straight from the
+    score (and factor) arrays with a single executemany. Building a model
+    instance per row dominated the recalculation time.
+    """
+    fields = ["site", *scores, "run", "analysis_timestamp", "parameters_snapshot"]
+    columns = ", ".join(quoted_column(field) for field in fields)
+    sql = (
+        f"INSERT INTO {results_table()} "
+        f"({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+
+    rows = zip(
+        site_ids.tolist(),
+        *(scores[field].tolist() for field in scores),
+        repeat(run.run_id),
+        # The same values auto_now_add and the JSONField would write
+        repeat(connection.ops.adapt_datetimefield_value(analysis_timestamp)),
+        repeat(json.dumps(run.parameters_snapshot)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(rows))
+
+
+def visible_results_sql(site_ids_sql=None, run_id=None):
+    """
+    SQL selecting the result_id every site currently shows, by the same
+    rule as the sites_with_scores view: its latest result that belongs to
+    the current run or was written on upload (outside any run).
+    'site_ids_sql' (placeholders or a subquery) limits it to those sites;
+    'run_id' selects what they show in that run instead of the current one.
+    """
+    sites_filter = (
+        f"AND {quoted_column('site')} IN ({site_ids_sql}) " if site_ids_sql else ""
+    )
+    pk = quoted_column("result_id")
+    run = quoted_column("run")
+    pointer = connection.ops.quote_name(CurrentAnalysisRun._meta.db_table)
+    pointer_run = connection.ops.quote_name(
+        CurrentAnalysisRun._meta.get_field("run").column
+    )
+    pointer_id = connection.ops.quote_name(
+        CurrentAnalysisRun._meta.get_field("pointer_id").column
+    )
+    if run_id is None:
+        run_sql = (
+            f"SELECT COALESCE({pointer_run}, 0) FROM {pointer} "
+            f"WHERE {pointer_id} = {CurrentAnalysisRun.POINTER_ID}"
+        )
+    else:
+        run_sql = str(int(run_id))
+    return (
+        f"SELECT {pk} FROM ("
+        f"SELECT {pk}, ROW_NUMBER() OVER (PARTITION BY {quoted_column('site')} "
+        f"ORDER BY {quoted_column('analysis_timestamp')} DESC, {pk} DESC) AS rn "
+        # COALESCE instead of "IS NULL OR =", which made SQLite give up
+        # the automatic index when joining the view
+        f"FROM {results_table()} WHERE COALESCE({run}, 0) IN (0, ({run_sql})) "
+        f"{sites_filter}"
+        f") ranked WHERE rn = 1"
+    )
+
+
+# Columns SitesWithScores copies from Sites; the rest come from the result
+MATERIALIZED_SITE_FIELDS = [
+    "site_id",
+    "site_name",
+    "latitude",
+    "longitude",
+    "area_sqm",
+    "solar_irradiance_kwh",
+    "grid_distance_km",
+    "slope_degrees",
+    "road_distance_km",
+    "elevation_m",
+    "land_type",
+    "region",
+]
+MATERIALIZED_RESULT_FIELDS = [
+    *(score for _, _, score in FACTOR_FIELDS.values()),
+    "total_suitability_score",
+    "analysis_timestamp",
+]
+
+
+def refresh_site_scores(run_id, site_ids):
+    """
+    Rewrites the SitesWithScores rows of run 'run_id' (0: before any run was
+    published) for 'site_ids' from the sites and the results they show in
+    that run, with one DELETE and one INSERT ... SELECT. Runs inside the
+    caller's transaction, so the rows change together with the data they
+    reflect. Callers pass at most one chunk of sites at a time (see
+    build_run_site_scores), so no statement ever rewrites the whole table.
+    """
+    quote = connection.ops.quote_name
+    table = quote(SitesWithScores._meta.db_table)
+    site_id = quote(Sites._meta.get_field("site_id").column)
+    pk = quoted_column("result_id")
+    run = quote(SitesWithScores._meta.get_field("run").column)
+    columns = [run] + [
+        quote(SitesWithScores._meta.get_field(field).column)
+        for field in MATERIALIZED_SITE_FIELDS + MATERIALIZED_RESULT_FIELDS
+    ]
+    values = (
+        ["%s"]
+        + [
+            f"s.{quote(Sites._meta.get_field(field).column)}"
+            for field in MATERIALIZED_SITE_FIELDS
+        ]
+        + [f"ar.{quoted_column(field)}" for field in MATERIALIZED_RESULT_FIELDS]
+    )
+    columns.append(quote(SitesWithScores._meta.get_field("grid_cell").column))
+    values.append(
+        grid_cell_sql(
+            f"s.{quote(Sites._meta.get_field('latitude').column)}",
+            f"s.{quote(Sites._meta.get_field('longitude').column)}",
+        )
+    )
+
+    site_ids = list(site_ids)
+    if not site_ids:
+        return
+    ids_sql = ", ".join(["%s"] * len(site_ids))
+
+    insert = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(values)} FROM {quote(Sites._meta.db_table)} s "
+        f"LEFT JOIN (SELECT r.* FROM ({visible_results_sql(ids_sql, run_id)}) v "
+        f"JOIN {results_table()} r ON r.{pk} = v.{pk}"
+        f") ar ON ar.{quoted_column('site')} = s.{site_id} "
+        f"WHERE s.{site_id} IN ({ids_sql})"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {run} = %s AND {site_id} IN ({ids_sql})",
+            [run_id, *site_ids],
+        )
+        cursor.execute(insert, [run_id, *site_ids, *site_ids])
+
+
+def listed_run_id():
+    """
+    The run the listings show, 0 before any run was published.
+    """
+    run_id = CurrentAnalysisRun.objects.values_list("run_id", flat=True).first()
+    return run_id or 0
+
+
+def materialized_run_ids():
+    """
+    The runs whose SitesWithScores rows a change to some sites has to
+    refresh: the listed run and every newer run still building, which may
+    have built the rows of those sites already. (Older runs can never be
+    published.) Read after the changed sites are locked: a run created
+    later builds their rows only once it can lock them too.
+    """
+    listed = listed_run_id()
+    building = AnalysisRun.objects.filter(
+        status=AnalysisRun.STATUS_BUILDING, run_id__gt=listed
+    ).values_list("run_id", flat=True)
+    return [listed, *building]
+
+
+def lock_sites(site_ids):
+    """
+    Locks the Sites rows of 'site_ids' until the end of the transaction, in
+    site_id order like upserts, so writers of the same sites' results and
+    SitesWithScores rows take turns instead of deadlocking.
+    """
+    list(
+        Sites.objects.filter(site_id__in=site_ids)
+        .order_by("site_id")
+        .select_for_update()
+        .values_list("site_id", flat=True)
+    )
+
+
+def iter_site_id_chunks(chunk_size):
+    """
+    Yields every site_id in lists of at most chunk_size, keyset paginated
+    like iter_scoring_chunks().
+    """
+    queryset = Sites.objects.order_by("site_id").values_list("site_id", flat=True)
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(site_id__gt=last_id)
+        site_ids = list(chunk[:chunk_size])
+        if not site_ids:
+            return
+        yield site_ids
+        last_id = site_ids[-1]
+
+
+def build_run_site_scores(run_id):
+    """
+    Writes the SitesWithScores rows of run 'run_id' for every site, one
+    SITE_RECALC_CHUNK_SIZE chunk (and one short transaction) at a time, and
+    drops the rows of sites that no longer exist.
+    """
+    for site_ids in iter_site_id_chunks(settings.SITE_RECALC_CHUNK_SIZE):
+        with transaction.atomic():
+            lock_sites(site_ids)
+            refresh_site_scores(run_id, site_ids)
+    SitesWithScores.all_runs.filter(run=run_id).exclude(
+        site_id__in=Sites.objects.values("site_id")
+    ).delete()
+
+
+def start_analysis_run(weights):
+    return AnalysisRun.objects.create(parameters_snapshot=weights)
+
+
+def publish_analysis_run(run, sites_scored):
+    """
+    Makes a finished run the one the listings show: a single UPDATE of the
+    CurrentAnalysisRun pointer. The run's SitesWithScores rows were built
+    while it was scored, so the listings switch with that one row. A run
+    that started before the one already published is only marked
+    completed, so a slow analyze can never replace newer weights. Returns
+    True when the pointer moved.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        AnalysisRun.objects.filter(pk=run.pk).update(
+            status=AnalysisRun.STATUS_COMPLETED,
+            completed_at=now,
+            sites_scored=sites_scored,
+        )
+        CurrentAnalysisRun.objects.get_or_create(pk=CurrentAnalysisRun.POINTER_ID)
+        published = (
+            CurrentAnalysisRun.objects.filter(pk=CurrentAnalysisRun.POINTER_ID)
+            .filter(Q(run__isnull=True) | Q(run__lt=run.pk))
+            .update(run=run, updated_at=now)
+        )
+
+    if published:
+        transaction.on_commit(bump_data_generation)
+    # Old runs go once the new pointer is committed, off the request thread
+    transaction.on_commit(prune_analysis_runs_in_background)
+    return bool(published)
+
+
+def fail_analysis_run(run):
+    AnalysisRun.objects.filter(pk=run.pk).update(
+        status=AnalysisRun.STATUS_FAILED, completed_at=timezone.now()
+    )
+
+
+def score_sites_into_run(run, curves, start=None, stop=None):
+    """
+    Scores the sites with start <= site_id < stop (all by default) into
+    'run' with the given scoring curves, SITE_RECALC_CHUNK_SIZE sites at a
+    time: each chunk is read, scored and committed, together with its
+    SitesWithScores rows for the run, before the next one is fetched, so
+    memory stays flat whatever the number of sites. Returns the number of
+    sites scored.
+    """
+    weights = run.parameters_snapshot
+    sites_scored = 0
+    for site_ids, columns in iter_scoring_chunks(
+        settings.SITE_RECALC_CHUNK_SIZE, start, stop
+    ):
+        factors = normalized_factors(columns, curves)
+        scores = {**weighted_scores(factors, weights), **factors}
+        with transaction.atomic():
+            lock_sites(site_ids.tolist())
+            write_analysis_results(site_ids, scores, run, run.created_at)
+            refresh_site_scores(run.run_id, site_ids.tolist())
+        sites_scored += len(site_ids)
+    return sites_scored
+
+
+def score_sites_in_pool(run, curves, workers):
+    """
+    Splits the sites into site_id ranges and scores them with
+    score_sites_into_run() across 'workers' processes. There are a few
+    more ranges than workers, so a worker that gets a sparse range picks
+    up another one instead of sitting idle.
+    """
+    ranges = site_id_ranges(workers * settings.SITE_RECALC_RANGES_PER_WORKER)
+    # Workers are spawned fresh (no copied database connections) and set
+    # Django up before receiving any range
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)) or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_scoring_worker,
+        initargs=(connection.settings_dict["NAME"],),
+    ) as pool:
+        futures = [
+            pool.submit(score_sites_into_run, run, curves, start, stop)
+            for start, stop in ranges
+        ]
+        try:
+            return sum(future.result() for future in futures)
+        except Exception:
+            # The run is discarded anyway; don't start the remaining ranges
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+def recalculate_all_sites(weights, workers=None):
+    """
+    Re-scores every site with the vectorized engine into a new AnalysisRun.
+    With more than one worker (SITE_RECALC_WORKERS by default) the sites are
+    scored by a process pool, each process writing its own site_id ranges.
+
+    Every chunk commits on its own; nobody reads the run's results until
+    publish_analysis_run() points the listings at it, which happens
+    only once every range succeeded. No lock is held on analysis_results
+    for the length of the run.
+    """
+    if workers is None:
+        workers = settings.SITE_RECALC_WORKERS
+
+    # Read once, so every chunk and worker scores with the same curves
+    curves = load_curves()
+    run = start_analysis_run(weights)
+    try:
+        if workers > 1 and Sites.objects.count() > settings.SITE_RECALC_CHUNK_SIZE:
+            sites_scored = score_sites_in_pool(run, curves, workers)
+        else:
+            sites_scored = score_sites_into_run(run, curves)
+    except Exception:
+        fail_analysis_run(run)
+        raise
+    publish_analysis_run(run, sites_scored)
+    return run
+
+
+def needs_full_recalculation():
+    """
+    True while some site shows no stored factors to re-weight: results
+    written before the factors were stored, or sites without any result.
+    """
+    sql = (
+        f"SELECT COUNT(*) FROM {results_table()} "
+        f"WHERE {quoted_column('result_id')} IN ({visible_results_sql()}) "
+        f"AND {quoted_column('solar_irradiance_factor')} IS NOT NULL"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        (with_factors,) = cursor.fetchone()
+    return with_factors != Sites.objects.count()
+
+
+def reweight_analysis_results(weights):
+    """
+    Writes a new AnalysisRun from the result every site currently shows,
+    with a single INSERT ... SELECT: the factors and factor scores are
+    copied and only the weighted total is computed (in SQL), so no site
+    data goes through Python.
+
+    ROUND() works on the decimal value, so on an exact .xx5 tie it can
+    differ by 0.01 from round() on the binary float in recalculate_all_sites.
+    """
+    run = start_analysis_run(weights)
+
+    factor_fields = [factor for _, factor, _ in FACTOR_FIELDS.values()]
+    score_fields = [score for _, _, score in FACTOR_FIELDS.values()]
+    columns = ["site", *factor_fields, *score_fields]
+    expressions = [quoted_column(field) for field in columns]
+    # Summed in FACTOR_FIELDS order, like weighted_scores()
+    columns.append("total_suitability_score")
+    total = " + ".join(f"{quoted_column(field)} * %s" for field in factor_fields)
+    expressions.append(f"ROUND({total}, 2)")
+    params = [float(weights.get(key, 0)) for key in FACTOR_FIELDS]
+    columns.extend(["run", "analysis_timestamp", "parameters_snapshot"])
+    expressions.extend(["%s", "%s", "%s"])
+    params.extend(
+        [
+            run.run_id,
+            connection.ops.adapt_datetimefield_value(run.created_at),
+            json.dumps(weights),
+        ]
+    )
+
+    sql = (
+        f"INSERT INTO {results_table()} "
+        f"({', '.join(quoted_column(field) for field in columns)}) "
+        f"SELECT {', '.join(expressions)} FROM {results_table()} "
+        f"WHERE {quoted_column('result_id')} IN ({visible_results_sql()})"
+    )
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            sites_scored = cursor.rowcount
+        build_run_site_scores(run.run_id)
+    except Exception:
+        fail_analysis_run(run)
+        raise
+    publish_analysis_run(run, sites_scored)
+    return run
+
+
+def apply_weights(weights):
+    """
+    Re-scores every site with new weights as a new AnalysisRun: one
+    INSERT ... SELECT over the stored factors, or a full
+    recalculate_all_sites() while some are missing.
+    """
+    if needs_full_recalculation():
+        return recalculate_all_sites(weights)
+    return reweight_analysis_results(weights)
+
+
+def prune_analysis_runs():
+    """
+    Deletes the runs no longer needed, one run (and its results) at a time:
+    completed runs beyond the SITE_ANALYSIS_RUNS_KEPT most recent, failed
+    runs and abandoned builds. Upload results older than every kept run are
+    hidden behind them and go too, as do the SitesWithScores rows of runs
+    older than the current one, which can never be listed again. The
+    current run is never deleted.
+    """
+    current_run_id = CurrentAnalysisRun.objects.values_list("run_id", flat=True).first()
+    kept = list(
+        AnalysisRun.objects.filter(status=AnalysisRun.STATUS_COMPLETED)
+        .order_by("-run_id")
+        .values_list("run_id", flat=True)[: settings.SITE_ANALYSIS_RUNS_KEPT]
+    )
+    if current_run_id is not None:
+        kept.append(current_run_id)
+
+    stale_before = timezone.now() - timedelta(
+        seconds=settings.SITE_ANALYSIS_RUN_STALE_AFTER
+    )
+    # Runs still building are left alone until they count as abandoned
+    prunable = (
+        AnalysisRun.objects.exclude(run_id__in=kept)
+        .exclude(status=AnalysisRun.STATUS_BUILDING, created_at__gte=stale_before)
+        .values_list("run_id", flat=True)
+    )
+    for run_id in list(prunable):
+        with transaction.atomic():
+            SitesWithScores.all_runs.filter(run=run_id).delete()
+            AnalysisResults.objects.filter(run_id=run_id).delete()
+            AnalysisRun.objects.filter(run_id=run_id).delete()
+
+    if current_run_id is not None:
+        # Publishing only moves forward (0 is the rows before any run)
+        SitesWithScores.all_runs.filter(run__lt=current_run_id).delete()
+
+    oldest_kept = (
+        AnalysisRun.objects.filter(run_id__in=kept).order_by("created_at").first()
+    )
+    if oldest_kept is not None:
+        AnalysisResults.objects.filter(
+            run__isnull=True, analysis_timestamp__lt=oldest_kept.created_at
+        ).delete()
+
+
+def run_analysis_pruner():
+    try:
+        prune_analysis_runs()
+    except DatabaseError:
+        # Nothing is lost; the next published run prunes again
+        pass
+    finally:
+        connection.close()
+
+
+def prune_analysis_runs_in_background():
+    threading.Thread(
+        target=run_analysis_pruner, name="analysis-run-pruner", daemon=True
+    ).start()
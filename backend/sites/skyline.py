@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from sites.scoring import FACTOR_FIELDS
+from sites.whatif import factor_matrix_version
+
+# The five factor scores the frontier is computed over, higher is better
+SKYLINE_FIELDS = [score_field for _, _, score_field in FACTOR_FIELDS.values()]
+
+# Sites compared against the frontier found so far in one go
+SKYLINE_BLOCK_SIZE = 1024
+
+
+def dominated(candidates, points):
+    """
+    Mask over the rows of 'candidates': True where some row of 'points'
+    dominates it (at least as good on every score and better on one).
+    Compared in SKYLINE_BLOCK_SIZE x SKYLINE_BLOCK_SIZE tiles to bound memory.
+    """
+    mask = np.zeros(len(candidates), dtype=bool)
+    for start in range(0, len(candidates), SKYLINE_BLOCK_SIZE):
+        tile = candidates[start : start + SKYLINE_BLOCK_SIZE].T[:, None, :]
+        tile_mask = mask[start : start + SKYLINE_BLOCK_SIZE]
+        for offset in range(0, len(points), SKYLINE_BLOCK_SIZE):
+            chunk = points[offset : offset + SKYLINE_BLOCK_SIZE].T[:, :, None]
+            # One (points x candidates) comparison per score column
+            at_least = chunk[0] >= tile[0]
+            better = chunk[0] > tile[0]
+            for column in range(1, len(chunk)):
+                at_least &= chunk[column] >= tile[column]
+                better |= chunk[column] > tile[column]
+            tile_mask |= (at_least & better).any(axis=0)
+    return mask
+
+
+def skyline(points):
+    """
+    Indexes of the rows of 'points' (sites x scores) that no other row
+    dominates, in ascending order.
+
+    Sort-filter-skyline: a site can only be dominated by one that sorts
+    before it by score sum, so the leading block of the sorted sites is
+    settled by comparing it with itself, joins the frontier, and then
+    removes every remaining site it dominates. Each site is compared with
+    frontier sites only, and most of them are eliminated by the first,
+    strongest blocks.
+    """
+    # Rounding can make the sums of a site and one it dominates equal; the
+    # scores themselves break that tie in the dominating site's favour
+    remaining = np.lexsort((*(-points.T[::-1]), -points.sum(axis=1)))
+    frontier = []
+    while len(remaining):
+        block = remaining[:SKYLINE_BLOCK_SIZE]
+        # Dominance is transitive, so comparing the block with itself is
+        # enough once the earlier frontier blocks filtered it
+        block = block[~dominated(points[block], points[block])]
+        frontier.append(block)
+        remaining = remaining[SKYLINE_BLOCK_SIZE:]
+        remaining = remaining[~dominated(points[remaining], points[block])]
+    return np.sort(np.concatenate(frontier or [np.empty(0, dtype=np.int64)]))
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def frontier_site_ids(queryset, filter_key):
+    """
+    site_ids on the Pareto frontier of 'queryset' (a filtered
+    SitesWithScores queryset). Sites without scores are left out: as NaN
+    they would never be dominated. Frontiers are cached per analysis run
+    and 'filter_key', for the SITE_SKYLINE_CACHE_SIZE most recent requests.
+    """
+    key = (factor_matrix_version(), filter_key)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    scored = queryset.order_by().filter(
+        **{f"{field}__isnull": False for field in SKYLINE_FIELDS}
+    )
+    rows = list(scored.values_list("site_id", *SKYLINE_FIELDS))
+    site_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    points = np.array([row[1:] for row in rows], dtype=float).reshape(
+        len(rows), len(SKYLINE_FIELDS)
+    )
+    frontier = site_ids[skyline(points)].tolist()
+
+    with _cache_lock:
+        _cache[key] = frontier
+        while len(_cache) > settings.SITE_SKYLINE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return frontier
@@ -0,0 +1,172 @@
+import math
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+from django.forms import ValidationError
+
+# Sites are bucketed into a fixed grid of 1/GRID_CELLS_PER_DEGREE degree
+# cells (about 11 km), numbered row by row from (-90, -180). Changing it
+# needs a migration that recomputes SitesWithScores.grid_cell.
+GRID_CELLS_PER_DEGREE = 10
+GRID_COLUMNS = 360 * GRID_CELLS_PER_DEGREE
+GRID_ROWS = 180 * GRID_CELLS_PER_DEGREE
+
+# A query spanning more grid rows reads whole rows in one index range
+# instead of one range per row
+GRID_MAX_ROW_RANGES = 64
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def grid_cell_sql(latitude, longitude):
+    """
+    SQL computing the grid cell of the 'latitude' and 'longitude' columns.
+    """
+    return (
+        f"FLOOR(({latitude} + 90) * {GRID_CELLS_PER_DEGREE}) * {GRID_COLUMNS} "
+        f"+ FLOOR(({longitude} + 180) * {GRID_CELLS_PER_DEGREE})"
+    )
+
+
+def grid_row(latitude):
+    return min(
+        max(math.floor((latitude + 90) * GRID_CELLS_PER_DEGREE), 0), GRID_ROWS - 1
+    )
+
+
+def grid_column(longitude):
+    return min(
+        max(math.floor((longitude + 180) * GRID_CELLS_PER_DEGREE), 0), GRID_COLUMNS - 1
+    )
+
+
+def grid_cell_ranges(south, west, north, east):
+    """
+    (first, last) grid_cell ranges covering a bounding box; west > east is a
+    box crossing the antimeridian. Every side is padded by one cell, so a
+    site the database rounded into the neighbouring cell is still covered.
+    """
+    rows = range(
+        max(grid_row(south) - 1, 0), min(grid_row(north) + 1, GRID_ROWS - 1) + 1
+    )
+    first = grid_column(west) - 1
+    last = grid_column(east) + 1
+    if west > east:
+        last += GRID_COLUMNS
+    if last - first + 1 >= GRID_COLUMNS:
+        columns = [(0, GRID_COLUMNS - 1)]
+    else:
+        # Wrap around the antimeridian: at most two column ranges
+        first, last = first % GRID_COLUMNS, last % GRID_COLUMNS
+        if first <= last:
+            columns = [(first, last)]
+        else:
+            columns = [(first, GRID_COLUMNS - 1), (0, last)]
+
+    if len(rows) > GRID_MAX_ROW_RANGES or columns == [(0, GRID_COLUMNS - 1)]:
+        # Consecutive rows are one contiguous range of cells
+        return [(rows[0] * GRID_COLUMNS, rows[-1] * GRID_COLUMNS + GRID_COLUMNS - 1)]
+    return [
+        (row * GRID_COLUMNS + first, row * GRID_COLUMNS + last)
+        for row in rows
+        for first, last in columns
+    ]
+
+
+def bbox_q(south, west, north, east):
+    """
+    Q matching sites inside a bounding box: index range scans over the grid
+    cells it covers, then the exact coordinates (also in the index).
+    """
+    cells = Q()
+    for first, last in grid_cell_ranges(south, west, north, east):
+        cells |= Q(grid_cell__range=(first, last))
+    inside = cells & Q(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        return inside & Q(longitude__gte=west, longitude__lte=east)
+    return inside & (Q(longitude__gte=west) | Q(longitude__lte=east))
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """
+    (south, west, north, east) of the smallest box holding every point
+    within radius_km of (latitude, longitude).
+    """
+    delta = radius_km / KM_PER_DEGREE
+    south, north = latitude - delta, latitude + delta
+    if south <= -90 or north >= 90:
+        # The circle holds a pole: every longitude
+        return max(south, -90), -180, min(north, 90), 180
+
+    # Widest longitude span of the circle (at the latitude of its tangents)
+    delta_longitude = math.degrees(
+        math.asin(
+            min(
+                math.sin(radius_km / EARTH_RADIUS_KM)
+                / math.cos(math.radians(latitude)),
+                1,
+            )
+        )
+    )
+    if delta_longitude >= 180:
+        return south, -180, north, 180
+    west = (longitude - delta_longitude + 540) % 360 - 180
+    east = (longitude + delta_longitude + 540) % 360 - 180
+    return south, west, north, east
+
+
+def haversine_km(latitude, longitude):
+    """
+    Expression: great-circle distance in km from (latitude, longitude) to
+    each site.
+    """
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    site_latitude = Radians(Cast(F("latitude"), FloatField()))
+    site_longitude = Radians(Cast(F("longitude"), FloatField()))
+    half_chord = Power(Sin((site_latitude - latitude) / 2), 2) + math.cos(
+        latitude
+    ) * Cos(site_latitude) * Power(Sin((site_longitude - longitude) / 2), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(half_chord))
+
+
+def parse_coordinate(value, name, limit):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid {name}: '{value}'")
+    if not -limit <= number <= limit:
+        raise ValidationError(f"{name} must be between -{limit} and {limit}.")
+    return number
+
+
+def parse_bbox(value):
+    """
+    ?bbox=west,south,east,north (degrees, the usual bbox order) as
+    (south, west, north, east).
+    """
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValidationError("bbox must be 'west,south,east,north'.")
+    west = parse_coordinate(parts[0], "west", 180)
+    south = parse_coordinate(parts[1], "south", 90)
+    east = parse_coordinate(parts[2], "east", 180)
+    north = parse_coordinate(parts[3], "north", 90)
+    if south > north:
+        raise ValidationError("bbox south must not be above north.")
+    return south, west, north, east
+
+
+def parse_point(query_params):
+    """
+    The (lat, lon) query params; None when neither is given.
+    """
+    latitude = query_params.get("lat")
+    longitude = query_params.get("lon")
+    if latitude is None and longitude is None:
+        return None
+    if latitude is None or longitude is None:
+        raise ValidationError("lat and lon must be given together.")
+    return (
+        parse_coordinate(latitude, "lat", 90),
+        parse_coordinate(longitude, "lon", 180),
+    )
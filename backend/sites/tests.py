@@ -1,3 +1,1927 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import math
+import os
+import random
+import struct
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+from django.forms import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.fields import empty
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from sites.autocomplete import SiteAutocomplete
+from sites.nearest import SiteTree, unit_vectors
+from sites.readers import UploadFormatError, iter_column_batches, iter_csv_batches
+from sites.response_cache import (
+    RESPONSE_CACHE,
+    LRUFileBasedCache,
+    bump_data_generation,
+    cached_listing,
+    data_generation,
+    response_cache_key,
+)
+from sites.scoring import (
+    DEFAULT_SCORING_CURVES,
+    FACTOR_FIELDS,
+    SCORING_INPUT_FIELDS,
+    compile_curve,
+    load_curves,
+    normalized_factors,
+    round_scores,
+    score_batch,
+)
+from sites.sensitivity import rank_percentiles, sample_weights, top_ranks
+from sites.renderers import FastJSONRenderer
+from sites.services import (
+    MATERIALIZED_RESULT_FIELDS,
+    MATERIALIZED_SITE_FIELDS,
+    SiteUploadError,
+    apply_weights,
+    fail_analysis_run,
+    ingest_upload,
+    iter_scoring_chunks,
+    listed_run_id,
+    needs_full_recalculation,
+    prune_analysis_runs,
+    publish_analysis_run,
+    recalculate_all_sites,
+    refresh_site_scores,
+    reweight_analysis_results,
+    score_sites_in_pool,
+    score_sites_into_run,
+    scoring_columns,
+    start_analysis_run,
+    upsert_sites,
+    visible_results_sql,
+)
+from sites.serializers import (
+    ScoringCurvesSerializer,
+    SiteSerializer,
+    SiteWithScoreSerializer,
+)
+from sites.skyline import SKYLINE_BLOCK_SIZE, SKYLINE_FIELDS, skyline
+from sites.spatial import (
+    EARTH_RADIUS_KM,
+    GRID_COLUMNS,
+    grid_cell_ranges,
+    grid_column,
+    grid_row,
+    parse_bbox,
+    radius_bbox,
+)
+from sites.utils import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    requested_fields,
+    serialize_values,
+)
+from sites.tiles import (
+    TILE_CLUSTER_BITS,
+    ClusterPyramid,
+    mercator_cells,
+    morton_keys,
+)
+from sites.validation import SiteColumnValidator
+from sites.jobs import (
+    claim_next_job,
+    enqueue_import,
+    finish_job,
+    iter_session_chunks,
+    requeue_job,
+    run_import_job,
+)
+from sites.models import (
+    AnalysisResults,
+    AnalysisRun,
+    CurrentAnalysisRun,
+    ImportJob,
+    ScoringCurve,
+    Sites,
+    SitesWithScores,
+    UploadSession,
+)
+from sites.whatif import FactorMatrix, get_factor_matrix, rank_sites
 
-# Create your tests here.
+
+def legacy_row_scores(irr, area, dist, slope, road, weights):
+    """
+    The original per-row scoring formulas of the old analysis serializer,
+    kept verbatim as the reference for the vectorized engine.
+    """
+    s_score = 100.0 if irr >= 5.5 else (0.0 if irr < 3.0 else ((irr - 3.0) / 2.5) * 100)
+    a_score = (
+        100.0
+        if area >= 50000
+        else (0.0 if area < 5000 else ((area - 5000) / 45000) * 100)
+    )
+    g_score = (
+        100.0 if dist <= 1 else (0.0 if dist >= 20 else 100 - ((dist - 1) / 19) * 100)
+    )
+    i_score = (
+        100.0
+        if road <= 0.5
+        else (0.0 if road >= 5 else 100 - ((road - 0.5) / 4.5) * 100)
+    )
+
+    if slope <= 5:
+        sl_score = 100.0
+    elif slope > 20:
+        sl_score = 0.0
+    elif slope <= 15:
+        sl_score = 100 - ((slope - 5) / 10) * 50
+    else:
+        sl_score = 50 - ((slope - 15) / 5) * 50
+
+    total = (
+        (s_score * weights["solar"])
+        + (a_score * weights["area"])
+        + (g_score * weights["grid"])
+        + (sl_score * weights["slope"])
+        + (i_score * weights["infra"])
+    )
+
+    return {
+        "solar_irradiance_score": round(s_score, 2),
+        "area_score": round(a_score, 2),
+        "grid_distance_score": round(g_score, 2),
+        "slope_score": round(sl_score, 2),
+        "infrastructure_score": round(i_score, 2),
+        "total_suitability_score": round(total, 2),
+    }
+
+
+def site_row(site_id, **values):
+    """
+    One valid uploaded site as text values, like a CSV row.
+    """
+    return {
+        "site_id": str(site_id),
+        "site_name": f"Site {site_id}",
+        "latitude": f"{26 + site_id / 100:.7f}",
+        "longitude": f"{75 + site_id / 100:.7f}",
+        "area_sqm": str(5000 + 1000 * site_id),
+        "solar_irradiance_kwh": f"{3 + site_id % 7 * 0.45:.2f}",
+        "grid_distance_km": f"{site_id % 23 * 0.9:.2f}",
+        "slope_degrees": f"{site_id % 25 * 0.85:.2f}",
+        "road_distance_km": f"{site_id % 11 * 0.55:.2f}",
+        "elevation_m": str(100 + site_id),
+        "land_type": "Barren" if site_id % 2 else "Scrub",
+        "region": "Rajasthan" if site_id % 3 else "Gujarat",
+        **values,
+    }
+
+
+def site_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode()
+
+
+def as_bytes(value):
+    return struct.pack("<d", value)
+
+
+def isolate_site_indexes(test):
+    """
+    Gives 'test' empty in-process indexes: the data generation restarts at
+    0 in every test, so indexes built by an earlier test would look current.
+    """
+    for module, key in (
+        ("whatif", "matrix"),
+        ("nearest", "tree"),
+        ("tiles", "pyramid"),
+        ("autocomplete", "autocomplete"),
+    ):
+        test.enterContext(mock.patch.dict(f"sites.{module}._cache", {key: None}))
+    test.enterContext(mock.patch.dict("sites.skyline._cache", clear=True))
+
+
+class ScoreBatchTests(SimpleTestCase):
+    weights = {"solar": 0.35, "area": 0.25, "grid": 0.2, "slope": 0.15, "infra": 0.05}
+
+    def build_rows(self):
+        rng = random.Random(1234)
+        # Each row follows SCORING_INPUT_FIELDS: irr, area, dist, slope, road
+        # Values on and around every breakpoint of the formulas
+        rows = list(
+            zip(
+                [0, 2.99, 3.0, 3.01, 4.25, 5.49, 5.5, 5.51, 10],
+                [500, 4999, 5000, 5001, 27500, 49999, 50000, 50001, 10**6],
+                [0, 0.99, 1, 1.01, 10.5, 19.99, 20, 20.01, 500],
+                [0, 4.99, 5, 5.01, 15, 15.01, 19.99, 20, 20.01],
+                [0, 0.49, 0.5, 0.51, 2.75, 4.99, 5, 5.01, 99],
+            )
+        )
+        # Plus random values at the precision the Sites columns store
+        for _ in range(5000):
+            rows.append(
+                (
+                    round(rng.uniform(0, 10), 2),
+                    rng.randint(500, 150000),
+                    round(rng.uniform(0, 30), 2),
+                    round(rng.uniform(0, 30), 2),
+                    round(rng.uniform(0, 8), 2),
+                )
+            )
+        return rows
+
+    def test_matches_legacy_per_row_formulas_bit_for_bit(self):
+        rows = self.build_rows()
+        columns = {
+            field: np.array([row[index] for row in rows], dtype=float)
+            for index, field in enumerate(SCORING_INPUT_FIELDS)
+        }
+        scores = score_batch(columns, self.weights, DEFAULT_SCORING_CURVES)
+
+        for position, row in enumerate(rows):
+            expected = legacy_row_scores(*map(float, row), self.weights)
+            for field, value in expected.items():
+                self.assertEqual(
+                    as_bytes(scores[field][position]),
+                    as_bytes(value),
+                    f"{field} differs for row {row}",
+                )
+
+    def test_round_scores_matches_round_on_ties(self):
+        values = np.array([0.125, 0.375, 1.005, 2.675, 12.345, 99.995, 47.115])
+        self.assertEqual(
+            [as_bytes(value) for value in round_scores(values).tolist()],
+            [as_bytes(round(float(value), 2)) for value in values],
+        )
+
+
+class CompileCurveTests(SimpleTestCase):
+    def reference(self, points, value):
+        """
+        Piecewise-linear interpolation one value at a time.
+        """
+        if value <= points[0][0]:
+            return points[0][1]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if value < x1:
+                return y0 + (value - x0) / (x1 - x0) * (y1 - y0)
+        return points[-1][1]
+
+    def test_matches_reference_interpolation(self):
+        rng = random.Random(4321)
+        curves = [
+            *DEFAULT_SCORING_CURVES.values(),
+            ((0.0, 10.0), (2.5, 80.0), (4.0, 80.0), (7.0, 100.0)),
+            ((-5.0, 100.0), (0.0, 0.0), (5.0, 100.0)),
+        ]
+        for points in curves:
+            values = [x for x, _ in points]
+            values += [x + delta for x, _ in points for delta in (-0.01, 0.01)]
+            low, high = points[0][0] - 5, points[-1][0] + 5
+            values += [rng.uniform(low, high) for _ in range(500)]
+            scores = compile_curve(points)(np.array(values, dtype=float))
+            for value, score in zip(values, scores.tolist()):
+                self.assertAlmostEqual(
+                    score, self.reference(points, value), places=9, msg=value
+                )
+
+    def test_scores_only_change_with_the_curve(self):
+        columns = {
+            field: np.array([value])
+            for field, value in zip(SCORING_INPUT_FIELDS, [4.5, 30000, 6, 10, 1])
+        }
+        curves = {**DEFAULT_SCORING_CURVES, "solar": ((3.0, 0.0), (6.0, 100.0))}
+        default = normalized_factors(columns, DEFAULT_SCORING_CURVES)
+        changed = normalized_factors(columns, curves)
+        self.assertEqual(default["solar_irradiance_factor"].tolist(), [60.0])
+        self.assertEqual(changed["solar_irradiance_factor"].tolist(), [50.0])
+        for field in default:
+            if field != "solar_irradiance_factor":
+                self.assertEqual(default[field].tolist(), changed[field].tolist())
+
+
+class ScoringCurvesSerializerTests(SimpleTestCase):
+    def test_rejects_invalid_curves(self):
+        invalid = [
+            [[3.0, 0]],
+            [[3.0, 0], [3.0, 100]],
+            [[5.0, 0], [3.0, 100]],
+            [[3.0, 0], [5.5, 101]],
+            [[3.0, 0], [5.5]],
+        ]
+        for points in invalid:
+            serializer = ScoringCurvesSerializer(data={"solar": points})
+            self.assertFalse(serializer.is_valid(), points)
+            self.assertIn("solar", serializer.errors)
+
+    def test_accepts_partial_updates(self):
+        serializer = ScoringCurvesSerializer(
+            data={"slope": [[0, 100], [10, 60], [25, 0]]}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(
+            serializer.validated_data,
+            {"slope": [[0.0, 100.0], [10.0, 60.0], [25.0, 0.0]]},
+        )
+
+
+class RankSitesTests(SimpleTestCase):
+    def build_matrix(self):
+        rng = random.Random(7)
+        columns = {
+            "solar_irradiance_kwh": [round(rng.uniform(2, 7), 2) for _ in range(500)],
+            "area_sqm": [rng.randint(500, 150000) for _ in range(500)],
+            "grid_distance_km": [round(rng.uniform(0, 15), 2) for _ in range(500)],
+            "slope_degrees": [round(rng.uniform(0, 20), 2) for _ in range(500)],
+            "road_distance_km": [round(rng.uniform(0, 12), 2) for _ in range(500)],
+        }
+        # Two copies of every site, so every total is tied with another site
+        columns = {
+            field: np.array(values * 2, dtype=float)
+            for field, values in columns.items()
+        }
+        factors = normalized_factors(columns, DEFAULT_SCORING_CURVES)
+        site_ids = np.arange(1000, dtype=np.int64)[::-1] + 1
+        matrix = np.column_stack(
+            [factors[field] for _, field, _ in FACTOR_FIELDS.values()]
+        )
+        return columns, FactorMatrix(site_ids, matrix, version=None)
+
+    def test_matches_recalculation_totals_and_orders_ties_by_site_id(self):
+        columns, matrix = self.build_matrix()
+        vectors = [
+            {"solar": 0.3, "area": 0.3, "grid": 0.2, "slope": 0.1, "infra": 0.1},
+            {"solar": 0.0, "area": 0.0, "grid": 0.0, "slope": 0.0, "infra": 1.0},
+        ]
+        with mock.patch("sites.whatif.get_factor_matrix", return_value=matrix):
+            rankings = rank_sites(vectors, limit=25)
+
+        for vector, ranking in zip(vectors, rankings):
+            totals = score_batch(columns, vector, DEFAULT_SCORING_CURVES)[
+                "total_suitability_score"
+            ]
+            expected = sorted(
+                zip(matrix.site_ids.tolist(), totals),
+                key=lambda pair: (-pair[1], pair[0]),
+            )[:25]
+            self.assertEqual(
+                [site_id for site_id, _ in ranking], [e[0] for e in expected]
+            )
+            for (_, total), (_, expected_total) in zip(ranking, expected):
+                self.assertAlmostEqual(total, expected_total, delta=0.01)
+
+    def test_blocks_rank_like_one_multiply(self):
+        _, matrix = self.build_matrix()
+        vectors = [
+            {"solar": 0.3, "area": 0.3, "grid": 0.2, "slope": 0.1, "infra": 0.1},
+            {"solar": 0.0, "area": 0.0, "grid": 0.0, "slope": 0.0, "infra": 1.0},
+            {"solar": 0.1, "area": 0.5, "grid": 0.1, "slope": 0.2, "infra": 0.1},
+        ]
+        with mock.patch("sites.whatif.get_factor_matrix", return_value=matrix):
+            whole = rank_sites(vectors, limit=25)
+            # 2000 cells: two vectors of the 1000 sites per block
+            with override_settings(SITE_WHATIF_BLOCK_CELLS=2000):
+                blocked = rank_sites(vectors, limit=25)
+
+        self.assertEqual(blocked, whole)
+
+
+class WeightSensitivityTests(SimpleTestCase):
+    center = {"solar": 0.35, "area": 0.25, "grid": 0.2, "slope": 0.15, "infra": 0.05}
+
+    def test_samples_average_to_the_center_weights(self):
+        weights = sample_weights(self.center, 20000, 100, seed=1)
+        self.assertTrue(np.allclose(weights.sum(axis=1), 1))
+        self.assertTrue(
+            np.allclose(weights.mean(axis=0), list(self.center.values()), atol=0.005)
+        )
+
+    def test_top_ranks_match_a_full_sort(self):
+        rng = np.random.default_rng(3)
+        # Whole-number factors, so many totals are tied
+        factors = rng.integers(0, 101, size=(2000, 5)).astype(float)
+        site_ids = rng.permutation(2000).astype(np.int64) + 1
+        weights = sample_weights(self.center, 40, 50, seed=2)
+
+        first = top_ranks(factors, site_ids, weights, 25, np.empty(0, dtype=int))
+        # Seeded with the sites found, as for the following blocks
+        seeded = top_ranks(factors, site_ids, weights, 25, np.unique(first))
+        for sample, vector in enumerate(weights):
+            expected = np.lexsort((site_ids, -(vector @ factors.T)))[:25]
+            self.assertEqual(first[sample].tolist(), expected.tolist())
+            self.assertEqual(seeded[sample].tolist(), expected.tolist())
+
+    def test_rank_percentiles_beyond_depth_are_none(self):
+        # 10 samples: ranks 1, 1, 2, 3, 3, 3 and four beyond depth 3
+        self.assertEqual(
+            rank_percentiles(np.array([2, 1, 3]), 10),
+            {"5": 1, "25": 2, "50": 3, "75": None, "95": None},
+        )
+
+
+class SkylineTests(SimpleTestCase):
+    def pairwise_skyline(self, points):
+        return [
+            index
+            for index, point in enumerate(points)
+            if not ((points >= point).all(axis=1) & (points > point).any(axis=1)).any()
+        ]
+
+    def test_matches_pairwise_comparison(self):
+        rng = np.random.default_rng(11)
+        count = SKYLINE_BLOCK_SIZE * 2 + 100
+        x = rng.uniform(0, 100, (count, 1))
+        cases = [
+            # Few distinct values: many ties and duplicate sites
+            rng.integers(0, 4, (count, 5)).astype(float),
+            rng.uniform(0, 100, (count, 5)).round(2),
+            # Anti-correlated scores give a large frontier
+            np.hstack([x, 100 - x, rng.uniform(0, 100, (count, 3))]).round(2),
+            np.empty((0, 5)),
+        ]
+        for points in cases:
+            self.assertEqual(skyline(points).tolist(), self.pairwise_skyline(points))
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = encode_cursor(Decimal("87.05"), 1234)
+        self.assertEqual(decode_cursor(token), (Decimal("87.05"), 1234))
+        # URL-safe without padding or quoting
+        self.assertRegex(token, r"^[A-Za-z0-9_-]+$")
+
+    def test_round_trip_without_total(self):
+        self.assertEqual(decode_cursor(encode_cursor(None, 12)), (None, 12))
+
+    def test_rejects_tampered_tokens(self):
+        for token in ["garbage!!", "e30", encode_cursor("abc", 1), ""]:
+            with self.assertRaises(ValidationError, msg=token):
+                decode_cursor(token)
+
+
+class SparseFieldsTests(SimpleTestCase):
+    fields = list(SiteWithScoreSerializer().fields)
+
+    def site_rows(self):
+        values = {
+            "site_id": 7,
+            "site_name": 'Line\u2028sep "quoted" \\ caf\u00e9 \x01',
+            "latitude": Decimal("-12.5000000"),
+            "longitude": Decimal("77.1234567"),
+            "area_sqm": Decimal("12000.00"),
+            "solar_irradiance_kwh": Decimal("5.50"),
+            "grid_distance_km": Decimal("-0.00"),
+            "slope_degrees": Decimal("3.5"),
+            "road_distance_km": Decimal("1.234"),
+            "elevation_m": Decimal("120"),
+            "land_type": "Barren",
+            "region": None,
+            "solar_irradiance_score": Decimal("100.00"),
+            "area_score": Decimal("1E+1"),
+            "grid_distance_score": None,
+            "slope_score": Decimal("99.999"),
+            "infrastructure_score": Decimal("0.00"),
+            "total_suitability_score": Decimal("87.05"),
+            "analysis_timestamp": datetime(2026, 1, 2, 3, 4, 5, 6, dt_timezone.utc),
+        }
+        unscored = dict(values, site_id=8, site_name="Plain")
+        for field in self.fields[12:]:
+            unscored[field] = None
+        return [values, unscored]
+
+    def serialize(self, rows, fields):
+        queryset = mock.Mock()
+        queryset.values_list.side_effect = lambda *columns: [
+            tuple(row[column] for column in columns) for row in rows
+        ]
+        return serialize_values(queryset, SiteWithScoreSerializer, fields)
+
+    def test_values_match_serializer(self):
+        rows = self.site_rows()
+        expected = SiteWithScoreSerializer(
+            [SitesWithScores(**row) for row in rows], many=True
+        ).data
+        for fields in [
+            self.fields,
+            ["site_id", "total_suitability_score"],
+            ["latitude", "analysis_timestamp"],
+        ]:
+            data = self.serialize(rows, fields)
+            self.assertEqual(
+                data, [{field: row[field] for field in fields} for row in expected]
+            )
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = self.serialize(self.site_rows(), self.fields)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b"\\u2028", FastJSONRenderer().render(data))
+
+    def test_requested_fields(self):
+        factory = APIRequestFactory()
+        request = Request(
+            factory.get("/", {"fields": "total_suitability_score, site_id"})
+        )
+        self.assertEqual(
+            requested_fields(request, SiteWithScoreSerializer),
+            ["site_id", "total_suitability_score"],
+        )
+        request = Request(factory.get("/"))
+        self.assertEqual(
+            requested_fields(request, SiteWithScoreSerializer), self.fields
+        )
+        for value in ["grid_cell", "site_id,nope"]:
+            request = Request(factory.get("/", {"fields": value}))
+            with self.assertRaises(ValidationError, msg=value):
+                requested_fields(request, SiteWithScoreSerializer)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def request(self, query):
+        return Request(APIRequestFactory().get("/api/sites/" + query))
+
+    def test_key_ignores_param_order_and_unrelated_params(self):
+        key = response_cache_key(
+            "list", self.request("?limit=5&q=col:area_score,min_score:10&q=a"), "g1"
+        )
+        self.assertEqual(
+            key,
+            response_cache_key(
+                "list",
+                self.request("?q=a&utm=x&q=col:area_score,min_score:10&limit=5"),
+                "g1",
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            response_cache_key(
+                "list", self.request("?limit=5&q=col:area_score,min_score:10"), "g1"
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            response_cache_key(
+                "list",
+                self.request("?limit=5&q=col:area_score,min_score:10&q=a"),
+                "g2",
+            ),
+        )
+
+    def test_file_cache_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = LRUFileBasedCache(
+                location, {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_FREQUENCY": 3}}
+            )
+            for age, key in enumerate(["a", "b", "c"], start=1):
+                cache.set(key, key)
+                os.utime(cache._key_to_file(key), (age, age))
+            # Reading "a" makes "b" the least recently used entry
+            cache.get("a")
+            cache.set("d", "d")
+            self.assertEqual([cache.get(key) for key in "abcd"], ["a", None, "c", "d"])
+
+
+class NearestTests(SimpleTestCase):
+    def brute_force(self, site_ids, latitudes, longitudes, latitude, longitude, k):
+        points = unit_vectors(latitudes, longitudes)
+        gaps = points - unit_vectors([latitude], [longitude])[0]
+        distances = (gaps**2).sum(axis=1)
+        order = np.lexsort((site_ids, distances))[:k]
+        return site_ids[order].tolist()
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(4)
+        latitudes = rng.uniform(-90, 90, 3000)
+        longitudes = rng.uniform(-180, 180, 3000)
+        # Duplicate coordinates, so ties must fall back to site_id
+        latitudes[:500], longitudes[:500] = latitudes[500:1000], longitudes[500:1000]
+        site_ids = rng.permutation(3000) + 1
+        tree = SiteTree(site_ids, latitudes, longitudes, version=None)
+        for latitude, longitude, k in [(0, 0, 5), (89.9, 10, 20), (-10, 179.9, 40)]:
+            found, distances = tree.nearest(latitude, longitude, k)
+            self.assertEqual(
+                found,
+                self.brute_force(
+                    site_ids, latitudes, longitudes, latitude, longitude, k
+                ),
+            )
+            self.assertEqual(distances, sorted(distances))
+
+    def test_mask_limits_the_candidates(self):
+        rng = np.random.default_rng(8)
+        latitudes = rng.uniform(8, 35, 2000)
+        longitudes = rng.uniform(68, 97, 2000)
+        site_ids = np.arange(1, 2001)
+        tree = SiteTree(site_ids, latitudes, longitudes, version=None)
+        kept = site_ids % 7 == 0
+        found, _ = tree.nearest(
+            20, 75, 10, allowed=np.isin(tree.site_ids, site_ids[kept])
+        )
+        self.assertEqual(
+            found,
+            self.brute_force(
+                site_ids[kept], latitudes[kept], longitudes[kept], 20, 75, 10
+            ),
+        )
+        self.assertEqual(tree.nearest(20, 75, 3, np.zeros(2000, dtype=bool)), ([], []))
+
+    def test_distance_is_great_circle_km(self):
+        tree = SiteTree([1, 2], [0, 0], [179.5, -179.5], version=None)
+        found, distances = tree.nearest(0, 180, 2)
+        self.assertEqual(found, [1, 2])
+        # Half a degree along the equator, across the antimeridian
+        self.assertAlmostEqual(distances[0], EARTH_RADIUS_KM * math.radians(0.5))
+
+
+class TileTests(SimpleTestCase):
+    def build(self, sites):
+        rng = np.random.default_rng(6)
+        self.latitudes = rng.uniform(8, 35, sites)
+        self.longitudes = rng.uniform(68, 97, sites)
+        self.scores = rng.uniform(0, 100, sites).round(2)
+        self.scores[rng.random(sites) < 0.1] = np.nan
+        return ClusterPyramid(
+            np.arange(1, sites + 1),
+            self.latitudes,
+            self.longitudes,
+            self.scores,
+            version=None,
+        )
+
+    def expected(self, zoom, x, y):
+        """
+        The clusters of a tile, grouped site by site.
+        """
+        columns, rows = mercator_cells(
+            self.latitudes, self.longitudes, zoom + TILE_CLUSTER_BITS
+        )
+        inside = np.flatnonzero(
+            (columns >> TILE_CLUSTER_BITS == x) & (rows >> TILE_CLUSTER_BITS == y)
+        )
+        groups = {}
+        for index in inside:
+            groups.setdefault((columns[index], rows[index]), []).append(index)
+        clusters = []
+        for members in groups.values():
+            scores = self.scores[members]
+            scores = scores[~np.isnan(scores)]
+            clusters.append(
+                (
+                    len(members),
+                    round(self.latitudes[members].mean(), 4),
+                    float(scores.max()) if len(scores) else None,
+                )
+            )
+        return sorted(clusters, key=str)
+
+    def test_tiles_match_site_by_site_grouping(self):
+        pyramid = self.build(5000)
+        # Coarse zooms come from precomputed levels, deep ones from the sites
+        self.assertIn(2, pyramid.levels)
+        self.assertNotIn(12, pyramid.levels)
+        for zoom in [0, 2, 5, 8, 12]:
+            columns, rows = mercator_cells([20.0], [75.0], zoom)
+            x, y = int(columns[0]), int(rows[0])
+            clusters = pyramid.tile(zoom, x, y)
+            got = sorted(
+                (
+                    cluster["count"],
+                    round(cluster["latitude"], 4),
+                    cluster["max_suitability_score"],
+                )
+                for cluster in clusters
+            )
+            self.assertEqual(sorted(got, key=str), self.expected(zoom, x, y), zoom)
+            self.assertLessEqual(len(clusters), 4**TILE_CLUSTER_BITS)
+
+    def test_world_tile_holds_every_site(self):
+        pyramid = self.build(300)
+        clusters = pyramid.tile(0, 0, 0)
+        self.assertEqual(sum(cluster["count"] for cluster in clusters), 300)
+        self.assertEqual(pyramid.tile(3, 0, 0), [])
+
+    def test_morton_keys_nest(self):
+        columns, rows = np.array([5, 1023, 77]), np.array([9, 0, 600])
+        self.assertEqual(
+            (morton_keys(columns, rows) >> 2).tolist(),
+            morton_keys(columns >> 1, rows >> 1).tolist(),
+        )
+
+
+class AutocompleteTests(SimpleTestCase):
+    rows = [
+        (1, "Jaipur North", "Rajasthan", "Barren", Decimal("70.00")),
+        (2, "jaisalmer", "Rajasthan", "Scrub", Decimal("91.50")),
+        (3, "Jaipur South", "Rajasthan", "Barren", Decimal("70.00")),
+        (4, "Jodhpur", "Rajasthan", "Barren", None),
+        (5, "Jalgaon", "Maharashtra", "Agricultural", Decimal("55.25")),
+        (6, "Ærø", "Región", "Scrub", Decimal("40.00")),
+    ]
+
+    def values(self, results):
+        return [result["value"] for result in results]
+
+    def test_best_scores_first_then_alphabetical(self):
+        index = SiteAutocomplete(self.rows, generation="g")
+        self.assertEqual(
+            self.values(index.search("site_name", "JA", 10)),
+            ["jaisalmer", "Jaipur North", "Jaipur South", "Jalgaon"],
+        )
+        self.assertEqual(
+            self.values(index.search("site_name", "jai", 2)),
+            ["jaisalmer", "Jaipur North"],
+        )
+        # A site without a score still matches, after every scored one
+        self.assertEqual(self.values(index.search("site_name", "j", 10))[-1], "Jodhpur")
+        self.assertEqual(index.search("site_name", "jx", 10), [])
+
+    def test_grouped_fields_count_sites(self):
+        index = SiteAutocomplete(self.rows, generation="g")
+        self.assertEqual(
+            index.search("region", "r", 10),
+            [
+                {
+                    "value": "Rajasthan",
+                    "count": 4,
+                    "max_suitability_score": Decimal("91.50"),
+                },
+                {
+                    "value": "Región",
+                    "count": 1,
+                    "max_suitability_score": Decimal("40.00"),
+                },
+            ],
+        )
+        self.assertEqual(self.values(index.search("land_type", "", 1)), ["Scrub"])
+
+    def test_case_folding_and_empty_index(self):
+        index = SiteAutocomplete(self.rows, generation="g")
+        self.assertEqual(self.values(index.search("site_name", "æR", 10)), ["Ærø"])
+        # Accents are not folded
+        self.assertEqual(self.values(index.search("region", "REGIO", 10)), [])
+        self.assertEqual(
+            SiteAutocomplete([], generation="g").search("region", "", 5), []
+        )
+
+
+class SpatialTests(SimpleTestCase):
+    def cell(self, latitude, longitude):
+        return grid_row(latitude) * GRID_COLUMNS + grid_column(longitude)
+
+    def covered(self, ranges, cell):
+        return any(first <= cell <= last for first, last in ranges)
+
+    def test_bbox_cells_cover_every_point_inside(self):
+        rng = random.Random(5)
+        boxes = [(20, 75, 21, 76), (-2, 170, 2, -170), (-90, -180, 90, 180)]
+        boxes.append((10, 60, 40, 100))
+        for south, west, north, east in boxes:
+            ranges = grid_cell_ranges(south, west, north, east)
+            for _ in range(500):
+                latitude = rng.uniform(south, north)
+                if west <= east:
+                    longitude = rng.uniform(west, east)
+                else:
+                    longitude = (rng.uniform(west, east + 360) + 180) % 360 - 180
+                self.assertTrue(
+                    self.covered(ranges, self.cell(latitude, longitude)),
+                    (south, west, north, east, latitude, longitude),
+                )
+
+    def test_antimeridian_box_skips_the_other_side(self):
+        ranges = grid_cell_ranges(-2, 170, 2, -170)
+        self.assertFalse(self.covered(ranges, self.cell(0, 0)))
+        self.assertTrue(self.covered(ranges, self.cell(0, 179.95)))
+        self.assertTrue(self.covered(ranges, self.cell(0, -179.95)))
+
+    def test_radius_box_holds_the_circle(self):
+        rng = random.Random(9)
+        for latitude, longitude, radius_km in [(20, 75, 50), (-70, 179, 900)]:
+            south, west, north, east = radius_bbox(latitude, longitude, radius_km)
+            for _ in range(500):
+                # A random point on the circle's edge
+                bearing = rng.uniform(0, 2 * math.pi)
+                angle = radius_km / EARTH_RADIUS_KM
+                lat1, lon1 = math.radians(latitude), math.radians(longitude)
+                lat2 = math.asin(
+                    math.sin(lat1) * math.cos(angle)
+                    + math.cos(lat1) * math.sin(angle) * math.cos(bearing)
+                )
+                lon2 = lon1 + math.atan2(
+                    math.sin(bearing) * math.sin(angle) * math.cos(lat1),
+                    math.cos(angle) - math.sin(lat1) * math.sin(lat2),
+                )
+                point_lat = math.degrees(lat2)
+                point_lon = (math.degrees(lon2) + 540) % 360 - 180
+                self.assertTrue(south - 1e-9 <= point_lat <= north + 1e-9)
+                if west <= east:
+                    self.assertTrue(west - 1e-9 <= point_lon <= east + 1e-9)
+                else:
+                    self.assertTrue(
+                        point_lon >= west - 1e-9 or point_lon <= east + 1e-9
+                    )
+
+    def test_radius_box_around_a_pole_spans_every_longitude(self):
+        self.assertEqual(radius_bbox(89.5, 10, 100)[1::2], (-180, 180))
+
+    def test_parse_bbox(self):
+        self.assertEqual(parse_bbox("75,20,76,21.5"), (20, 75, 21.5, 76))
+        for value in ["75,20,76", "a,20,76,21", "75,21,76,20", "75,20,190,21"]:
+            with self.assertRaises(ValidationError, msg=value):
+                parse_bbox(value)
+
+
+def serializer_errors(rows):
+    """
+    Row errors of SiteSerializer(many=True) as [{ "row", "errors" }], the
+    shape SiteColumnValidator reports.
+    """
+    serializer = SiteSerializer(data=rows, many=True)
+    if serializer.is_valid():
+        return []
+    # Depending on the DRF version errors is a list or a dict keyed by index
+    errors = serializer.errors
+    indexed = errors.items() if isinstance(errors, dict) else enumerate(errors)
+    return [
+        {
+            "row": index + 1,
+            "errors": {
+                field: list(map(str, messages))
+                for field, messages in row_errors.items()
+            },
+        }
+        for index, row_errors in indexed
+        if row_errors
+    ]
+
+
+class SiteColumnValidatorTests(SimpleTestCase):
+    valid_row = {
+        "site_id": "7",
+        "site_name": "Site 7",
+        "latitude": "26.9124336",
+        "longitude": "75.7872709",
+        "area_sqm": "25000",
+        "solar_irradiance_kwh": "5.75",
+        "grid_distance_km": "3.20",
+        "slope_degrees": "4.50",
+        "road_distance_km": "0.80",
+        "elevation_m": "431",
+        "land_type": "Wasteland",
+        "region": "Rajasthan",
+    }
+
+    # Unusual values per field; every one is also checked through SiteSerializer
+    odd_values = [
+        "",
+        " ",
+        None,
+        empty,
+        "abc",
+        " 12.5 ",
+        "1e3",
+        "-0",
+        "+5",
+        "007",
+        "12.0",
+        "0.0",
+        ".5",
+        "5.",
+        "+-1",
+        "1.2.3",
+        "1,000",
+        "123456789",
+        "1.234567891",
+        "99.999",
+        "-413",
+        "8849",
+        "499",
+        "500",
+        "10.001",
+        "-90.0000000",
+        "90.00000001",
+        "00000000000000000001.5",
+        "nan",
+        "Infinity",
+        "\x00x",
+        "12\x00",
+        "a" * 300,
+        "  name  ",
+        12,
+        12.5,
+        1e20,
+        True,
+    ]
+
+    def build_rows(self):
+        rng = random.Random(99)
+        rows = []
+        for field in self.valid_row:
+            for value in self.odd_values:
+                row = dict(self.valid_row)
+                if value is empty:
+                    del row[field]
+                else:
+                    row[field] = value
+                rows.append(row)
+        # Random rows around the range limits of SITE_VALUE_RULES
+        for index in range(300):
+            row = dict(self.valid_row, site_id=str(index))
+            row["latitude"] = f"{rng.uniform(-95, 95):.6f}"
+            row["area_sqm"] = str(rng.randint(0, 1000))
+            row["grid_distance_km"] = f"{rng.uniform(-5, 600):.2f}"
+            row["elevation_m"] = str(rng.randint(-500, 9000))
+            rows.append(row)
+        return rows
+
+    def validate_columns(self, rows):
+        columns = {
+            field: [row.get(field, empty) for row in rows] for field in self.valid_row
+        }
+        return SiteColumnValidator().validate(columns, len(rows))
+
+    def test_errors_match_site_serializer(self):
+        rows = self.build_rows()
+        validated, errors = self.validate_columns(rows)
+        self.assertIsNone(validated)
+        self.assertEqual(errors, serializer_errors(rows))
+
+    def test_valid_values_match_site_serializer(self):
+        rows = [dict(self.valid_row, site_id=str(index)) for index in range(5)]
+        rows[1]["latitude"] = " -12.5 "
+        rows[2]["area_sqm"] = 12000.0
+        rows[3]["site_name"] = "  padded  "
+
+        validated, errors = self.validate_columns(rows)
+        self.assertEqual(errors, [])
+
+        serializer = SiteSerializer(data=rows, many=True)
+        self.assertTrue(serializer.is_valid())
+        for index, expected in enumerate(serializer.validated_data):
+            for field, value in expected.items():
+                got = validated[field][index]
+                self.assertEqual(got, value if isinstance(value, str) else float(value))
+
+    def test_csv_batches_follow_dict_reader(self):
+        data = (
+            "site_id,site_name,region\n"
+            "1,One,North\n"
+            "\n"
+            "2,Two\n"
+            "3,Three,South,extra\n"
+        ).encode()
+        batches = list(iter_csv_batches([data[:17], data[17:]], batch_size=2))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(list(batches[0].columns["region"]), ["North", None])
+        self.assertEqual(list(batches[1].columns["site_name"]), ["Three"])
+        self.assertEqual(list(batches[1].columns["region"]), ["South"])
+
+
+def site_table(rows):
+    """
+    A typed Arrow table of site_row() values: integer and float columns
+    for the numbers, a dictionary-encoded region and text for the rest.
+    """
+    import pyarrow as pa
+
+    def column(field, convert, type):
+        return pa.array([convert(row[field]) for row in rows], type=type)
+
+    return pa.table(
+        {
+            "site_id": column("site_id", int, pa.int64()),
+            "site_name": column("site_name", str, pa.string()),
+            "latitude": column("latitude", float, pa.float64()),
+            "longitude": column("longitude", float, pa.float64()),
+            "area_sqm": column("area_sqm", int, pa.int32()),
+            "solar_irradiance_kwh": column("solar_irradiance_kwh", float, pa.float64()),
+            "grid_distance_km": column("grid_distance_km", float, pa.float64()),
+            # Numbers as text are parsed like CSV values
+            "slope_degrees": column("slope_degrees", str, pa.string()),
+            "road_distance_km": column("road_distance_km", float, pa.float64()),
+            "elevation_m": column("elevation_m", int, pa.int16()),
+            "land_type": column("land_type", str, pa.string()),
+            "region": column("region", str, pa.string()).dictionary_encode(),
+        }
+    )
+
+
+@override_settings(SITE_UPLOAD_BATCH_SIZE=2)
+class UploadReaderTests(TestCase):
+    rows = [site_row(site_id) for site_id in range(1, 6)]
+
+    def assertStoredRows(self, rows):
+        stored = {site.site_id: site for site in Sites.objects.all()}
+        self.assertEqual(sorted(stored), [int(row["site_id"]) for row in rows])
+        for row in rows:
+            site = stored[int(row["site_id"])]
+            for field, value in row.items():
+                expected = Sites._meta.get_field(field).to_python(value)
+                self.assertEqual(getattr(site, field), expected, field)
+
+    def parquet_file(self, table):
+        import pyarrow.parquet as pq
+
+        output = io.BytesIO()
+        pq.write_table(table, output, row_group_size=3)
+        output.seek(0)
+        return output
+
+    def arrow_file(self, table, stream=False):
+        import pyarrow as pa
+
+        output = io.BytesIO()
+        writer = (pa.ipc.new_stream if stream else pa.ipc.new_file)(
+            output, table.schema
+        )
+        writer.write_table(table)
+        writer.close()
+        output.seek(0)
+        return output
+
+    def test_ndjson_coerces_json_types(self):
+        lines = []
+        for row in self.rows:
+            item = dict(row, site_id=int(row["site_id"]))
+            item["area_sqm"] = float(row["area_sqm"])
+            item["latitude"] = float(row["latitude"])
+            lines.append(json.dumps(item))
+        data = ("\n".join(lines) + "\n\n").encode()
+
+        summary = ingest_upload("ndjson", [data[:50], data[50:]])
+
+        self.assertEqual(summary["processed"], 5)
+        self.assertStoredRows(self.rows)
+
+    def test_ndjson_missing_key_is_a_required_field(self):
+        partial = dict(self.rows[1])
+        del partial["region"]
+        data = "\n".join(map(json.dumps, [self.rows[0], partial])).encode()
+
+        batch = next(iter_column_batches("ndjson", [data], batch_size=2))
+        self.assertEqual(batch.columns["region"], ["Rajasthan", empty])
+
+        with self.assertRaises(SiteUploadError) as raised:
+            ingest_upload("ndjson", [data])
+        self.assertEqual(
+            raised.exception.details,
+            [{"row": 2, "errors": {"region": ["This field is required."]}}],
+        )
+
+    def test_parquet_and_arrow_coerce_typed_columns(self):
+        table = site_table(self.rows)
+        sources = [
+            ("parquet", self.parquet_file(table)),
+            ("arrow", self.arrow_file(table)),
+            ("arrow", self.arrow_file(table, stream=True)),
+        ]
+        for file_format, source in sources:
+            with self.subTest(file_format=file_format):
+                Sites.objects.all().delete()
+                batches = list(iter_column_batches(file_format, source, batch_size=2))
+                self.assertEqual(sum(map(len, batches)), 5)
+                self.assertLessEqual(max(map(len, batches)), 2)
+                source.seek(0)
+
+                summary = ingest_upload(file_format, source)
+
+                self.assertEqual(summary["processed"], 5)
+                self.assertStoredRows(self.rows)
+
+    def test_arrow_nulls_are_reported_per_row(self):
+        import pyarrow as pa
+
+        table = site_table(self.rows)
+        elevation = pa.array([None, None, 103, 104, None], type=pa.int16())
+        table = table.set_column(
+            table.schema.get_field_index("elevation_m"), "elevation_m", elevation
+        )
+
+        with self.assertRaises(SiteUploadError) as raised:
+            ingest_upload("arrow", self.arrow_file(table), atomic=True)
+        self.assertEqual([error["row"] for error in raised.exception.details], [1, 2])
+        self.assertFalse(Sites.objects.exists())
+
+    def test_bad_files_are_format_errors(self):
+        cases = [
+            ("ndjson", [b'{"site_id": 1}\n{"site_id": \n']),
+            ("ndjson", [b"[1, 2]\n"]),
+            ("parquet", io.BytesIO(b"not a parquet file")),
+            ("arrow", io.BytesIO(b"not an arrow file")),
+        ]
+        for file_format, source in cases:
+            with self.subTest(file_format=file_format):
+                with self.assertRaises(UploadFormatError):
+                    list(iter_column_batches(file_format, source, batch_size=2))
+
+    def test_upload_view_rejects_a_bad_file(self):
+        upload = SimpleUploadedFile("sites.parquet", b"PAR1 truncated")
+        response = self.client.post(reverse("upload-site"), {"site_file": upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid Parquet file", response.json()["error"])
+        self.assertFalse(Sites.objects.exists())
+
+
+@override_settings(SITE_UPLOAD_BATCH_SIZE=2)
+class UploadTransactionTests(TestCase):
+    rows = [site_row(site_id) for site_id in range(1, 7)]
+    rows[4]["latitude"] = "95"
+
+    def upload(self, query=""):
+        upload = SimpleUploadedFile("sites.csv", site_csv(self.rows))
+        return self.client.post(reverse("upload-site") + query, {"site_file": upload})
+
+    def test_atomic_upload_rolls_back_every_batch(self):
+        response = self.upload("?atomic=1")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["processed"], 0)
+        self.assertFalse(Sites.objects.exists())
+        self.assertFalse(AnalysisResults.objects.exists())
+
+    def test_default_upload_keeps_earlier_batches(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["processed"], 4)
+        self.assertEqual(response.json()["details"][0]["row"], 5)
+        self.assertEqual(
+            sorted(Sites.objects.values_list("site_id", flat=True)), [1, 2, 3, 4]
+        )
+        self.assertEqual(AnalysisResults.objects.count(), 4)
+
+
+class UpsertSitesTests(TestCase):
+    def ingest(self, rows):
+        return ingest_upload("csv", [site_csv(rows)])
+
+    def test_reupload_counts_and_skips_unchanged_sites(self):
+        rows = [site_row(site_id) for site_id in range(1, 4)]
+        summary = self.ingest(rows)
+        self.assertEqual(
+            summary, {"processed": 3, "inserted": 3, "updated": 0, "unchanged": 0}
+        )
+        self.assertEqual(AnalysisResults.objects.count(), 3)
+        stored = {site.site_id: site for site in Sites.objects.all()}
+
+        summary = self.ingest(rows)
+        self.assertEqual(
+            summary, {"processed": 3, "inserted": 0, "updated": 0, "unchanged": 3}
+        )
+        # Unchanged sites are neither rewritten nor scored again
+        self.assertEqual(AnalysisResults.objects.count(), 3)
+        for site in Sites.objects.all():
+            self.assertEqual(site.updated_at, stored[site.site_id].updated_at)
+
+        rows[1] = site_row(2, site_name="Renamed", slope_degrees="12.00")
+        summary = self.ingest(rows + [site_row(4)])
+        self.assertEqual(
+            summary, {"processed": 4, "inserted": 1, "updated": 1, "unchanged": 2}
+        )
+        self.assertEqual(
+            sorted(AnalysisResults.objects.values_list("site_id", flat=True)),
+            [1, 2, 2, 3, 4],
+        )
+        renamed = Sites.objects.get(site_id=2)
+        self.assertEqual(renamed.site_name, "Renamed")
+        self.assertEqual(renamed.slope_degrees, Decimal("12.00"))
+        self.assertEqual(renamed.created_at, stored[2].created_at)
+        self.assertEqual(renamed.content_hash, renamed.get_content_hash())
+
+    def test_update_rewrites_every_uploaded_field(self):
+        self.ingest([site_row(5)])
+        changed = site_row(
+            5,
+            site_name="Moved",
+            latitude="-12.5000000",
+            longitude="130.2500000",
+            area_sqm="80000",
+            solar_irradiance_kwh="6.10",
+            grid_distance_km="0.50",
+            slope_degrees="1.25",
+            road_distance_km="0.10",
+            elevation_m="12",
+            land_type="Desert",
+            region="Northern Territory",
+        )
+        summary = self.ingest([changed])
+        self.assertEqual(summary["updated"], 1)
+
+        site = Sites.objects.get(site_id=5)
+        for field, value in changed.items():
+            stored = getattr(site, field)
+            expected = type(stored)(value) if field != "site_id" else 5
+            self.assertEqual(stored, expected, field)
+
+    def test_later_rows_of_a_batch_win(self):
+        sites = []
+        for name in ("First", "Second"):
+            site = Sites()
+            for field, value in site_row(9, site_name=name).items():
+                field = Sites._meta.get_field(field)
+                setattr(site, field.attname, field.to_python(value))
+            sites.append(site)
+        written, counts = upsert_sites(sites)
+
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "unchanged": 0})
+        self.assertEqual([site.site_name for site in written], ["Second"])
+        self.assertEqual(Sites.objects.get(site_id=9).site_name, "Second")
+
+
+class ImportJobClaimTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SITE_IMPORT_DIR=directory.name))
+        rows = [site_row(site_id) for site_id in range(1, 4)]
+        self.job = enqueue_import(SimpleUploadedFile("sites.csv", site_csv(rows)))
+
+    def make_stale(self, job):
+        ImportJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(days=1)
+        )
+
+    def test_claim_takes_each_job_once(self):
+        job = claim_next_job("worker-a")
+
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertEqual(job.status, ImportJob.STATUS_RUNNING)
+        self.assertEqual(job.worker, "worker-a")
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(claim_next_job("worker-b"))
+
+    def test_reclaim_fences_the_stale_worker(self):
+        stale = claim_next_job("worker-a")
+        self.make_stale(stale)
+        job = claim_next_job("worker-b")
+        self.assertEqual((job.worker, job.attempts), ("worker-b", 2))
+
+        # The first worker wakes up: its batches roll back and it leaves
+        # the job alone
+        run_import_job(stale)
+        self.assertFalse(Sites.objects.exists())
+        self.assertFalse(finish_job(stale, ImportJob.STATUS_FAILED))
+        self.assertFalse(requeue_job(stale))
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.worker, job.rows_processed),
+            (ImportJob.STATUS_RUNNING, "worker-b", 0),
+        )
+
+        run_import_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.rows_processed, job.rows_inserted), (3, 3))
+        self.assertFalse(os.path.exists(job.file_path))
+
+    def test_requeued_job_is_claimed_again(self):
+        job = claim_next_job("worker-a")
+        self.assertTrue(requeue_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (ImportJob.STATUS_QUEUED, None))
+
+        job = claim_next_job("worker-b")
+        self.assertEqual((job.worker, job.attempts), ("worker-b", 2))
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SITE_IMPORT_DIR=directory.name))
+        self.data = site_csv([site_row(site_id) for site_id in range(1, 6)])
+        response = self.client.post(
+            reverse("upload-session"), {"filename": "sites.csv"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.upload_id = response.json()["upload_id"]
+
+    def put_chunk(self, number, data):
+        return self.client.put(
+            reverse("upload-session-chunk", args=[self.upload_id, number]),
+            data,
+            content_type="application/octet-stream",
+        )
+
+    def complete(self, total_chunks):
+        return self.client.post(
+            reverse("upload-session-complete", args=[self.upload_id]),
+            {"total_chunks": total_chunks},
+        )
+
+    def test_chunks_out_of_order_and_resent(self):
+        chunks = [self.data[:100], self.data[100:250], self.data[250:]]
+        self.assertEqual(self.put_chunk(2, chunks[2]).status_code, 200)
+        self.assertEqual(self.put_chunk(0, b"garbage").status_code, 200)
+        # Re-sending a chunk replaces it
+        response = self.put_chunk(0, chunks[0])
+        self.assertEqual(response.json()["size"], len(chunks[0]))
+
+        response = self.complete(3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["missing_chunks"], [1])
+        response = self.client.get(
+            reverse("upload-session-detail", args=[self.upload_id])
+        )
+        self.assertEqual(response.json()["received_chunks"], [0, 2])
+        self.assertIsNone(response.json()["completed_at"])
+
+        self.put_chunk(1, chunks[1])
+        response = self.complete(3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_chunks"], 3)
+        self.assertEqual(self.put_chunk(1, chunks[1]).status_code, 409)
+
+        session = UploadSession.objects.get(upload_id=self.upload_id)
+        assembled = b"".join(iter_session_chunks(session, heartbeat=lambda: None))
+        self.assertEqual(assembled, self.data)
+
+    def test_job_ingests_the_assembled_upload(self):
+        for number, start in enumerate(range(0, len(self.data), 64)):
+            self.put_chunk(number, self.data[start : start + 64])
+        self.complete(number + 1)
+
+        run_import_job(claim_next_job("worker"))
+        job = UploadSession.objects.get(upload_id=self.upload_id).job
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(job.rows_inserted, 5)
+        self.assertEqual(
+            sorted(Sites.objects.values_list("site_id", flat=True)), [1, 2, 3, 4, 5]
+        )
+
+
+class RecalculationTests(TestCase):
+    weights = {"solar": 0.4, "area": 0.2, "grid": 0.2, "slope": 0.1, "infra": 0.1}
+
+    def setUp(self):
+        ingest_upload(
+            "csv", [site_csv([site_row(site_id) for site_id in range(1, 12)])]
+        )
+
+    def expected_scores(self, weights, curves=None):
+        """
+        score_batch() over every stored site: { site_id: { field: value } }.
+        """
+        rows = Sites.objects.order_by("site_id").values_list(
+            "site_id", *SCORING_INPUT_FIELDS
+        )
+        site_ids, columns = scoring_columns(list(rows))
+        scores = score_batch(columns, weights, curves)
+        return {
+            site_id: {field: values[index] for field, values in scores.items()}
+            for index, site_id in enumerate(site_ids.tolist())
+        }
+
+    def assertRunScores(self, run, expected):
+        results = AnalysisResults.objects.filter(run=run)
+        self.assertEqual(sorted(result.site_id for result in results), list(expected))
+        for result in results:
+            for field, value in expected[result.site_id].items():
+                self.assertEqual(
+                    float(getattr(result, field)),
+                    value,
+                    f"{field} differs for site {result.site_id}",
+                )
+
+    @override_settings(SITE_RECALC_CHUNK_SIZE=3)
+    def test_chunked_recalculation_matches_score_batch(self):
+        chunks = list(iter_scoring_chunks(3))
+        self.assertEqual([len(site_ids) for site_ids, _ in chunks], [3, 3, 3, 2])
+        self.assertEqual(
+            np.concatenate([site_ids for site_ids, _ in chunks]).tolist(),
+            list(range(1, 12)),
+        )
+        ranged = list(iter_scoring_chunks(3, start=4, stop=9))
+        self.assertEqual(
+            [site_ids.tolist() for site_ids, _ in ranged], [[4, 5, 6], [7, 8]]
+        )
+
+        run = recalculate_all_sites(self.weights, workers=1)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, AnalysisRun.STATUS_COMPLETED)
+        self.assertEqual(run.sites_scored, 11)
+        self.assertRunScores(run, self.expected_scores(self.weights))
+
+    @override_settings(SITE_RECALC_CHUNK_SIZE=4)
+    def test_chunked_recalculation_uses_saved_curves(self):
+        points = [[0, 0], [4, 50], [6, 100]]
+        ScoringCurve.objects.create(factor="solar", points=points)
+
+        run = recalculate_all_sites(self.weights, workers=1)
+
+        curves = dict(DEFAULT_SCORING_CURVES, solar=tuple(map(tuple, points)))
+        self.assertRunScores(run, self.expected_scores(self.weights, curves))
+
+    def test_reweight_matches_score_batch(self):
+        recalculate_all_sites(self.weights, workers=1)
+        self.assertFalse(needs_full_recalculation())
+        new_weights = {
+            "solar": 0.1,
+            "area": 0.3,
+            "grid": 0.3,
+            "slope": 0.2,
+            "infra": 0.1,
+        }
+
+        # No total of these sites lands on a .xx5 tie, where SQL ROUND() and
+        # round() may differ by 0.01
+        run = reweight_analysis_results(new_weights)
+
+        run.refresh_from_db()
+        self.assertEqual(run.sites_scored, 11)
+        self.assertEqual(run.parameters_snapshot, new_weights)
+        self.assertRunScores(run, self.expected_scores(new_weights))
+
+    def test_apply_weights_reweights_only_with_stored_factors(self):
+        # Upload results carry their factors, so no full recalculation
+        self.assertFalse(needs_full_recalculation())
+        with mock.patch("sites.services.recalculate_all_sites") as recalculate:
+            run = apply_weights(self.weights)
+        recalculate.assert_not_called()
+        self.assertRunScores(run, self.expected_scores(self.weights))
+
+        AnalysisResults.objects.filter(site_id=3).update(solar_irradiance_factor=None)
+        self.assertTrue(needs_full_recalculation())
+        run = apply_weights(self.weights)
+        self.assertEqual(AnalysisResults.objects.filter(run=run).count(), 11)
+        self.assertIsNotNone(
+            AnalysisResults.objects.get(run=run, site_id=3).solar_irradiance_factor
+        )
+
+
+class PublishAnalysisRunTests(TestCase):
+    weights = {"solar": 0.4, "area": 0.2, "grid": 0.2, "slope": 0.1, "infra": 0.1}
+
+    def setUp(self):
+        ingest_upload("csv", [site_csv([site_row(site_id) for site_id in range(1, 6)])])
+
+    def scored_run(self, weights=None):
+        run = start_analysis_run(weights or self.weights)
+        return run, score_sites_into_run(run, load_curves())
+
+    def listed_totals(self):
+        return dict(
+            SitesWithScores.objects.values_list("site_id", "total_suitability_score")
+        )
+
+    def run_totals(self, run):
+        return dict(
+            AnalysisResults.objects.filter(run=run).values_list(
+                "site_id", "total_suitability_score"
+            )
+        )
+
+    def test_publishing_only_moves_the_pointer(self):
+        uploaded = self.listed_totals()
+        run, sites_scored = self.scored_run()
+
+        # The run's rows exist before it is published, but are not listed
+        self.assertEqual(self.listed_totals(), uploaded)
+        self.assertEqual(SitesWithScores.all_runs.filter(run=run.run_id).count(), 5)
+
+        with mock.patch("sites.services.refresh_site_scores") as refresh:
+            self.assertTrue(publish_analysis_run(run, sites_scored))
+        refresh.assert_not_called()
+        self.assertEqual(self.listed_totals(), self.run_totals(run))
+        self.assertNotEqual(self.listed_totals(), uploaded)
+
+    def test_an_older_run_never_replaces_a_newer_one(self):
+        older, older_scored = self.scored_run()
+        newer, newer_scored = self.scored_run(
+            {"solar": 0.1, "area": 0.3, "grid": 0.3, "slope": 0.2, "infra": 0.1}
+        )
+
+        self.assertTrue(publish_analysis_run(newer, newer_scored))
+        self.assertFalse(publish_analysis_run(older, older_scored))
+
+        self.assertEqual(CurrentAnalysisRun.objects.get().run_id, newer.run_id)
+        older.refresh_from_db()
+        self.assertEqual(older.status, AnalysisRun.STATUS_COMPLETED)
+        self.assertEqual(self.listed_totals(), self.run_totals(newer))
+
+    def test_uploads_refresh_the_listed_and_building_runs(self):
+        listed, sites_scored = self.scored_run()
+        publish_analysis_run(listed, sites_scored)
+        building, _ = self.scored_run()
+
+        ingest_upload("csv", [site_csv([site_row(2, area_sqm="90000")])])
+
+        for run_id in (listed.run_id, building.run_id):
+            row = SitesWithScores.all_runs.get(run=run_id, site_id=2)
+            self.assertEqual(row.area_sqm, 90000)
+            self.assertEqual(row.area_score, Decimal("100.00"))
+        # Rows of before the first published run are left to the pruner
+        self.assertEqual(SitesWithScores.all_runs.get(run=0, site_id=2).area_sqm, 7000)
+
+    @override_settings(SITE_ANALYSIS_RUNS_KEPT=1)
+    def test_prune_keeps_the_current_and_newest_runs(self):
+        first, sites_scored = self.scored_run()
+        publish_analysis_run(first, sites_scored)
+        second, sites_scored = self.scored_run()
+        publish_analysis_run(second, sites_scored)
+        failed, _ = self.scored_run()
+        fail_analysis_run(failed)
+        building, _ = self.scored_run()
+        abandoned, _ = self.scored_run()
+        AnalysisRun.objects.filter(pk=abandoned.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        ingest_upload("csv", [site_csv([site_row(3, area_sqm="90000")])])
+
+        prune_analysis_runs()
+
+        self.assertEqual(
+            sorted(AnalysisRun.objects.values_list("run_id", flat=True)),
+            [second.run_id, building.run_id],
+        )
+        self.assertEqual(
+            list(
+                SitesWithScores.all_runs.order_by("run")
+                .values_list("run", flat=True)
+                .distinct()
+            ),
+            [second.run_id, building.run_id],
+        )
+        # Upload results older than every kept run are gone, newer ones stay
+        self.assertEqual(
+            list(
+                AnalysisResults.objects.filter(run__isnull=True).values_list(
+                    "site_id", flat=True
+                )
+            ),
+            [3],
+        )
+        self.assertEqual(SitesWithScores.objects.get(site_id=3).area_sqm, 90000)
+
+
+@override_settings(SITE_RECALC_CHUNK_SIZE=3)
+class SiteScoresDriftTests(TestCase):
+    """
+    The materialized rows must always equal what the sites and their
+    visible results give for the listed run.
+    """
+
+    weights = {"solar": 0.4, "area": 0.2, "grid": 0.2, "slope": 0.1, "infra": 0.1}
+
+    def setUp(self):
+        self.enterContext(
+            mock.patch("sites.services.prune_analysis_runs_in_background")
+        )
+        ingest_upload("csv", [site_csv([site_row(site_id) for site_id in range(1, 8)])])
+
+    def expected_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(visible_results_sql(run_id=listed_run_id()))
+            result_ids = [result_id for result_id, in cursor.fetchall()]
+        results = {
+            result["site_id"]: result
+            for result in AnalysisResults.objects.filter(pk__in=result_ids).values(
+                "site_id", *MATERIALIZED_RESULT_FIELDS
+            )
+        }
+        rows = []
+        for site in Sites.objects.order_by("site_id").values(*MATERIALIZED_SITE_FIELDS):
+            result = results.get(site["site_id"], {})
+            rows.append(
+                {
+                    **site,
+                    **{
+                        field: result.get(field) for field in MATERIALIZED_RESULT_FIELDS
+                    },
+                    "grid_cell": grid_row(float(site["latitude"])) * GRID_COLUMNS
+                    + grid_column(float(site["longitude"])),
+                }
+            )
+        return rows
+
+    def assertNoDrift(self):
+        listed = SitesWithScores.objects.order_by("site_id").values(
+            *MATERIALIZED_SITE_FIELDS, *MATERIALIZED_RESULT_FIELDS, "grid_cell"
+        )
+        self.assertEqual(list(listed), self.expected_rows())
+
+    def test_rows_follow_uploads_reweights_and_curve_changes(self):
+        self.assertNoDrift()
+
+        recalculate_all_sites(self.weights)
+        self.assertNoDrift()
+
+        ingest_upload(
+            "csv",
+            [site_csv([site_row(2, area_sqm="90000"), site_row(8, latitude="51.5")])],
+        )
+        self.assertNoDrift()
+
+        apply_weights(
+            {"solar": 0.1, "area": 0.3, "grid": 0.3, "slope": 0.2, "infra": 0.1}
+        )
+        self.assertNoDrift()
+
+        response = self.client.post(
+            reverse("site-scoring-curves"),
+            {"area": [[1000, 0], [20000, 100]]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNoDrift()
+
+    def test_command_rebuilds_the_listed_run(self):
+        recalculate_all_sites(self.weights)
+        # Drift the table the way plain SQL changes would
+        SitesWithScores.objects.filter(site_id=3).update(total_suitability_score=0)
+        SitesWithScores.objects.filter(site_id=4).delete()
+        stale = SitesWithScores.objects.get(site_id=5)
+        stale.pk, stale.site_id = None, 99
+        stale.save()
+
+        call_command("refresh_site_scores", stdout=io.StringIO())
+
+        self.assertNoDrift()
+
+
+@override_settings(SITE_RECALC_RANGES_PER_WORKER=3)
+class ScoringPoolTests(TransactionTestCase):
+    weights = {"solar": 0.4, "area": 0.2, "grid": 0.2, "slope": 0.1, "infra": 0.1}
+    compared_fields = [
+        *(score for _, _, score in FACTOR_FIELDS.values()),
+        *(factor for _, factor, _ in FACTOR_FIELDS.values()),
+        "total_suitability_score",
+    ]
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Spawned processes cannot open an in-memory database")
+        # Commits run on_commit callbacks here; keep the pruner thread out
+        self.enterContext(
+            mock.patch("sites.services.prune_analysis_runs_in_background")
+        )
+        ingest_upload(
+            "csv", [site_csv([site_row(site_id) for site_id in range(1, 15)])]
+        )
+
+    def run_scores(self, run):
+        return {
+            row[0]: row[1:]
+            for row in AnalysisResults.objects.filter(run=run).values_list(
+                "site_id", *self.compared_fields
+            )
+        }
+
+    def test_pool_matches_single_process(self):
+        # One process, so SQLite never sees two writers; the ranges, the
+        # spawning and the database hand-over are the same as with more
+        pooled = start_analysis_run(self.weights)
+        sites_scored = score_sites_in_pool(pooled, load_curves(), workers=1)
+        publish_analysis_run(pooled, sites_scored)
+        listed = dict(
+            SitesWithScores.objects.values_list("site_id", "total_suitability_score")
+        )
+        single = recalculate_all_sites(self.weights, workers=1)
+
+        self.assertEqual(sites_scored, 14)
+        self.assertEqual(len(self.run_scores(pooled)), 14)
+        self.assertEqual(self.run_scores(pooled), self.run_scores(single))
+        # The workers wrote the run's listing rows too
+        self.assertEqual(
+            listed,
+            {
+                site_id: scores[-1]
+                for site_id, scores in self.run_scores(pooled).items()
+            },
+        )
+
+
+class SensitivityViewTests(TestCase):
+    def setUp(self):
+        isolate_site_indexes(self)
+        ingest_upload("csv", [site_csv([site_row(site_id) for site_id in range(1, 6)])])
+
+    def post(self, data):
+        return self.client.post(
+            reverse("site-weight-sensitivity"), data, content_type="application/json"
+        )
+
+    def test_reports_the_requested_sites_in_order(self):
+        response = self.post({"samples": 20, "site_ids": [4, 2], "seed": 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([site["site_id"] for site in response.json()["sites"]], [4, 2])
+
+    def test_unknown_site_ids_are_rejected(self):
+        response = self.post({"samples": 20, "site_ids": [2, 99, 7, 99]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"site_ids": ["Unknown site_ids: 99, 7"]})
+
+
+class SkylineViewTests(TestCase):
+    def setUp(self):
+        isolate_site_indexes(self)
+        rows = [site_row(site_id) for site_id in range(1, 8)]
+        ingest_upload("csv", [site_csv(rows)])
+        # A site without any result shows null scores
+        site = Sites(
+            **{
+                field: Sites._meta.get_field(field).to_python(value)
+                for field, value in site_row(8, site_name="Unscored").items()
+            }
+        )
+        upsert_sites([site])
+        refresh_site_scores(0, [8])
+
+    def test_sites_without_scores_are_left_out(self):
+        self.assertIsNone(SitesWithScores.objects.get(site_id=8).slope_score)
+
+        response = self.client.get(reverse("site-skyline"))
+
+        self.assertEqual(response.status_code, 200)
+        site_ids = [site["site_id"] for site in response.json()["sites"]]
+        self.assertNotIn(8, site_ids)
+        scored = SitesWithScores.objects.exclude(site_id=8).order_by("site_id")
+        points = np.array(scored.values_list(*SKYLINE_FIELDS), dtype=float)
+        expected = np.array(scored.values_list("site_id", flat=True))[skyline(points)]
+        self.assertEqual(sorted(site_ids), expected.tolist())
+
+
+class CursorPagingTests(TestCase):
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        ingest_upload("csv", [site_csv([site_row(site_id) for site_id in range(1, 6)])])
+        # Two sites without any result, so with a NULL total
+        upsert_sites(
+            [
+                Sites(
+                    **{
+                        field: Sites._meta.get_field(field).to_python(value)
+                        for field, value in site_row(site_id).items()
+                    }
+                )
+                for site_id in (6, 7)
+            ]
+        )
+        refresh_site_scores(0, [6, 7])
+
+    def test_cursor_pages_reach_sites_without_total(self):
+        expected = sorted(
+            SitesWithScores.objects.values_list("total_suitability_score", "site_id"),
+            key=lambda row: (row[0] is None, -(row[0] or 0), row[1]),
+        )
+        site_ids = []
+        url = reverse("upload-site") + "?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            site_ids.extend(site["site_id"] for site in response.json())
+            cursor = response.get(NEXT_CURSOR_HEADER)
+            url = cursor and reverse("upload-site") + f"?limit=2&cursor={cursor}"
+
+        self.assertEqual(site_ids, [site_id for _, site_id in expected])
+        self.assertEqual(site_ids[-2:], [6, 7])
+
+
+class StatisticsViewTests(TestCase):
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        ingest_upload("csv", [site_csv([site_row(site_id) for site_id in range(1, 9)])])
+
+    def test_score_filters_apply_to_the_summary(self):
+        threshold = sorted(
+            SitesWithScores.objects.values_list("total_suitability_score", flat=True)
+        )[4]
+        response = self.client.get(
+            reverse("site-statistics"),
+            {"q": f"col:total_suitability_score,min_score:{threshold}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        expected = SitesWithScores.objects.filter(
+            total_suitability_score__gte=threshold
+        )
+        self.assertEqual(
+            response.json()["stats"]["total_land_area"],
+            sum(site.area_sqm for site in expected),
+        )
+
+    def test_listing_errors_are_logged(self):
+        with self.assertLogs("sites.views", "ERROR") as logs:
+            response = self.client.get(reverse("upload-site"), {"cursor": "garbage!!"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid cursor", response.json()["error"])
+        self.assertIn("Failed to retrieve sites", logs.output[0])
+
+
+@override_settings(SITE_AUTOCOMPLETE_CHECK_INTERVAL=0)
+class AutocompleteRebuildTests(TestCase):
+    def setUp(self):
+        isolate_site_indexes(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_upload("csv", [site_csv([site_row(1), site_row(2)])])
+
+    def names(self):
+        results = self.client.get(
+            reverse("site-autocomplete"), {"field": "site_name", "prefix": "site"}
+        ).json()["results"]
+        return sorted(result["value"] for result in results)
+
+    def test_index_follows_committed_uploads(self):
+        self.assertEqual(self.names(), ["Site 1", "Site 2"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_upload(
+                "csv", [site_csv([site_row(2, site_name="Site Two"), site_row(3)])]
+            )
+
+        self.assertEqual(self.names(), ["Site 1", "Site 3", "Site Two"])
+
+    def test_generation_is_read_once_per_interval(self):
+        with override_settings(SITE_AUTOCOMPLETE_CHECK_INTERVAL=60):
+            self.assertEqual(self.names(), ["Site 1", "Site 2"])
+            with self.captureOnCommitCallbacks(execute=True):
+                ingest_upload("csv", [site_csv([site_row(3)])])
+
+            with self.assertNumQueries(0):
+                self.assertEqual(self.names(), ["Site 1", "Site 2"])
+
+        self.assertEqual(self.names(), ["Site 1", "Site 2", "Site 3"])
+
+
+class FactorMatrixVersionTests(TestCase):
+    def setUp(self):
+        isolate_site_indexes(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_upload("csv", [site_csv([site_row(1), site_row(2)])])
+
+    def test_writers_committing_out_of_id_order(self):
+        # Writer A takes the lower result_ids but commits after writer B
+        with self.captureOnCommitCallbacks() as commit_a:
+            ingest_upload("csv", [site_csv([site_row(3)])])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_upload("csv", [site_csv([site_row(4)])])
+        self.assertLess(
+            AnalysisResults.objects.get(site_id=3).result_id,
+            AnalysisResults.objects.get(site_id=4).result_id,
+        )
+
+        def without_writer_a(*args, **kwargs):
+            # What a reader sees before A committed
+            for site_ids, columns in iter_scoring_chunks(*args, **kwargs):
+                keep = site_ids != 3
+                yield site_ids[keep], {
+                    field: values[keep] for field, values in columns.items()
+                }
+
+        with mock.patch("sites.whatif.iter_scoring_chunks", without_writer_a):
+            self.assertEqual(get_factor_matrix().site_ids.tolist(), [1, 2, 4])
+
+        for callback in commit_a:
+            callback()
+
+        self.assertEqual(get_factor_matrix().site_ids.tolist(), [1, 2, 3, 4])
+
+
+class DataGenerationTests(TestCase):
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+
+    def test_committed_changes_bump_the_generation(self):
+        self.assertEqual(data_generation(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_upload("csv", [site_csv([site_row(1)])])
+        self.assertEqual(data_generation(), 1)
+
+        bump_data_generation()
+        self.assertEqual(data_generation(), 2)
+        self.assertIsNone(CurrentAnalysisRun.objects.get().run_id)
+
+    def test_cached_listing_follows_the_database_generation(self):
+        request = Request(APIRequestFactory().get("/api/sites/?limit=5"))
+        build = mock.Mock(side_effect=["first", "second"])
+
+        self.assertEqual(cached_listing("list", request, build), "first")
+        self.assertEqual(cached_listing("list", request, build), "first")
+        # A bump by another process only leaves the database row changed
+        CurrentAnalysisRun.objects.update_or_create(
+            pk=CurrentAnalysisRun.POINTER_ID, defaults={"generation": 7}
+        )
+        self.assertEqual(cached_listing("list", request, build), "second")
+        self.assertEqual(build.call_count, 2)
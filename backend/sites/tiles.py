@@ -0,0 +1,225 @@
+import math
+import threading
+import numpy as np
+from sites.models import SitesWithScores
+from sites.whatif import factor_matrix_version
+
+# Sites are placed on a 2^TILE_MAX_LEVEL x 2^TILE_MAX_LEVEL Web Mercator
+# grid (cells of about 2.4 m at the equator)
+TILE_MAX_LEVEL = 24
+
+# A tile is split into 2^TILE_CLUSTER_BITS x 2^TILE_CLUSTER_BITS clusters
+TILE_CLUSTER_BITS = 3
+
+# Deepest tile zoom with one cluster level below it
+TILE_MAX_ZOOM = TILE_MAX_LEVEL - TILE_CLUSTER_BITS
+
+# Web Mercator is cut off at the latitude where the map becomes square
+MERCATOR_MAX_LATITUDE = 85.05112878
+
+
+def spread_bits(values):
+    """
+    Moves bit i of every value to bit 2i (values below 2^32).
+    """
+    values = values.astype(np.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_keys(columns, rows):
+    """
+    Z-order keys of grid cells: the key of a cell at level L, shifted right
+    by 2 bits, is the key of the cell containing it at level L - 1, so the
+    cells inside any tile are one contiguous run of keys.
+    """
+    return (spread_bits(columns) | (spread_bits(rows) << np.uint64(1))).astype(np.int64)
+
+
+def mercator_cells(latitudes, longitudes, level):
+    """
+    (columns, rows) of the Web Mercator grid cells at 'level' holding the
+    points; row 0 is the northern edge, like the y of z/x/y tiles.
+    """
+    size = 1 << level
+    latitudes = np.radians(
+        np.clip(latitudes, -MERCATOR_MAX_LATITUDE, MERCATOR_MAX_LATITUDE)
+    )
+    x = (np.asarray(longitudes, dtype=float) + 180) / 360
+    y = (1 - np.log(np.tan(latitudes) + 1 / np.cos(latitudes)) / math.pi) / 2
+    columns = np.clip(np.floor(x * size), 0, size - 1).astype(np.int64)
+    rows = np.clip(np.floor(y * size), 0, size - 1).astype(np.int64)
+    return columns, rows
+
+
+class ClusterLevel:
+    """
+    Aggregates of the occupied cells of one grid level, sorted by key:
+    site count, coordinate sums (for the centroid), score sum and count
+    (for the mean), best score and lowest site_id.
+    """
+
+    # How each aggregate of a cell combines the aggregates of its children
+    REDUCERS = {
+        "counts": np.add,
+        "latitudes": np.add,
+        "longitudes": np.add,
+        "scores": np.add,
+        "scored": np.add,
+        "best": np.fmax,
+        "site_ids": np.minimum,
+    }
+
+    def __init__(self, level, keys, **aggregates):
+        self.level = level
+        self.keys = keys
+        for name in self.REDUCERS:
+            setattr(self, name, aggregates[name])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def group(self, start, stop, level):
+        """
+        The cells of rows [start, stop) merged into their cells at 'level'
+        (coarser or equal), as a new ClusterLevel.
+        """
+        keys = self.keys[start:stop] >> (2 * (self.level - level))
+        if not len(keys):
+            return ClusterLevel(
+                level,
+                keys,
+                **{name: getattr(self, name)[:0] for name in self.REDUCERS},
+            )
+        firsts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return ClusterLevel(
+            level,
+            keys[firsts],
+            **{
+                name: reducer.reduceat(getattr(self, name)[start:stop], firsts)
+                for name, reducer in self.REDUCERS.items()
+            },
+        )
+
+    def clusters(self):
+        """
+        The cells as API dicts; a cell holding one site names it.
+        """
+        clusters = []
+        for index in range(len(self)):
+            count = int(self.counts[index])
+            scored = int(self.scored[index])
+            cluster = {
+                "count": count,
+                "latitude": round(float(self.latitudes[index]) / count, 7),
+                "longitude": round(float(self.longitudes[index]) / count, 7),
+                "avg_suitability_score": (
+                    round(float(self.scores[index]) / scored, 2) if scored else None
+                ),
+                "max_suitability_score": (float(self.best[index]) if scored else None),
+            }
+            if count == 1:
+                cluster["site_id"] = int(self.site_ids[index])
+            clusters.append(cluster)
+        return clusters
+
+
+class ClusterPyramid:
+    """
+    Every site as a cell of the TILE_MAX_LEVEL grid, in key order, plus the
+    aggregates of every coarser level that still averages at least
+    4 sites per cell. A tile is answered from the finest precomputed level
+    at or above the one its clusters need, else from the sites themselves;
+    either way its cells are one contiguous, binary-searched run.
+    """
+
+    def __init__(self, site_ids, latitudes, longitudes, scores, version):
+        self.version = version
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        scores = np.asarray(scores, dtype=float)
+        keys = morton_keys(*mercator_cells(latitudes, longitudes, TILE_MAX_LEVEL))
+        order = np.argsort(keys, kind="stable")
+
+        scores = scores[order]
+        scored = ~np.isnan(scores)
+        sites = ClusterLevel(
+            TILE_MAX_LEVEL,
+            keys[order],
+            counts=np.ones(len(order), dtype=np.int64),
+            latitudes=latitudes[order],
+            longitudes=longitudes[order],
+            scores=np.where(scored, scores, 0.0),
+            scored=scored.astype(np.int64),
+            best=scores,
+            site_ids=np.asarray(site_ids, dtype=np.int64)[order],
+        )
+        self.sites = sites
+
+        # Coarser levels are built from the previous one, finest first
+        self.levels = {}
+        current = sites
+        for level in range(TILE_MAX_LEVEL - 1, -1, -1):
+            current = current.group(0, len(current), level)
+            if len(current) * 4 <= len(sites):
+                self.levels[level] = current
+
+    def tile(self, zoom, x, y):
+        """
+        The clusters of tile zoom/x/y: its sites grouped into the cells of
+        level zoom + TILE_CLUSTER_BITS.
+        """
+        level = zoom + TILE_CLUSTER_BITS
+        source = next(
+            (
+                self.levels[candidate]
+                for candidate in range(level, TILE_MAX_LEVEL)
+                if candidate in self.levels
+            ),
+            self.sites,
+        )
+        tile_key = int(morton_keys(np.array([x]), np.array([y]))[0])
+        shift = 2 * (source.level - zoom)
+        start = np.searchsorted(source.keys, tile_key << shift)
+        stop = np.searchsorted(source.keys, (tile_key + 1) << shift)
+        return source.group(start, stop, level).clusters()
+
+
+_cache = {"pyramid": None}
+_cache_lock = threading.Lock()
+
+
+def get_cluster_pyramid():
+    """
+    The ClusterPyramid of this process, shared by its threads and rebuilt
+    on the first request after an upload or analyze changed the data.
+    """
+    version = factor_matrix_version()
+    pyramid = _cache["pyramid"]
+    if pyramid is not None and pyramid.version == version:
+        return pyramid
+
+    with _cache_lock:
+        pyramid = _cache["pyramid"]
+        if pyramid is None or pyramid.version != version:
+            rows = list(
+                SitesWithScores.objects.order_by().values_list(
+                    "site_id", "latitude", "longitude", "total_suitability_score"
+                )
+            )
+            pyramid = ClusterPyramid(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+                [np.nan if row[3] is None else row[3] for row in rows],
+                version,
+            )
+            _cache["pyramid"] = pyramid
+    return pyramid
@@ -1,9 +1,21 @@
 from django.urls import path
 from sites.views import (
+    ChunkedUploadChunkView,
+    ChunkedUploadCompleteView,
+    ChunkedUploadDetailView,
+    ChunkedUploadView,
+    ImportJobView,
     SiteUploadView,
     SiteView,
     SiteAnalysisView,
+    SiteAutocompleteView,
+    SiteNearestView,
+    SiteScoringCurveView,
+    SiteSensitivityView,
+    SiteSkylineView,
     SiteStatiscsSummary,
+    SiteTileView,
+    SiteWhatIfView,
     SiteExportSummary,
 )
 
@@ -11,6 +23,34 @@ urlpatterns = [
     path("", SiteUploadView.as_view(), name="upload-site"),
     path("<int:site_id>/", SiteView.as_view(), name="site-detail"),
     path("analyze/", SiteAnalysisView.as_view(), name="site-list"),
+    path("curves/", SiteScoringCurveView.as_view(), name="site-scoring-curves"),
+    path("what-if/", SiteWhatIfView.as_view(), name="site-what-if"),
+    path("sensitivity/", SiteSensitivityView.as_view(), name="site-weight-sensitivity"),
+    path("skyline/", SiteSkylineView.as_view(), name="site-skyline"),
+    path("nearest/", SiteNearestView.as_view(), name="site-nearest"),
+    path("autocomplete/", SiteAutocompleteView.as_view(), name="site-autocomplete"),
+    path(
+        "tiles/<int:z>/<int:x>/<int:y>/",
+        SiteTileView.as_view(),
+        name="site-tile-clusters",
+    ),
     path("statistics/", SiteStatiscsSummary.as_view(), name="site-statistics"),
     path("export/", SiteExportSummary.as_view(), name="site-export"),
+    path("imports/<int:job_id>/", ImportJobView.as_view(), name="import-job"),
+    path("uploads/", ChunkedUploadView.as_view(), name="upload-session"),
+    path(
+        "uploads/<uuid:upload_id>/",
+        ChunkedUploadDetailView.as_view(),
+        name="upload-session-detail",
+    ),
+    path(
+        "uploads/<uuid:upload_id>/chunks/<int:number>/",
+        ChunkedUploadChunkView.as_view(),
+        name="upload-session-chunk",
+    ),
+    path(
+        "uploads/<uuid:upload_id>/complete/",
+        ChunkedUploadCompleteView.as_view(),
+        name="upload-session-complete",
+    ),
 ]
@@ -1,9 +1,23 @@
+import base64
+import binascii
+import codecs
 import csv
+import json
+from decimal import Decimal, InvalidOperation
 from django.http import HttpResponse
 from django.forms import ValidationError
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
+from rest_framework import serializers
+from rest_framework.settings import api_settings
 from sites.constants import ALLOWED_QUERY_PARAMS_FOR_SITE
+from sites.spatial import (
+    bbox_q,
+    haversine_km,
+    parse_bbox,
+    parse_point,
+    radius_bbox,
+)
 
 
 def get_allowed_columns(model):
@@ -26,13 +40,38 @@ def get_allowed_columns(model):
     }
 
 
-def extract_values_from_csv(io_string):
-    # DictReader uses the first line as keys automatically
-    dict_reader = csv.DictReader(io_string)
+def iter_decoded_lines(chunks, encoding="utf-8"):
+    """
+    Incrementally decodes an iterable of byte chunks into text lines.
+    Only the current chunk and one partial line are held in memory, and
+    multi-byte characters split across chunk boundaries are handled by
+    the incremental decoder.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
 
-    # Convert the reader object into a list of dictionaries
-    # Each dictionary is { "header_name": "value" }
-    return [row for row in dict_reader]
+def iter_batches(iterable, size):
+    """
+    Groups an iterable into lists of at most 'size' items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def split_values_for_query_params(queries, model):
@@ -103,6 +142,42 @@ def filter_by_region(queryset, region):
     return queryset
 
 
+def filter_by_location(queryset, query_params):
+    """
+    ?bbox=west,south,east,north keeps the sites inside the box, and
+    ?lat=&lon=&radius_km= the sites within radius_km of the point.
+
+    The match is a primary key subquery over the grid_cell index, so the
+    database starts from the few sites in range instead of walking the
+    score index of every site for the listing order.
+    """
+    bbox = query_params.get("bbox")
+    point = parse_point(query_params)
+    radius_km = query_params.get("radius_km")
+    if not bbox and radius_km is None:
+        return queryset
+
+    area = queryset.model.objects.order_by()
+    if bbox:
+        area = area.filter(bbox_q(*parse_bbox(bbox)))
+    if radius_km is not None:
+        if point is None:
+            raise ValidationError("radius_km needs lat and lon.")
+        try:
+            radius_km = float(radius_km)
+        except ValueError:
+            raise ValidationError(f"Invalid radius_km: '{radius_km}'")
+        if not radius_km > 0:
+            raise ValidationError("radius_km must be positive.")
+        # The box around the circle uses the index; the distance is exact
+        area = (
+            area.filter(bbox_q(*radius_bbox(*point, radius_km)))
+            .alias(distance_km=haversine_km(*point))
+            .filter(distance_km__lte=radius_km)
+        )
+    return queryset.filter(pk__in=area.values("pk"))
+
+
 def build_score_filters(filters, combined_q=None):
     if combined_q is None:
         combined_q = Q()
@@ -152,6 +227,16 @@ def offset_and_limit_query_params(request):
         return offset, limit
 
 
+def query_param_flag(request, name, default=False):
+    """
+    Reads a boolean query param such as ?atomic=1 or ?validate_only=true.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 def limit_and_offset_queries(queryset, limit, offset):
     if limit is not None and offset is not None:
         # SQL: SELECT ... LIMIT {limit} OFFSET {offset}
@@ -166,85 +251,102 @@ def limit_and_offset_queries(queryset, limit, offset):
     return sites
 
 
-def try_numeric_conversion(value):
-    """Attempt to convert string to float or int; return original if not possible."""
-    try:
-        # Check if it's an integer first (optional, but cleaner for some DBs)
-        if "." not in value:
-            return int(value)
-        return float(value)
-    except (ValueError, TypeError):
-        return value
+# Site listings are ordered by score with site_id as tie-breaker, so every
+# row has a unique position and a cursor can point right after it
+# Sites without a total yet come last on every database (NULL sorts first
+# in descending order on some)
+SITE_LISTING_ORDER = (
+    F("total_suitability_score").desc(nulls_last=True),
+    "site_id",
+)
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-def normalize_solar(value):
-    # Higher is better. Range: 3.0 (score 0) to 6.0 (score 100)
-    val = float(value)
-    if val >= 6.0:
-        return 100
-    if val <= 3.0:
-        return 0
-    return (val - 3.0) / (6.0 - 3.0) * 100
 
-
-def normalize_slope(value):
-    # Lower is better. Range: 0 deg (score 100) to 15 deg (score 0)
-    val = float(value)
-    if val <= 0:
-        return 100
-    if val >= 15:
-        return 0
-    return (15 - val) / 15 * 100
+def encode_cursor(total_suitability_score, site_id):
+    """
+    Opaque ?cursor= token for the row after (total_suitability_score, site_id).
+    A NULL total is encoded as null.
+    """
+    total = None if total_suitability_score is None else str(total_suitability_score)
+    payload = json.dumps([total, site_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
 
 
-def normalize_grid(value):
-    # Lower is better. Range: 0km (score 100) to 10km (score 0)
-    val = float(value)
-    if val <= 0:
-        return 100
-    if val >= 10:
-        return 0
-    return (10 - val) / 10 * 100
+def decode_cursor(token):
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        total, site_id = json.loads(payload)
+        return (None if total is None else Decimal(total)), int(site_id)
+    except (binascii.Error, ValueError, TypeError, InvalidOperation):
+        raise ValidationError(f"Invalid cursor: '{token}'")
 
 
-def normalize_area(value):
+def keyset_paginate(request, queryset):
     """
-    Goal: Bigger area = Higher Score.
-    Range: 10,000 sqm (Score 0) to 100,000 sqm (Score 100).
+    Pages a site listing with ?cursor= and ?limit=. A cursor is a keyset
+    condition on (total_suitability_score, site_id), so the database seeks
+    straight to the page instead of reading and discarding every earlier
+    row like OFFSET does. ?offset= keeps working when no cursor is given.
+    Returns (page queryset, cursor of the next page or None).
     """
-    val = float(value)
-    min_area = 10000
-    max_area = 100000
+    offset, limit = offset_and_limit_query_params(request)
+    queryset = queryset.order_by(*SITE_LISTING_ORDER)
+
+    token = request.query_params.get("cursor")
+    if token:
+        total, site_id = decode_cursor(token)
+        if total is None:
+            # Past the scored sites: only NULL totals remain, by site_id
+            after = Q(total_suitability_score__isnull=True, site_id__gt=site_id)
+        else:
+            after = (
+                Q(total_suitability_score__lt=total)
+                | Q(total_suitability_score=total, site_id__gt=site_id)
+                | Q(total_suitability_score__isnull=True)
+            )
+        queryset = queryset.filter(after)
+        offset = 0
 
-    if val >= max_area:
-        return 100
-    if val <= min_area:
-        return 0
+    page = limit_and_offset_queries(queryset, limit, offset)
+    if not limit or limit < 0:
+        return page, None
 
-    # Linear Interpolation Formula: (Current - Min) / (Max - Min) * 100
-    return ((val - min_area) / (max_area - min_area)) * 100
+    # The last row of the page, and whether any row follows it
+    boundary = list(
+        queryset.values_list("total_suitability_score", "site_id")[
+            offset + limit - 1 : offset + limit + 1
+        ]
+    )
+    next_cursor = encode_cursor(*boundary[0]) if len(boundary) == 2 else None
+    return page, next_cursor
 
 
-def normalize_infra(value):
+def with_next_cursor(response, next_cursor):
     """
-    Goal: Shorter distance = Higher Score.
-    Range: 0 km (Score 100) to 10 km (Score 0).
+    Sends the next page's cursor in a header, so JSON and CSV bodies keep
+    their shape.
     """
-    val = float(value)
-    max_dist = 10.0  # 10 km threshold
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
 
-    if val <= 0:
-        return 100
-    if val >= max_dist:
-        return 0
 
-    # Inverse Linear Interpolation: (Max - Current) / Max * 100
-    return ((max_dist - val) / max_dist) * 100
+def try_numeric_conversion(value):
+    """Attempt to convert string to float or int; return original if not possible."""
+    try:
+        # Check if it's an integer first (optional, but cleaner for some DBs)
+        if "." not in value:
+            return int(value)
+        return float(value)
+    except (ValueError, TypeError):
+        return value
 
 
-def get_filtered_site_data(request, model, serializer_class):
+def filter_sites_queryset(request, model):
     """
-    Logic-only helper to filter and serialize site data.
+    'model' rows matching the q, site_name, land_type and region query params
+    and the bbox or radius filters.
     """
     queries = request.query_params.getlist("q")
     site_name = request.query_params.get("site_name")
@@ -261,14 +363,91 @@ def get_filtered_site_data(request, model, serializer_class):
     queryset = filter_by_site_name(queryset, site_name)
     queryset = filter_by_land_type(queryset, land_type)
     queryset = filter_by_region(queryset, region)
+    return filter_by_location(queryset, request.query_params)
 
-    # Handle Pagination
-    offset, limit = offset_and_limit_query_params(request)
-    sites = limit_and_offset_queries(queryset, limit, offset)
 
-    # Serialize
-    serializer = serializer_class(sites, many=True)
-    return serializer.data
+def requested_fields(request, serializer_class):
+    """
+    The serializer fields named by ?fields=a,b,c, in the serializer's own
+    order; every field when the param is absent.
+    """
+    available = list(serializer_class().fields)
+    value = request.query_params.get("fields")
+    if not value:
+        return available
+
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise ValidationError(
+            f"Unknown fields: {sorted(unknown)}. Allowed fields: {available}"
+        )
+    return [name for name in available if name in names]
+
+
+def representation_of(field):
+    """
+    field.to_representation, with a shortcut for DecimalFields: the
+    database already returns decimals at the field's scale, for which
+    DRF's quantize is a no-op and only the formatting is left.
+    """
+    coerce_to_string = getattr(
+        field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+    )
+    if (
+        not isinstance(field, serializers.DecimalField)
+        or field.decimal_places is None
+        or field.normalize_output
+        or field.localize
+        or not coerce_to_string
+    ):
+        return field.to_representation
+
+    exponent = -field.decimal_places
+    max_digits = field.max_digits or float("inf")
+
+    def to_representation(value):
+        if isinstance(value, Decimal):
+            _, digits, value_exponent = value.as_tuple()
+            if value_exponent == exponent and len(digits) <= max_digits:
+                return f"{value:f}"
+        return field.to_representation(value)
+
+    return to_representation
+
+
+def serialize_values(queryset, serializer_class, fields):
+    """
+    The rows serializer_class(queryset, many=True).data would give, limited
+    to 'fields', built from values_list tuples: only those columns are
+    selected and no model instance is created. Each value goes through the
+    same serializer field's to_representation, so the output is identical.
+    """
+    serializer_fields = serializer_class().fields
+    columns = [serializer_fields[name].source for name in fields]
+    converters = [representation_of(serializer_fields[name]) for name in fields]
+    return [
+        {
+            name: None if value is None else convert(value)
+            for name, convert, value in zip(fields, converters, values)
+        }
+        for values in queryset.values_list(*columns)
+    ]
+
+
+def get_filtered_site_data(request, model, serializer_class):
+    """
+    Logic-only helper to filter and serialize site data (the ?fields=
+    given, or all of them).
+    Returns (serialized rows, cursor of the next page or None).
+    """
+    fields = requested_fields(request, serializer_class)
+    queryset = filter_sites_queryset(request, model)
+
+    # Handle Pagination (?cursor= or ?offset=, with ?limit=)
+    sites, next_cursor = keyset_paginate(request, queryset)
+
+    return serialize_values(sites, serializer_class, fields), next_cursor
 
 
 def export_to_csv_response(data, filename="solar_sites_summary.csv"):
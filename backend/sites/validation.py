@@ -0,0 +1,345 @@
+import numpy as np
+from rest_framework import serializers
+from rest_framework.fields import empty
+from sites.constants import SITE_VALUE_RULES
+from sites.serializers import SiteSerializer
+
+
+class ColumnErrors:
+    """
+    Collects the first error message for every (row, field) of a batch.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.failed = {}
+        self.messages = {}
+
+    def failed_rows(self, field):
+        return self.failed.setdefault(field, np.zeros(self.length, dtype=bool))
+
+    def add(self, field, mask, message):
+        """
+        Records 'message' for the rows in 'mask'; rows that already failed
+        on this field keep their first message.
+        """
+        failed = self.failed_rows(field)
+        new = mask & ~failed
+        if not new.any():
+            return
+        messages = self.messages.setdefault(
+            field, np.full(self.length, None, dtype=object)
+        )
+        # str() resolves lazy translations, which NumPy would treat as sequences
+        messages[new] = str(message)
+        failed |= new
+
+    def as_list(self, fields, first_row):
+        """
+        [{ "row": n, "errors": { field: [message] } }] for the failing rows,
+        numbered from 'first_row' (1 is the first line after a CSV header).
+        """
+        if not self.messages:
+            return []
+        any_failed = np.zeros(self.length, dtype=bool)
+        for mask in self.failed.values():
+            any_failed |= mask
+        return [
+            {
+                "row": first_row + index,
+                "errors": {
+                    field: [self.messages[field][index]]
+                    for field in fields
+                    if field in self.messages and self.failed[field][index]
+                },
+            }
+            for index in np.flatnonzero(any_failed).tolist()
+        ]
+
+
+def column_values(values, length):
+    """
+    Normalizes one input column to (values, missing, null).
+    'values' is a list (None for null, rest_framework's 'empty' for absent),
+    a NumPy array, or a masked array whose mask marks nulls. NumPy string
+    arrays drop trailing NUL characters, so text containing NULs must come
+    as a list for DRF to reject it.
+    """
+    if values is empty:
+        missing = np.ones(length, dtype=bool)
+        return np.full(length, "", dtype=object), missing, ~missing
+
+    if isinstance(values, np.ma.MaskedArray):
+        null = np.ma.getmaskarray(values)
+        return values.data, np.zeros(length, dtype=bool), null
+
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values, np.zeros(length, dtype=bool), np.zeros(length, dtype=bool)
+
+    values = np.asarray(values, dtype=object)
+    missing = np.fromiter((value is empty for value in values), bool, length)
+    null = np.fromiter((value is None for value in values), bool, length)
+    return values, missing, null
+
+
+def as_text(values):
+    """
+    Converts a column to a NumPy string array the same way DRF converts a
+    single value (str()); floats use the shortest repr, like str(float).
+    """
+    if values.dtype.kind in "US":
+        return values.astype(str)
+    if values.dtype == object:
+        return np.array(
+            [value if isinstance(value, str) else str(value) for value in values],
+            dtype=str,
+        )
+    return values.astype(str)
+
+
+def contains_nul(values):
+    """
+    Rows whose text holds a NUL character. Converting to a NumPy string
+    array would silently drop trailing NULs, so those rows must go to DRF.
+    """
+    if values.dtype != object:
+        return np.zeros(len(values), dtype=bool)
+    return np.fromiter(
+        (isinstance(value, str) and "\x00" in value for value in values),
+        bool,
+        len(values),
+    )
+
+
+class SiteColumnValidator:
+    """
+    Validates whole columns of site data at once against the same rules as
+    SiteSerializer: the DRF field checks (required, null, blank, number
+    format, max digits, integer bounds, max length) followed by
+    SITE_VALUE_RULES. Values the vectorized fast path cannot classify with
+    certainty (exponents, odd whitespace, non-string objects...) are handed
+    to the real DRF field, so every row gets exactly the serializer's message.
+    """
+
+    def __init__(self):
+        self.fields = {
+            name: field
+            for name, field in SiteSerializer().fields.items()
+            if not field.read_only
+        }
+
+    def validate(self, columns, length, first_row=1):
+        """
+        'columns' maps field names to column values (see column_values).
+        Returns (validated columns, error list); the columns are None when
+        any row failed, matching serializer.is_valid() on many=True.
+        """
+        errors = ColumnErrors(length)
+        validated = {}
+
+        for name, field in self.fields.items():
+            values, missing, null = column_values(columns.get(name, empty), length)
+            errors.add(name, missing, field.error_messages["required"])
+            errors.add(name, null & ~missing, field.error_messages["null"])
+
+            if isinstance(field, serializers.CharField):
+                cleaned = self.validate_char(name, field, values, errors)
+            elif isinstance(field, serializers.DecimalField):
+                cleaned = self.validate_decimal(name, field, values, errors)
+            else:
+                cleaned = self.validate_integer(name, field, values, errors)
+
+            if name in SITE_VALUE_RULES:
+                valid = ~errors.failed_rows(name)
+                for low, high, message in SITE_VALUE_RULES[name]:
+                    outside = np.zeros(length, dtype=bool)
+                    if low is not None:
+                        outside |= cleaned < low
+                    if high is not None:
+                        outside |= cleaned > high
+                    errors.add(name, valid & outside, message)
+
+            validated[name] = cleaned
+
+        error_list = errors.as_list(list(self.fields), first_row)
+        return (None if error_list else validated), error_list
+
+    def run_field(self, name, field, values, indexes, errors, cleaned):
+        """
+        Slow path: validates the given rows with the DRF field itself.
+        """
+        pending = ~errors.failed_rows(name)
+        for index in indexes:
+            if not pending[index]:
+                continue
+            value = values[index]
+            if isinstance(value, np.generic):
+                value = value.item()
+            try:
+                cleaned[index] = field.run_validation(value)
+            except serializers.ValidationError as e:
+                mask = np.zeros(errors.length, dtype=bool)
+                mask[index] = True
+                errors.add(name, mask, str(e.detail[0]))
+
+    def validate_char(self, name, field, values, errors):
+        length = errors.length
+        pending = ~errors.failed_rows(name)
+        if values.dtype == object:
+            is_text = np.fromiter(
+                (isinstance(value, str) for value in values), bool, length
+            )
+        else:
+            is_text = np.full(length, values.dtype.kind == "U")
+
+        text = np.where(is_text & pending, values, "").astype(str)
+        stripped = np.strings.strip(text) if field.trim_whitespace else text
+
+        # Non-strings and values containing NUL characters go through DRF
+        slow = pending & (~is_text | contains_nul(values))
+        if values.dtype == object:
+            try:
+                np.strings.encode(text, "utf-8")
+            except UnicodeEncodeError:
+                # Lone surrogates (possible in JSON input); let DRF report them
+                slow = pending.copy()
+        fast = pending & ~slow
+
+        errors.add(name, fast & (stripped == ""), field.error_messages["blank"])
+        if field.max_length is not None:
+            errors.add(
+                name,
+                fast & (np.strings.str_len(stripped) > field.max_length),
+                field.error_messages["max_length"].format(max_length=field.max_length),
+            )
+
+        cleaned = stripped.astype(object)
+        self.run_field(name, field, values, np.flatnonzero(slow), errors, cleaned)
+        return cleaned
+
+    def validate_integer(self, name, field, values, errors):
+        length = errors.length
+        pending = ~errors.failed_rows(name)
+        cleaned = np.zeros(length, dtype=np.int64)
+
+        if values.dtype.kind in "iu":
+            cleaned[:] = values
+            fast = pending
+        elif values.dtype.kind == "f":
+            # Integral floats are accepted by DRF ("12.0"); very large ones
+            # print in exponent form, which DRF rejects, so leave those to it
+            fast = pending & np.isfinite(values) & (np.abs(values) < 1e15)
+            fast &= np.floor(np.where(fast, values, 0)) == np.where(fast, values, 0)
+            cleaned[fast] = values[fast]
+        else:
+            raw = as_text(np.where(pending, values, ""))
+            stripped = np.strings.strip(raw)
+            body = np.strings.lstrip(stripped, "+-")
+            sign_length = np.strings.str_len(stripped) - np.strings.str_len(body)
+            fast = (
+                pending
+                & (sign_length <= 1)
+                & np.strings.isdecimal(body)
+                & (np.strings.str_len(body) <= 18)
+                & (np.strings.str_len(raw) <= field.MAX_STRING_LENGTH)
+                & ~contains_nul(values)
+            )
+            try:
+                cleaned[fast] = stripped[fast].astype(np.int64)
+            except ValueError:
+                fast = np.zeros(length, dtype=bool)
+
+        if field.max_value is not None:
+            errors.add(
+                name,
+                fast & (cleaned > field.max_value),
+                field.error_messages["max_value"].format(max_value=field.max_value),
+            )
+        if field.min_value is not None:
+            errors.add(
+                name,
+                fast & (cleaned < field.min_value),
+                field.error_messages["min_value"].format(min_value=field.min_value),
+            )
+
+        slow = pending & ~fast
+        if slow.any():
+            cleaned = cleaned.astype(object)
+            self.run_field(name, field, values, np.flatnonzero(slow), errors, cleaned)
+            cleaned = np.array(
+                [value if isinstance(value, int) else 0 for value in cleaned],
+                dtype=np.int64,
+            )
+        return cleaned
+
+    def validate_decimal(self, name, field, values, errors):
+        length = errors.length
+        pending = ~errors.failed_rows(name)
+        cleaned = np.zeros(length, dtype=float)
+
+        raw = as_text(
+            np.where(pending, values, "") if values.dtype == object else values
+        )
+        raw = np.where(pending, raw, "")
+        stripped = np.strings.strip(raw)
+        body = np.strings.lstrip(stripped, "+-")
+        sign_length = np.strings.str_len(stripped) - np.strings.str_len(body)
+        whole, _, fraction = np.strings.partition(body, ".")
+        whole_length = np.strings.str_len(whole)
+        fraction_length = np.strings.str_len(fraction)
+
+        # Plain "[sign]digits[.digits]" numbers; anything else goes through DRF
+        fast = (
+            pending
+            & (sign_length <= 1)
+            & ((whole_length == 0) | np.strings.isdecimal(whole))
+            & ((fraction_length == 0) | np.strings.isdecimal(fraction))
+            & (whole_length + fraction_length > 0)
+            & (np.strings.str_len(raw) <= field.MAX_STRING_LENGTH)
+            & ~contains_nul(values)
+        )
+        try:
+            cleaned[fast] = stripped[fast].astype(float)
+        except ValueError:
+            fast = np.zeros(length, dtype=bool)
+
+        # Digit counts exactly as DRF's validate_precision sees them through
+        # Decimal.as_tuple(): leading zeros dropped, trailing zeros kept
+        digits = np.strings.str_len(
+            np.strings.lstrip(np.strings.add(whole, fraction), "0")
+        )
+        digits = np.maximum(digits, 1)
+        total_digits = np.maximum(digits, fraction_length)
+        whole_digits = np.maximum(digits - fraction_length, 0)
+
+        if field.max_digits is not None:
+            errors.add(
+                name,
+                fast & (total_digits > field.max_digits),
+                field.error_messages["max_digits"].format(max_digits=field.max_digits),
+            )
+        if field.decimal_places is not None:
+            errors.add(
+                name,
+                fast & (fraction_length > field.decimal_places),
+                field.error_messages["max_decimal_places"].format(
+                    max_decimal_places=field.decimal_places
+                ),
+            )
+        if field.max_whole_digits is not None:
+            errors.add(
+                name,
+                fast & (whole_digits > field.max_whole_digits),
+                field.error_messages["max_whole_digits"].format(
+                    max_whole_digits=field.max_whole_digits
+                ),
+            )
+
+        slow = pending & ~fast
+        if slow.any():
+            decimals = np.full(length, None, dtype=object)
+            self.run_field(name, field, values, np.flatnonzero(slow), errors, decimals)
+            for index in np.flatnonzero(slow).tolist():
+                if decimals[index] is not None:
+                    cleaned[index] = float(decimals[index])
+        return cleaned
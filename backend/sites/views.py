@@ -1,39 +1,67 @@
-import io
+import logging
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.renderers import BrowsableAPIRenderer
 from sites.serializers import (
-    CalculatedAnalysisSerializer,
+    AutocompleteSerializer,
+    ImportJobSerializer,
     SiteDetailSerializer,
-    SiteSerializer,
+    NearestSerializer,
     NewWeightSerializer,
+    ScoringCurvesSerializer,
+    SensitivitySerializer,
+    UploadSessionSerializer,
     SiteWithScoreSerializer,
+    WhatIfSerializer,
 )
-from sites.models import AnalysisResults, Sites, SitesWithScores
+from sites.autocomplete import autocomplete
+from sites.jobs import (
+    complete_upload_session,
+    create_upload_session,
+    enqueue_import,
+    save_upload_chunk,
+)
+from sites.models import (
+    ImportJob,
+    Sites,
+    SitesWithScores,
+    UploadSession,
+)
+from sites.renderers import FastJSONRenderer
+from sites.readers import STREAMING_FORMATS, UploadFormatError, detect_upload_format
+from sites.scoring import load_curves, load_weights
+from sites.services import (
+    SiteUploadError,
+    apply_weights,
+    ingest_upload,
+    recalculate_all_sites,
+    validate_upload,
+)
+from sites.nearest import nearest_sites
+from sites.response_cache import cached_listing
+from sites.sensitivity import weight_sensitivity
+from sites.skyline import frontier_site_ids
+from sites.tiles import TILE_MAX_ZOOM, get_cluster_pyramid
+from sites.whatif import what_if_rankings
 from .utils import (
-    build_score_filters,
     export_to_csv_response,
-    extract_values_from_csv,
-    filter_by_land_type,
-    filter_by_region,
-    filter_by_site_name,
+    filter_sites_queryset,
     get_filtered_site_data,
-    limit_and_offset_queries,
-    normalize_area,
-    normalize_infra,
-    offset_and_limit_query_params,
-    split_values_for_query_params,
-    normalize_solar,
-    normalize_slope,
-    normalize_grid,
+    keyset_paginate,
+    query_param_flag,
+    with_next_cursor,
 )
-from django.db import transaction
-from django.db.models import F, Q, Avg, Sum
+from django.db.models import F, Avg, Sum
+
+logger = logging.getLogger(__name__)
 
 
 class SiteUploadView(APIView):
     permission_classes = [permissions.AllowAny]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def post(self, request):
         try:
@@ -41,69 +69,66 @@ class SiteUploadView(APIView):
             if not uploaded_file:
                 return Response({"error": "No file uploaded"}, status=400)
 
-            file_data = uploaded_file.read().decode("utf-8")
-            io_string = io.StringIO(file_data)
-            values = extract_values_from_csv(io_string)
+            # CSV, NDJSON, Parquet or Arrow: from ?file_format= or the file extension
+            file_format = detect_upload_format(
+                uploaded_file.name, request.query_params.get("file_format")
+            )
+
+            # Text formats are decoded chunk by chunk and columnar formats read
+            # batch by batch, never as a whole file
+            source = (
+                uploaded_file.chunks(settings.SITE_UPLOAD_CHUNK_SIZE)
+                if file_format in STREAMING_FORMATS
+                else uploaded_file
+            )
 
-            site_serializer = SiteSerializer(data=values, many=True)
-            if not site_serializer.is_valid():
+            # ?validate_only=1 is a dry run: same validation, nothing is saved
+            if query_param_flag(request, "validate_only"):
+                summary = validate_upload(file_format, source)
                 return Response(
-                    {"error": "CSV data invalid", "details": site_serializer.errors},
-                    status=400,
+                    {
+                        "message": "Validation passed; nothing was saved.",
+                        "filename": uploaded_file.name,
+                        "processed": summary["processed"],
+                    },
+                    status=status.HTTP_200_OK,
                 )
 
-            # --- ATOMIC TRANSACTION START ---
-            with transaction.atomic():
-                upserted_sites = []
-                for item in site_serializer.validated_data:
-                    site_instance, created = Sites.objects.update_or_create(
-                        site_id=item.get("site_id"), defaults=item
-                    )
-                    upserted_sites.append(site_instance)
-
-                # Prepare input for 2nd serializer (Just passing the PK)
-                analysis_input = [
+            # ?async=1 queues the file for the import workers and returns at once
+            if query_param_flag(request, "async"):
+                job = enqueue_import(uploaded_file, file_format)
+                return Response(
                     {
-                        "site_id": site.pk,
-                        "site_name": site.site_name,
-                        "latitude": site.latitude,
-                        "longitude": site.longitude,
-                        "area_sqm": site.area_sqm,
-                        "solar_irradiance_kwh": site.solar_irradiance_kwh,
-                        "grid_distance_km": site.grid_distance_km,
-                        "slope_degrees": site.slope_degrees,
-                        "road_distance_km": site.road_distance_km,
-                        "elevation_m": site.elevation_m,
-                        "land_type": site.land_type,
-                        "region": site.region,
-                    }
-                    for site in upserted_sites
-                ]
-
-                analysis_serializer = CalculatedAnalysisSerializer(
-                    data=analysis_input, many=True
+                        "message": "Import queued.",
+                        "filename": uploaded_file.name,
+                        "job_id": job.job_id,
+                        "status": job.status,
+                    },
+                    status=status.HTTP_202_ACCEPTED,
                 )
-                if analysis_serializer.is_valid():
-                    analysis_serializer.save()
-                else:
-                    # This will trigger a rollback of Sites.objects.update_or_create
-                    return Response(
-                        {
-                            "error": "Calculation failed",
-                            "details": analysis_serializer.errors,
-                        },
-                        status=400,
-                    )
-            # --- ATOMIC TRANSACTION END ---
+
+            # Batches commit one by one; ?atomic=1 makes the upload all-or-nothing
+            atomic = query_param_flag(request, "atomic")
+
+            summary = ingest_upload(file_format, source, atomic=atomic)
 
             return Response(
                 {
-                    "message": f"Successfully processed {len(upserted_sites)} sites.",
+                    "message": f"Successfully processed {summary['processed']} sites.",
                     "filename": uploaded_file.name,
+                    "inserted": summary["inserted"],
+                    "updated": summary["updated"],
+                    "unchanged": summary["unchanged"],
                 },
                 status=201,
             )
 
+        except SiteUploadError as e:
+            return Response(e.as_response_data(), status=400)
+
+        except UploadFormatError as e:
+            return Response({"error": str(e)}, status=400)
+
         except Exception as e:
             return Response({"error": f"Import failed: {str(e)}"}, status=400)
 
@@ -111,16 +136,21 @@ class SiteUploadView(APIView):
         try:
             # We call the common logic and pass the specific Model and Serializer
             # This replaces steps 1 through 5 in your original code
-            data = get_filtered_site_data(
-                request=request,
-                model=SitesWithScores,
-                serializer_class=SiteWithScoreSerializer,
+            data, next_cursor = cached_listing(
+                "list",
+                request,
+                lambda: get_filtered_site_data(
+                    request=request,
+                    model=SitesWithScores,
+                    serializer_class=SiteWithScoreSerializer,
+                ),
             )
 
-            return Response(data, status=status.HTTP_200_OK)
+            response = Response(data, status=status.HTTP_200_OK)
+            return with_next_cursor(response, next_cursor)
 
         except Exception as e:
-            print(e)
+            logger.exception("Failed to retrieve sites")
             # Keep the error handling here to catch database or logic issues
             return Response(
                 {"error": f"Failed to retrieve sites: {str(e)}"},
@@ -141,6 +171,121 @@ class SiteView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ImportJobView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, **kwargs):
+        try:
+            job = get_object_or_404(ImportJob, job_id=kwargs.get("job_id"))
+            serializer = ImportJobSerializer(job)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ChunkedUploadView(APIView):
+    """
+    Resumable upload protocol for very large site files:
+    1. POST /uploads/ {"filename": ...} starts a session and queues its import
+    2. PUT /uploads/<upload_id>/chunks/<n>/ sends chunk n (0, 1, 2, ...)
+       as the raw request body; re-sending a chunk is safe
+    3. POST /uploads/<upload_id>/complete/ {"total_chunks": N} finalizes it
+    Workers ingest the chunks in order while they are still arriving.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        try:
+            filename = request.data.get("filename")
+            if not filename:
+                return Response({"error": "filename is required"}, status=400)
+
+            # Chunks are ingested while they arrive, so only formats that can
+            # be read front to back qualify
+            file_format = detect_upload_format(
+                filename, request.data.get("file_format")
+            )
+            if file_format not in STREAMING_FORMATS:
+                return Response(
+                    {
+                        "error": "Resumable uploads only support CSV and NDJSON; "
+                        f"upload {file_format} files with ?async=1 instead"
+                    },
+                    status=400,
+                )
+
+            session = create_upload_session(filename, file_format)
+            serializer = UploadSessionSerializer(session)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ChunkedUploadDetailView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, **kwargs):
+        try:
+            session = get_object_or_404(
+                UploadSession, upload_id=kwargs.get("upload_id")
+            )
+            serializer = UploadSessionSerializer(session)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ChunkedUploadChunkView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def put(self, request, **kwargs):
+        try:
+            session = get_object_or_404(
+                UploadSession, upload_id=kwargs.get("upload_id")
+            )
+            if session.completed_at:
+                return Response({"error": "Upload already completed"}, status=409)
+
+            # Read the raw body as a stream so chunks never sit in memory whole
+            size = save_upload_chunk(session, kwargs.get("number"), request.stream)
+            return Response(
+                {
+                    "upload_id": session.upload_id,
+                    "chunk": kwargs.get("number"),
+                    "size": size,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ChunkedUploadCompleteView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, **kwargs):
+        try:
+            session = get_object_or_404(
+                UploadSession, upload_id=kwargs.get("upload_id")
+            )
+            total_chunks = int(request.data.get("total_chunks"))
+
+            missing = complete_upload_session(session, total_chunks)
+            if missing:
+                return Response(
+                    {"error": "Upload is missing chunks", "missing_chunks": missing},
+                    status=400,
+                )
+
+            serializer = UploadSessionSerializer(session)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        except (TypeError, ValueError):
+            return Response({"error": "total_chunks must be an integer"}, status=400)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class SiteAnalysisView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -155,10 +300,14 @@ class SiteAnalysisView(APIView):
 
                 # 2. TRIGGER RECALCULATION (The next step)
                 # You would call your calculation logic here for all sites
-                self.recalculate_all_sites(serializer.validated_data)
+                run = self.recalculate_all_sites(serializer.validated_data)
 
                 return Response(
-                    {"message": "Weights updated and scores recalculated"}, status=200
+                    {
+                        "message": "Weights updated and scores recalculated",
+                        "run_id": run.run_id,
+                    },
+                    status=200,
                 )
 
             return Response(serializer.errors, status=400)
@@ -168,143 +317,325 @@ class SiteAnalysisView(APIView):
 
     def recalculate_all_sites(self, weights):
         """
-        Recalculates scores for every site and updates AnalysisResults.
+        Recalculates scores for every site into a new AnalysisRun and
+        publishes it. The new weights are applied in the database to the
+        stored factors (services.apply_weights); the NumPy engine only runs
+        while some site has none stored yet.
         """
-        sites = Sites.objects.all()
-        new_results_buffer = []
-
-        for site in sites:
-            # 1. Normalize Raw Values to 0-100 scores
-            s_score = normalize_solar(site.solar_irradiance_kwh)
-            a_score = normalize_area(site.area_sqm)
-            g_score = normalize_grid(site.grid_distance_km)
-            sl_score = normalize_slope(site.slope_degrees)
-            i_score = normalize_infra(site.road_distance_km)
-
-            # 2. Apply the weights to get weighted components
-            # Using .get() with a fallback to prevent KeyError if the frontend misses a field
-            w_solar = s_score * float(weights.get("solar", 0))
-            w_area = a_score * float(weights.get("area", 0))
-            w_grid = g_score * float(weights.get("grid", 0))
-            w_slope = sl_score * float(weights.get("slope", 0))
-            w_infra = i_score * float(weights.get("infra", 0))
-
-            # 3. Sum for the Final Score
-            total_suitability = w_solar + w_area + w_grid + w_slope + w_infra
-
-            # 4. Prepare the Result record objects for bulk insertion
-            new_results_buffer.append(
-                AnalysisResults(
-                    site=site,
-                    solar_irradiance_score=round(w_solar, 2),
-                    area_score=round(w_area, 2),
-                    grid_distance_score=round(w_grid, 2),
-                    slope_score=round(w_slope, 2),
-                    infrastructure_score=round(w_infra, 2),
-                    total_suitability_score=round(total_suitability, 2),
-                    parameters_snapshot=weights,  # Optional: saves the weights used for history
-                )
+        return apply_weights(weights)
+
+
+class SiteWhatIfView(APIView):
+    """
+    Ranks sites under one or many hypothetical weight vectors. Nothing is
+    saved: AnalysisParameters and AnalysisResults are left untouched.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        try:
+            serializer = WhatIfSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            results = what_if_rankings(
+                serializer.validated_data["weights"],
+                serializer.validated_data["limit"],
             )
+            return Response({"results": results}, status=200)
 
-        # Perform deletion and insertion in one atomic block
-        # This fixes the "Returned 2" error by ensuring only one active set of results exists
-        with transaction.atomic():
-            # If you want to keep history, comment out the .delete() line.
-            # But for the assessment, deleting ensures your GET /api/sites doesn't return duplicates.
-            AnalysisResults.objects.all().delete()
-            AnalysisResults.objects.bulk_create(new_results_buffer)
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
 
 
-class SiteStatiscsSummary(APIView):
+class SiteSensitivityView(APIView):
+    """
+    Monte Carlo weight sensitivity: samples weight vectors around the given
+    (or stored) weights and reports how stable each site's rank is. Nothing
+    is saved.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        try:
+            serializer = SensitivitySerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            data = serializer.validated_data
+            center = data.get("weights") or load_weights()
+            result = weight_sensitivity(
+                center,
+                data["samples"],
+                data["concentration"],
+                data["top_k"],
+                data["limit"],
+                site_ids=data.get("site_ids"),
+                seed=data.get("seed"),
+            )
+            return Response({"weights": center, **result}, status=200)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+
+class SiteScoringCurveView(APIView):
+    """
+    GET: the piecewise-linear curves turning site attributes into 0-100
+    factor scores. POST: replaces the given curves and re-scores every site
+    with them (the stored factors are only valid for the old curves).
+    """
+
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
         try:
-            site_name = request.query_params.get("site_name")
-            land_type = request.query_params.get("land_type")
-            region = request.query_params.get("region")
+            curves = {
+                factor: [list(point) for point in points]
+                for factor, points in load_curves().items()
+            }
+            return Response(curves, status=200)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
+
+    def post(self, request):
+        try:
+            serializer = ScoringCurvesSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            serializer.save_curves()
+            run = recalculate_all_sites(load_weights())
+            return Response(
+                {
+                    "message": "Scoring curves updated and scores recalculated",
+                    "run_id": run.run_id,
+                },
+                status=200,
+            )
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=400)
 
-            queryset = SitesWithScores.objects.all().order_by(
-                "-total_suitability_score"
+
+class SiteSkylineView(APIView):
+    """
+    The Pareto frontier: sites that no other site beats on all five factor
+    scores at once. Accepts the same filters as the site list.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    FILTER_PARAMS = (
+        "q",
+        "site_name",
+        "land_type",
+        "region",
+        "bbox",
+        "lat",
+        "lon",
+        "radius_km",
+    )
+
+    def get(self, request):
+        try:
+            queryset = filter_sites_queryset(request, SitesWithScores)
+            filter_key = tuple(
+                (name, tuple(request.query_params.getlist(name)))
+                for name in self.FILTER_PARAMS
             )
-            queryset = filter_by_site_name(queryset, site_name)
-            queryset = filter_by_land_type(queryset, land_type)
-            queryset = filter_by_region(queryset, region)
-
-            queries = request.query_params.getlist("q")
-            filters = split_values_for_query_params(queries, SitesWithScores)
-
-            offset, limit = offset_and_limit_query_params(request)
-
-            combined_q = Q()
-            combined_q = build_score_filters(filters, combined_q)
-
-            # 1. Start with the queryset
-            sites = limit_and_offset_queries(queryset, limit, offset)
-
-            # 2. Global Aggregates (Rounded to 2 decimals)
-            # Doing this first keeps the JSON clean
-            stats_raw = sites.aggregate(
-                total_land_area=Sum("area_sqm"),
-                avg_suitability=Avg("total_suitability_score"),
-                avg_solar=Avg("solar_irradiance_score"),
-                avg_area=Avg("area_score"),
-                avg_grid=Avg("grid_distance_score"),
-                avg_slope=Avg("slope_score"),
-                avg_infra=Avg("infrastructure_score"),
+            site_ids = frontier_site_ids(queryset, filter_key)
+
+            sites = SitesWithScores.objects.filter(site_id__in=site_ids)
+            serializer = SiteWithScoreSerializer(sites, many=True)
+            return Response(
+                {"count": len(site_ids), "sites": serializer.data},
+                status=status.HTTP_200_OK,
             )
 
-            stats = {
-                "avg_suitability_score": round(stats_raw["avg_suitability"] or 0, 2),
-                "total_land_area": round(stats_raw["total_land_area"] or 0, 2),
-                "factor_averages": {
-                    "solar_irradiance": round(stats_raw["avg_solar"] or 0, 2),
-                    "land_area": round(stats_raw["avg_area"] or 0, 2),
-                    "grid_proximity": round(stats_raw["avg_grid"] or 0, 2),
-                    "terrain_slope": round(stats_raw["avg_slope"] or 0, 2),
-                    "infrastructure": round(stats_raw["avg_infra"] or 0, 2),
-                },
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SiteNearestView(APIView):
+    """
+    The k sites nearest to ?lat=&lon=, nearest first, each with its
+    distance_km. Accepts the same filters as the site list (e.g.
+    q=col:total_suitability_score,min_score:70 or radius_km).
+    """
+
+    permission_classes = [permissions.AllowAny]
+    FILTER_PARAMS = ("q", "site_name", "land_type", "region", "bbox", "radius_km")
+
+    def get(self, request):
+        try:
+            serializer = NearestSerializer(data=request.query_params)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            queryset = None
+            if any(name in request.query_params for name in self.FILTER_PARAMS):
+                queryset = filter_sites_queryset(request, SitesWithScores)
+            nearest = nearest_sites(
+                serializer.validated_data["lat"],
+                serializer.validated_data["lon"],
+                serializer.validated_data["k"],
+                queryset,
+            )
+
+            sites = {
+                site.site_id: site
+                for site in SitesWithScores.objects.filter(
+                    site_id__in=[site_id for site_id, _ in nearest]
+                )
             }
+            results = []
+            for site_id, distance_km in nearest:
+                row = SiteWithScoreSerializer(sites[site_id]).data
+                row["distance_km"] = round(distance_km, 3)
+                results.append(row)
+            return Response({"sites": results}, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SiteTileView(APIView):
+    """
+    Map clusters of one z/x/y (Web Mercator, XYZ) tile: its sites grouped
+    into an 8 x 8 grid, each cluster with its count, centroid and mean and
+    best total_suitability_score.
+    """
 
-            # 3. Individual Site Data (Renamed and Sorted by score)
-            site_scoring_system = list(
-                sites.annotate(
-                    available_land_area=F("area_sqm"),
-                    solar_irradiance=F("solar_irradiance_kwh"),
-                    distance_from_grid=F("grid_distance_km"),
-                    terrain_elevation=F("elevation_m"),
-                    proximity_to_infra=F("road_distance_km"),
-                ).values(
-                    "site_id",
-                    "site_name",
-                    "latitude",
-                    "longitude",
-                    "solar_irradiance",
-                    "available_land_area",
-                    "distance_from_grid",
-                    "slope_degrees",
-                    "terrain_elevation",
-                    "land_type",
-                    "region",
-                    "proximity_to_infra",
-                    "total_suitability_score",
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, z, x, y):
+        try:
+            if z > TILE_MAX_ZOOM:
+                return Response(
+                    {"error": f"Zoom must be at most {TILE_MAX_ZOOM}."}, status=400
                 )
+            if x >= 1 << z or y >= 1 << z:
+                return Response({"error": f"No tile {z}/{x}/{y}."}, status=400)
+
+            clusters = get_cluster_pyramid().tile(z, x, y)
+            return Response(
+                {"z": z, "x": x, "y": y, "clusters": clusters},
+                status=status.HTTP_200_OK,
             )
 
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SiteAutocompleteView(APIView):
+    """
+    Search-box suggestions: the best-scored site names, regions or land
+    types starting with ?prefix= (case-insensitive), from an in-memory
+    prefix index instead of an istartswith query per keystroke.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            serializer = AutocompleteSerializer(data=request.query_params)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            data = serializer.validated_data
+            results = autocomplete(data["field"], data["prefix"], data["limit"])
             return Response(
-                {
-                    "kpi": {
-                        "total_sites": sites.count(),
-                    },
-                    "stats": stats,
-                    "site_data": site_scoring_system,
-                },
-                status=200,
+                {"field": data["field"], "prefix": data["prefix"], "results": results},
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SiteStatiscsSummary(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            body, next_cursor = cached_listing(
+                "statistics", request, lambda: self.build_summary(request)
             )
+            return with_next_cursor(Response(body, status=200), next_cursor)
 
         except Exception as e:
             return Response({"error": f"Stats error: {str(e)}"}, status=400)
 
+    def build_summary(self, request):
+        """
+        (response body, cursor of the next page) for the filtered page.
+        """
+        queryset = filter_sites_queryset(request, SitesWithScores)
+
+        # 1. Start with the queryset (?cursor= or ?offset=, with ?limit=)
+        sites, next_cursor = keyset_paginate(request, queryset)
+
+        # 2. Global Aggregates (Rounded to 2 decimals)
+        # Doing this first keeps the JSON clean
+        stats_raw = sites.aggregate(
+            total_land_area=Sum("area_sqm"),
+            avg_suitability=Avg("total_suitability_score"),
+            avg_solar=Avg("solar_irradiance_score"),
+            avg_area=Avg("area_score"),
+            avg_grid=Avg("grid_distance_score"),
+            avg_slope=Avg("slope_score"),
+            avg_infra=Avg("infrastructure_score"),
+        )
+
+        stats = {
+            "avg_suitability_score": round(stats_raw["avg_suitability"] or 0, 2),
+            "total_land_area": round(stats_raw["total_land_area"] or 0, 2),
+            "factor_averages": {
+                "solar_irradiance": round(stats_raw["avg_solar"] or 0, 2),
+                "land_area": round(stats_raw["avg_area"] or 0, 2),
+                "grid_proximity": round(stats_raw["avg_grid"] or 0, 2),
+                "terrain_slope": round(stats_raw["avg_slope"] or 0, 2),
+                "infrastructure": round(stats_raw["avg_infra"] or 0, 2),
+            },
+        }
+
+        # 3. Individual Site Data (Renamed and Sorted by score)
+        site_scoring_system = list(
+            sites.annotate(
+                available_land_area=F("area_sqm"),
+                solar_irradiance=F("solar_irradiance_kwh"),
+                distance_from_grid=F("grid_distance_km"),
+                terrain_elevation=F("elevation_m"),
+                proximity_to_infra=F("road_distance_km"),
+            ).values(
+                "site_id",
+                "site_name",
+                "latitude",
+                "longitude",
+                "solar_irradiance",
+                "available_land_area",
+                "distance_from_grid",
+                "slope_degrees",
+                "terrain_elevation",
+                "land_type",
+                "region",
+                "proximity_to_infra",
+                "total_suitability_score",
+            )
+        )
+
+        body = {
+            "kpi": {
+                "total_sites": sites.count(),
+            },
+            "stats": stats,
+            "site_data": site_scoring_system,
+        }
+        return body, next_cursor
+
 
 class SiteExportSummary(APIView):
     permission_classes = [permissions.AllowAny]
@@ -312,11 +643,16 @@ class SiteExportSummary(APIView):
     def get(self, request):
         try:
             # Get your data using your common function
-            data = get_filtered_site_data(
-                request, SitesWithScores, SiteWithScoreSerializer
+            data, next_cursor = cached_listing(
+                "export",
+                request,
+                lambda: get_filtered_site_data(
+                    request, SitesWithScores, SiteWithScoreSerializer
+                ),
             )
 
-            return export_to_csv_response(data, filename="solar_sites_summary.csv")
+            response = export_to_csv_response(data, filename="solar_sites_summary.csv")
+            return with_next_cursor(response, next_cursor)
 
         except Exception as e:
             return Response({"error": str(e)}, status=400)
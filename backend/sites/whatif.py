@@ -0,0 +1,152 @@
+import threading
+import numpy as np
+from django.conf import settings
+from sites.models import Sites
+from sites.response_cache import data_generation
+from sites.scoring import FACTOR_FIELDS, load_curves, normalized_factors, round_scores
+from sites.services import iter_scoring_chunks
+
+
+class FactorMatrix:
+    """
+    The normalized factors of every site as one (sites x factors) array,
+    columns in FACTOR_FIELDS order, next to the matching site_ids.
+    """
+
+    def __init__(self, site_ids, factors, version):
+        self.site_ids = site_ids
+        self.factors = factors
+        self.version = version
+
+    def __len__(self):
+        return len(self.site_ids)
+
+
+_cache = {"matrix": None}
+_cache_lock = threading.Lock()
+
+
+def factor_matrix_version():
+    """
+    The data generation: bumped once every upload batch or analysis run
+    has committed, so it changes after every write whatever order
+    concurrent writers commit in. A reader that builds during the
+    commit-to-bump window just rebuilds once more.
+    """
+    return data_generation()
+
+
+def load_factor_matrix(version):
+    """
+    Builds the matrix from the raw site data with the current scoring
+    curves, SITE_RECALC_CHUNK_SIZE sites at a time.
+    """
+    curves = load_curves()
+    site_ids = []
+    factors = []
+    for chunk_ids, columns in iter_scoring_chunks(settings.SITE_RECALC_CHUNK_SIZE):
+        chunk_factors = normalized_factors(columns, curves)
+        site_ids.append(chunk_ids)
+        factors.append(
+            np.column_stack(
+                [chunk_factors[factor] for _, factor, _ in FACTOR_FIELDS.values()]
+            )
+        )
+    if not site_ids:
+        return FactorMatrix(
+            np.empty(0, dtype=np.int64), np.empty((0, len(FACTOR_FIELDS))), version
+        )
+    return FactorMatrix(np.concatenate(site_ids), np.vstack(factors), version)
+
+
+def get_factor_matrix():
+    """
+    The cached FactorMatrix of this process, rebuilt when the data changed.
+    """
+    version = factor_matrix_version()
+    matrix = _cache["matrix"]
+    if matrix is not None and matrix.version == version:
+        return matrix
+
+    with _cache_lock:
+        matrix = _cache["matrix"]
+        if matrix is None or matrix.version != version:
+            matrix = load_factor_matrix(version)
+            _cache["matrix"] = matrix
+    return matrix
+
+
+def rank_sites(weight_vectors, limit):
+    """
+    Ranks every site under each weight vector without writing anything.
+    Vectors are scored in blocks of SITE_WHATIF_BLOCK_CELLS (vectors x
+    sites), each with one (vectors x factors) @ (factors x sites) multiply
+    and one argpartition, and only every vector's top 'limit' is kept, so
+    memory stays flat whatever the number of vectors. Returns, per vector, (site_id, total) pairs with the highest total
+    first and the lowest site_id first on exact ties.
+
+    The matrix product may sum the weighted factors in a different order
+    than the analyze endpoint, so a rounded total can differ by 0.01.
+    """
+    matrix = get_factor_matrix()
+    weights = np.array(
+        [
+            [float(vector.get(key, 0)) for key in FACTOR_FIELDS]
+            for vector in weight_vectors
+        ]
+    ).reshape(len(weight_vectors), len(FACTOR_FIELDS))
+
+    count = len(matrix)
+    limit = min(limit, count)
+    if limit == 0:
+        return [[] for _ in weight_vectors]
+
+    rankings = []
+    block = max(settings.SITE_WHATIF_BLOCK_CELLS // count, 1)
+    for start in range(0, len(weights), block):
+        # (vectors x sites): each vector's totals are contiguous for argpartition
+        totals = weights[start : start + block] @ matrix.factors.T
+        top = np.argpartition(totals, count - limit, axis=1)[:, count - limit :]
+        for vector_totals, indexes in zip(totals, top):
+            # argpartition cuts through ties arbitrarily; take every site tied
+            # with the last one kept so the ties can be ordered by site_id
+            indexes = np.flatnonzero(vector_totals >= vector_totals[indexes].min())
+            # Sorted by total descending, then site_id ascending
+            order = np.lexsort((matrix.site_ids[indexes], -vector_totals[indexes]))
+            order = indexes[order[:limit]]
+            rankings.append(
+                list(
+                    zip(
+                        matrix.site_ids[order].tolist(),
+                        round_scores(vector_totals[order]).tolist(),
+                    )
+                )
+            )
+    return rankings
+
+
+def what_if_rankings(weight_vectors, limit):
+    """
+    rank_sites() output shaped for the API, with the site names looked up
+    in one query for all vectors.
+    """
+    rankings = rank_sites(weight_vectors, limit)
+    site_ids = {site_id for ranking in rankings for site_id, _ in ranking}
+    names = dict(
+        Sites.objects.filter(site_id__in=site_ids).values_list("site_id", "site_name")
+    )
+    return [
+        {
+            "weights": vector,
+            "sites": [
+                {
+                    "rank": rank,
+                    "site_id": site_id,
+                    "site_name": names.get(site_id),
+                    "total_suitability_score": total,
+                }
+                for rank, (site_id, total) in enumerate(ranking, start=1)
+            ],
+        }
+        for vector, ranking in zip(weight_vectors, rankings)
+    ]
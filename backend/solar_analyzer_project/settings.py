@@ -142,6 +142,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 
+# Lets the frontend read the cursor of the next page of a site listing
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor"]
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -155,3 +158,126 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=24),  # increase from default 5 min
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
+
+# Site uploads
+# Uploads are read in fixed-size chunks and validated/persisted in batches,
+# so memory use does not grow with the size of the file.
+
+SITE_UPLOAD_CHUNK_SIZE = int(os.getenv("SITE_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+SITE_UPLOAD_BATCH_SIZE = int(os.getenv("SITE_UPLOAD_BATCH_SIZE", 2000))
+
+# Background imports (POST /api/sites/?async=1)
+# Files wait in SITE_IMPORT_DIR until "python manage.py process_imports"
+# picks them up. Running jobs without a heartbeat for SITE_IMPORT_STALE_AFTER
+# seconds are considered abandoned and resumed by another worker.
+
+SITE_IMPORT_DIR = os.getenv("SITE_IMPORT_DIR", os.path.join(BASE_DIR, "imports"))
+
+SITE_IMPORT_WORKERS = int(os.getenv("SITE_IMPORT_WORKERS", 4))
+
+SITE_IMPORT_POLL_INTERVAL = float(os.getenv("SITE_IMPORT_POLL_INTERVAL", 2))
+
+SITE_IMPORT_STALE_AFTER = int(os.getenv("SITE_IMPORT_STALE_AFTER", 600))
+
+# Resumable uploads (POST /api/sites/uploads/, then PUT numbered chunks)
+# A worker ingesting a resumable upload waits up to SITE_UPLOAD_CHUNK_WAIT
+# seconds for the next chunk before putting the job back in the queue.
+
+SITE_UPLOAD_CHUNK_WAIT = int(os.getenv("SITE_UPLOAD_CHUNK_WAIT", 60))
+
+# Score recalculation (POST /api/sites/analyze/)
+# Sites are read, scored and written SITE_RECALC_CHUNK_SIZE at a time, so
+# memory use does not grow with the number of sites.
+
+SITE_RECALC_CHUNK_SIZE = int(os.getenv("SITE_RECALC_CHUNK_SIZE", 5000))
+
+# Every recalculation is written as a new analysis run and published by
+# switching one pointer row. The SITE_ANALYSIS_RUNS_KEPT most recent runs are
+# kept as history; older runs, failed runs and runs still "building" after
+# SITE_ANALYSIS_RUN_STALE_AFTER seconds are pruned in the background.
+
+SITE_ANALYSIS_RUNS_KEPT = int(os.getenv("SITE_ANALYSIS_RUNS_KEPT", 3))
+
+SITE_ANALYSIS_RUN_STALE_AFTER = int(os.getenv("SITE_ANALYSIS_RUN_STALE_AFTER", 3600))
+
+# A full recalculation with SITE_RECALC_WORKERS > 1 scores the sites in a
+# pool of that many processes, each writing its own site_id ranges
+# (SITE_RECALC_RANGES_PER_WORKER ranges per process, for load balancing).
+# The run is only published once every range succeeded.
+
+SITE_RECALC_WORKERS = int(os.getenv("SITE_RECALC_WORKERS", 1))
+
+SITE_RECALC_RANGES_PER_WORKER = int(os.getenv("SITE_RECALC_RANGES_PER_WORKER", 4))
+
+# What-if rankings (POST /api/sites/what-if/)
+# Each process caches the factor matrix of all sites (8 bytes x 5 factors
+# per site) and rebuilds it after uploads or analyze runs. Vectors are
+# scored SITE_WHATIF_BLOCK_CELLS (vectors x sites) at a time.
+
+SITE_WHATIF_MAX_VECTORS = int(os.getenv("SITE_WHATIF_MAX_VECTORS", 500))
+
+SITE_WHATIF_MAX_LIMIT = int(os.getenv("SITE_WHATIF_MAX_LIMIT", 100))
+
+SITE_WHATIF_BLOCK_CELLS = int(os.getenv("SITE_WHATIF_BLOCK_CELLS", 5_000_000))
+
+# Weight sensitivity (POST /api/sites/sensitivity/)
+# Samples are scored SITE_SENSITIVITY_BLOCK_CELLS (samples x sites) at a
+# time; ranks are tracked exactly down to SITE_SENSITIVITY_RANK_DEPTH.
+
+SITE_SENSITIVITY_MAX_SAMPLES = int(os.getenv("SITE_SENSITIVITY_MAX_SAMPLES", 10000))
+
+SITE_SENSITIVITY_RANK_DEPTH = int(os.getenv("SITE_SENSITIVITY_RANK_DEPTH", 100))
+
+SITE_SENSITIVITY_BLOCK_CELLS = int(os.getenv("SITE_SENSITIVITY_BLOCK_CELLS", 5_000_000))
+
+# Pareto frontier (GET /api/sites/skyline/)
+# Frontiers are cached per analysis run and filter combination.
+
+SITE_SKYLINE_CACHE_SIZE = int(os.getenv("SITE_SKYLINE_CACHE_SIZE", 32))
+
+# Nearest sites (GET /api/sites/nearest/)
+# Each process keeps a KD-tree of all site coordinates (32 bytes per site)
+# and rebuilds it after uploads or analyze runs.
+
+SITE_NEAREST_MAX_K = int(os.getenv("SITE_NEAREST_MAX_K", 100))
+
+# Search-box suggestions (GET /api/sites/autocomplete/)
+# Served from an in-memory prefix index per process, rebuilt when the data
+# generation changes. The generation is read at most once every
+# SITE_AUTOCOMPLETE_CHECK_INTERVAL seconds, so most keystrokes run no query.
+
+SITE_AUTOCOMPLETE_MAX_LIMIT = int(os.getenv("SITE_AUTOCOMPLETE_MAX_LIMIT", 50))
+
+SITE_AUTOCOMPLETE_CHECK_INTERVAL = float(
+    os.getenv("SITE_AUTOCOMPLETE_CHECK_INTERVAL", 2)
+)
+
+# Response cache of the site list, statistics and export endpoints.
+# Entries are keyed on the data generation, a counter in the database that
+# every committed upload batch and analysis run increments, so each process
+# stops serving its entries as soon as any process changed the data. The
+# default keeps entries in process memory; to share them between the app
+# processes and import workers of one host use the file backend, e.g.
+# SITE_RESPONSE_CACHE_BACKEND=sites.response_cache.LRUFileBasedCache and
+# SITE_RESPONSE_CACHE_LOCATION=/var/tmp/site-responses.
+# Both evict the least recently used entry once MAX_ENTRIES is reached.
+
+SITE_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("SITE_RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "site_responses": {
+        "BACKEND": os.getenv(
+            "SITE_RESPONSE_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("SITE_RESPONSE_CACHE_LOCATION", "site-responses"),
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": SITE_RESPONSE_CACHE_MAX_ENTRIES,
+            # Evict a single entry at a time
+            "CULL_FREQUENCY": SITE_RESPONSE_CACHE_MAX_ENTRIES,
+        },
+    },
+}
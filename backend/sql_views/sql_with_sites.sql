@@ -29,6 +29,10 @@ LEFT JOIN (
            infrastructure_score,
            total_suitability_score,
            analysis_timestamp,
-           ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY analysis_timestamp DESC) as rn
+           ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY analysis_timestamp DESC, result_id DESC) as rn
     FROM analysis_results
+    -- Results of the current analysis run, plus newer ones written on upload
+    WHERE COALESCE(run_id, 0) IN (
+        0, (SELECT COALESCE(run_id, 0) FROM analysis_run_pointer WHERE pointer_id = 1)
+    )
 ) ar ON s.site_id = ar.site_id AND ar.rn = 1;
\ No newline at end of file